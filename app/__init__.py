@@ -1,19 +1,65 @@
+import gc
+
 from flask import Flask
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
+from app.database import Database, RoutingSession
+from app.template_registry import TemplateRegistry
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+database = Database(db)
+template_registry = TemplateRegistry()
+
+from app.export_jobs import ExportJobQueue # Na db en template_registry: de module gebruikt ze allebei
+export_jobs = ExportJobQueue()
+
+from app.metrics import Metrics
+metrics = Metrics()
+
+from app.response_cache import ResponseCache
+response_cache = ResponseCache()
 
-db = SQLAlchemy()
+from app.comment_events import CommentEventBroker
+comment_events = CommentEventBroker()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    db.init_app(app)
+    database.init_app(app)
+    template_registry.init_app(app)
+    export_jobs.init_app(app)
+    response_cache.init_app(app)
+    metrics.init_app(app)
+    comment_events.init_app(app)
 
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from app import cli
+    cli.init_app(app)
+
     with app.app_context():
-        db.create_all()
+        from app import migrations
+        migrations.upgrade(app.logger)
+
+    if app.config.get('TEMPLATE_PRELOAD'):
+        _preload(app)
 
-    return app
\ No newline at end of file
+    return app
+
+def _preload(app):
+    """
+    Voor gunicorn met `preload_app` (zie gunicorn.conf.py): alles wat elke worker nodig heeft
+    in de master opbouwen, zodat de workers het na de fork delen in plaats van elk een kopie.
+    """
+    with app.app_context():
+        loaded = template_registry.preload()
+        # Geen databaseverbindingen meegeven aan de workers: die openen hun eigen
+        for engine in db.engines.values():
+            engine.dispose()
+    app.logger.info(f"Templates vooraf geladen voor de workers: {', '.join(loaded) or '(geen)'}.")
+    # Alles wat nu bestaat naar de permanente generatie: de cyclische GC in de workers loopt er
+    # dan niet meer langs en schrijft dus niet in die pagina's (wat ze anders per worker kopieert)
+    gc.collect()
+    gc.freeze()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import json
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from app import template_registry
+from app.comment_import import import_comments, rows_from_csv, rows_from_json, CommentImportError
+from app.comment_migration import apply_path_migrations, plan_path_migrations
+from app.template_diff import diff_web_templates
+
+
+@click.command('compile-templates')
+@click.argument('template_ids', nargs=-1)
+@with_appcontext
+def compile_templates_command(template_ids):
+    """Compileer templates naar een artefact (vragenlijst, leaf map, padindex) naast de JSON."""
+    template_ids = template_ids or template_registry.template_ids()
+    failed = 0
+    for template_id in template_ids:
+        if template_registry.resolve(template_id) is None:
+            click.echo(f"Onbekende template: {template_id}", err=True)
+            failed += 1
+            continue
+        started = time.perf_counter()
+        path = template_registry.compile(template_id)
+        if path is None:
+            click.echo(f"FOUT: {template_id} kon niet gecompileerd worden (zie log).", err=True)
+            failed += 1
+        else:
+            click.echo(f"{template_id}: {path} ({time.perf_counter() - started:.2f}s)")
+    if failed:
+        raise click.exceptions.Exit(1)
+
+
+@click.command('import-comments')
+@click.argument('template_id')
+@click.argument('file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--author', default='Anoniem', help="Auteur voor rijen zonder author_name.")
+@click.option('--dry-run', is_flag=True, help="Alleen valideren, niets opslaan.")
+@click.option('--atomic', is_flag=True, help="Niets importeren als één rij ongeldig is.")
+@click.option('--format', 'file_format', type=click.Choice(['auto', 'csv', 'json']), default='auto')
+@with_appcontext
+def import_comments_command(template_id, file, author, dry_run, atomic, file_format):
+    """Importeer commentaren uit een CSV (export per vraag) of JSON-bestand."""
+    resolved = template_registry.resolve(template_id)
+    if resolved is None:
+        click.echo(f"Onbekende template: {template_id}", err=True)
+        raise click.exceptions.Exit(1)
+    if file_format == 'auto':
+        file_format = 'json' if file.name.lower().endswith('.json') else 'csv'
+    try:
+        content = file.read()
+        rows = rows_from_json(content) if file_format == 'json' else rows_from_csv(content)
+        summary = import_comments(resolved, rows, default_author=author, atomic=atomic, dry_run=dry_run)
+    except CommentImportError as e:
+        click.echo(f"FOUT: {e}", err=True)
+        raise click.exceptions.Exit(1)
+    for result in summary['results']:
+        if result['status'] == 'error':
+            click.echo(f"Rij {result['row']}: {result['message']}", err=True)
+    valid = sum(1 for result in summary['results'] if result['status'] == 'valid')
+    click.echo(f"{resolved}: {summary['created']} nieuw, {summary['duplicates']} al aanwezig, "
+               f"{summary['errors']} fouten" + (f", {valid} geldig (dry run)" if dry_run else ""))
+    if summary['errors']:
+        raise click.exceptions.Exit(1)
+
+
+@click.command('template-diff')
+@click.argument('template_id')
+@click.argument('old_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--apply', 'apply_migrations', is_flag=True, help="Commentaren naar de nieuwe paden verplaatsen.")
+@click.option('--json', 'as_json', is_flag=True, help="Het volledige resultaat als JSON.")
+@with_appcontext
+def template_diff_command(template_id, old_file, apply_migrations, as_json):
+    """Vergelijk een oude versie (OLD_FILE) met de huidige template en migreer de commentaarpaden."""
+    resolved = template_registry.resolve(template_id)
+    if resolved is None:
+        click.echo(f"Onbekende template: {template_id}", err=True)
+        raise click.exceptions.Exit(1)
+    try:
+        old_web_template = json.load(old_file)
+    except json.JSONDecodeError as e:
+        click.echo(f"FOUT: {old_file.name} is geen geldige JSON: {e}", err=True)
+        raise click.exceptions.Exit(1)
+    diff = diff_web_templates(old_web_template, template_registry.get_web_template(resolved))
+    plan = plan_path_migrations(resolved, diff, (old_web_template.get('tree') or {}).get('id'))
+    applied = apply_path_migrations(resolved, plan['migrations']) if apply_migrations else None
+    if as_json:
+        click.echo(json.dumps({**diff, **plan, 'applied': applied}, indent=2, ensure_ascii=False))
+        return
+    click.echo(f"{resolved} {diff['old_version']} -> {diff['new_version']}: {len(diff['added'])} toegevoegd, "
+               f"{len(diff['removed'])} verwijderd, {len(diff['moved'])} verplaatst, {len(diff['renamed'])} hernoemd")
+    for item in diff['moved']:
+        click.echo(f"  verplaatst  {item['old_path']} -> {item['new_path']}")
+    for item in diff['renamed']:
+        click.echo(f"  hernoemd    {item['old_path']} -> {item['new_path']} ({item['old_name']} -> {item['new_name']})")
+    for item in diff['removed']:
+        click.echo(f"  verwijderd  {item['path']} ({item['nodes']} nodes)")
+    for item in diff['added']:
+        click.echo(f"  toegevoegd  {item['path']} ({item['nodes']} nodes)")
+    for migration in plan['migrations']:
+        click.echo(f"  commentaar  {migration['old_path']} -> {migration['new_path']} ({migration['comments']})")
+    for orphan in plan['orphans']:
+        click.echo(f"  wees        {orphan['path']} ({orphan['comments']})", err=True)
+    if applied is not None:
+        click.echo(f"{applied['comments']} commentaren verplaatst ({applied['paths']} paden).")
+    elif plan['migrations']:
+        click.echo("Niets gewijzigd; gebruik --apply om de commentaren te verplaatsen.")
+
+
+def init_app(app):
+    app.cli.add_command(compile_templates_command)
+    app.cli.add_command(import_comments_command)
+    app.cli.add_command(template_diff_command)
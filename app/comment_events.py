@@ -0,0 +1,288 @@
+"""
+Live updates van commentaren naar open reviewsessies, via Server-Sent Events.
+
+Toevoegen, bijwerken en verwijderen schrijven een rij in `comment_event`, in dezelfde
+transactie als de wijziging. Per worker leest één poll-thread nieuwe events (één query per
+interval, ongeacht het aantal verbindingen) en zet ze in de wachtrij van elke verbinding
+voor die template. Zo werkt de fan-out over alle gunicorn-workers zonder externe broker.
+
+Een open verbinding houdt geen databaseverbinding vast: ze wacht op haar wachtrij en stuurt
+alleen een heartbeat. Na `COMMENT_EVENTS_STREAM_SECONDS` sluit de server de stream; de
+browser (EventSource) verbindt opnieuw met `Last-Event-ID` en krijgt de gemiste events
+alsnog uit de tabel. Is dat niet meer mogelijk (te oud of te veel), dan volgt een
+`reset`-event en laadt de client alle commentaren opnieuw.
+
+Met gthread-workers bezet een open verbinding wel een thread. Per worker zijn daarom
+hoogstens `COMMENT_EVENTS_MAX_STREAMS` streams tegelijk open; een verbinding daarboven krijgt
+een 503 met `Retry-After`, zodat gewone requests altijd een vrije thread houden.
+"""
+import json
+import queue
+import threading
+import time
+from datetime import timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, func, or_, select
+
+from app import db
+from app.models import CommentEvent, _utcnow
+
+# Maximaal aantal events in de wachtrij van één verbinding; daarna wordt de stream gesloten
+# en haalt de client de rest bij het opnieuw verbinden uit de tabel
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Maximaal aantal events dat bij het (opnieuw) verbinden wordt nagestuurd
+REPLAY_LIMIT = 1000
+# Events per poll-query
+POLL_BATCH_SIZE = 500
+# Hoe lang (seconden) een ontbrekend ID nog kan verschijnen (transactie die later commit, PostgreSQL)
+GAP_TIMEOUT = 10.0
+# Hoe vaak (seconden) oude events worden opgeruimd
+PRUNE_INTERVAL = 60.0
+# Wachttijd (ms) die de browser aanhoudt voor het opnieuw verbinden
+CLIENT_RETRY_MS = 3000
+
+
+def _isoformat(value):
+    """ISO-tijd in UTC met 'Z', ook voor tijdzone-bewuste datetimes (zoals bij een nieuw commentaar)."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + 'Z'
+
+
+def comment_event_data(comment):
+    """Het commentaar zoals het in een event (en in de commentaar-API's) verschijnt."""
+    return {
+        'id': comment.id, 'comment_text': comment.comment_text,
+        'author_name': comment.author_name,
+        'created_at': _isoformat(comment.created_at),
+        'updated_at': _isoformat(comment.updated_at),
+        'parent_id': comment.parent_id,
+        'element_path': comment.element_path
+    }
+
+
+def format_event(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _Subscription:
+    __slots__ = ('template_id', 'queue', 'overflowed')
+
+    def __init__(self, template_id):
+        self.template_id = template_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class CommentEventBroker:
+    """
+    Verdeelt commentaar-events over de open SSE-verbindingen van deze worker.
+
+    De poll-thread draait alleen zolang er verbindingen zijn.
+    """
+
+    def __init__(self, app=None):
+        self.poll_interval = 1.0
+        self.heartbeat_interval = 15.0
+        self.stream_seconds = 300.0
+        self.retention_seconds = 0.0
+        self.max_streams = 4
+        self._lock = threading.Lock()
+        self._subscribers = {} # template_id -> set van _Subscription
+        self._poller = None
+        self._last_id = 0
+        self._gaps = {} # ontbrekend event-ID -> tijdstip (monotonic) waarop het gat is gezien
+        self._last_prune = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.poll_interval = app.config.get('COMMENT_EVENTS_POLL_INTERVAL', 1.0)
+        self.heartbeat_interval = app.config.get('COMMENT_EVENTS_HEARTBEAT', 15.0)
+        self.stream_seconds = app.config.get('COMMENT_EVENTS_STREAM_SECONDS', 300.0)
+        self.retention_seconds = app.config.get('COMMENT_EVENTS_RETENTION', 0.0)
+        self.max_streams = app.config.get('COMMENT_EVENTS_MAX_STREAMS', 4)
+        app.extensions['comment_events'] = self
+
+    # --- Schrijven ---
+
+    @staticmethod
+    def record(template_id, action, comment, element_path=None):
+        """
+        Voegt een event toe aan de huidige sessie; de aanroeper commit samen met de wijziging.
+
+        Elke wijziging via de API hoort een event te krijgen: het is ook het wijzigingslog
+        voor /api/comments/changes. Bulk-inserts buiten de API om krijgen er geen.
+
+        Args:
+            template_id (str): Template waarvan het commentaar deel uitmaakt.
+            action (str): 'created', 'updated' of 'deleted'.
+            comment (Comment): Het commentaar (met ID, dus na een flush).
+            element_path (str, optioneel): Pad, als het commentaar al uit de sessie is verwijderd.
+        """
+        payload = None if action == 'deleted' else json.dumps(comment_event_data(comment), ensure_ascii=False)
+        db.session.add(CommentEvent(
+            template_id=template_id, action=action, comment_id=comment.id,
+            element_path=element_path or comment.element_path, payload=payload
+        ))
+
+    # --- Abonneren ---
+
+    def subscribe(self, template_id):
+        """
+        Meldt een nieuwe verbinding aan.
+
+        Returns:
+            _Subscription | None: None als deze worker al `max_streams` open streams heeft.
+        """
+        app = current_app._get_current_object()
+        subscription = _Subscription(template_id)
+        with self._lock:
+            open_streams = sum(len(subscribers) for subscribers in self._subscribers.values())
+            if self.max_streams > 0 and open_streams >= self.max_streams:
+                return None
+            if self._poller is None:
+                # Vanaf nu verschijnende events gaan via de poller; alles tot nu toe via de replay
+                self._last_id = db.session.execute(select(func.max(CommentEvent.id))).scalar() or 0
+                self._gaps = {}
+                self._poller = threading.Thread(target=self._poll_loop, args=(app,),
+                                                 name='comment-events', daemon=True)
+                self._poller.start()
+            self._subscribers.setdefault(template_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.template_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.template_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    # --- Pollen ---
+
+    def _poll_loop(self, app):
+        with app.app_context():
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller = None
+                        return
+                try:
+                    self._poll_once()
+                    if self.retention_seconds > 0 and time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                        self._prune()
+                except Exception as e:
+                    app.logger.error(f"FOUT: Ophalen van commentaar-events mislukt: {e}", exc_info=True)
+                finally:
+                    db.session.remove()
+                time.sleep(self.poll_interval)
+
+    def _poll_once(self):
+        while True:
+            now = time.monotonic()
+            self._gaps = {event_id: seen for event_id, seen in self._gaps.items() if now - seen < GAP_TIMEOUT}
+            condition = CommentEvent.id > self._last_id
+            if self._gaps:
+                condition = or_(condition, CommentEvent.id.in_(list(self._gaps)))
+            events = db.session.execute(
+                select(CommentEvent).where(condition).order_by(CommentEvent.id).limit(POLL_BATCH_SIZE)
+            ).scalars().all()
+            for event in events:
+                self._gaps.pop(event.id, None)
+                if event.id > self._last_id:
+                    # Een lager ID dat nog niet zichtbaar is, kan van een transactie zijn die later commit
+                    for missing_id in range(self._last_id + 1, event.id):
+                        self._gaps.setdefault(missing_id, now)
+                    self._last_id = event.id
+                self._dispatch(event)
+            if len(events) < POLL_BATCH_SIZE:
+                return
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.template_id, ()))
+        if not subscribers:
+            return
+        message = (event.id, self.format(event))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def _prune(self):
+        self._last_prune = time.monotonic()
+        cutoff = _utcnow() - timedelta(seconds=self.retention_seconds)
+        db.session.execute(delete(CommentEvent).where(CommentEvent.created_at < cutoff))
+        db.session.commit()
+
+    # --- Streamen ---
+
+    @staticmethod
+    def format(event):
+        return format_event(event.id, 'comment', {
+            'event_id': event.id, 'action': event.action, 'template_id': event.template_id,
+            'comment_id': event.comment_id, 'element_path': event.element_path,
+            'comment': json.loads(event.payload) if event.payload else None
+        })
+
+    def replay(self, template_id, last_event_id):
+        """
+        Events na `last_event_id` voor een template, om na een (her)verbinding na te sturen.
+
+        Returns:
+            tuple[list[tuple[int, str]], int | None]: De opgemaakte events, en het hoogste
+            event-ID als de client in plaats daarvan alles opnieuw moet laden (reset), anders None.
+        """
+        if last_event_id is None:
+            return [], None
+        oldest_id, newest_id = db.session.execute(
+            select(func.min(CommentEvent.id), func.max(CommentEvent.id))
+        ).one()
+        if oldest_id is not None and oldest_id > last_event_id + 1:
+            return [], newest_id # Een deel van de gemiste events is al opgeruimd
+        events = db.session.execute(
+            select(CommentEvent)
+            .where(CommentEvent.template_id == template_id, CommentEvent.id > last_event_id)
+            .order_by(CommentEvent.id).limit(REPLAY_LIMIT + 1)
+        ).scalars().all()
+        if len(events) > REPLAY_LIMIT:
+            return [], newest_id
+        return [(event.id, self.format(event)) for event in events], None
+
+    def stream(self, subscription, replayed, reset_to):
+        """
+        Generator met de SSE-tekst voor één verbinding; meldt de verbinding af als hij eindigt.
+
+        Gebruikt geen app- of request-context: alles wat uit de database moest, is er al.
+        """
+        try:
+            yield f"retry: {CLIENT_RETRY_MS}\n\n"
+            if reset_to is not None:
+                yield format_event(reset_to, 'reset', {'event_id': reset_to})
+            replayed_ids = set()
+            for event_id, message in replayed:
+                replayed_ids.add(event_id)
+                yield message
+            deadline = time.monotonic() + self.stream_seconds
+            while not subscription.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event_id, message = subscription.queue.get(timeout=min(self.heartbeat_interval, remaining))
+                except queue.Empty:
+                    yield ": ping\n\n" # Houdt proxies tevreden en merkt verbroken verbindingen op
+                    continue
+                if event_id not in replayed_ids:
+                    yield message
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,295 @@
+"""
+Import van commentaren in bulk: een JSON-lijst, of een CSV in de vorm van de export per vraag.
+
+Alle rijen worden eerst gevalideerd (pad hoort bij een vraag van de template, tekst niet leeg,
+parent bestaat); geldige rijen gaan daarna met een paar bulk-statements in één transactie
+de database in, samen met hun events in het wijzigingslog. Een fout in één rij houdt de
+andere niet tegen, tenzij `atomic` gevraagd is.
+
+Elke rij heeft een `client_key`. Zonder eigen sleutel wordt die afgeleid van pad, auteur en
+tekst; een tweede import van dezelfde rij (bv. na een time-out) maakt dan geen dubbel
+commentaar aan maar meldt het bestaande.
+"""
+import csv
+import hashlib
+import io
+import json
+from sqlalchemy import insert, select, update
+
+from app import db, response_cache, template_registry
+from app.comment_events import comment_event_data
+from app.models import Comment, CommentEvent, CommentPath, _utcnow
+from app.pagination import parse_datetime
+
+# Maximaal aantal rijen per import
+IMPORT_MAX_ROWS = 20000
+# Aantal waarden per IN-lijst bij het opzoeken van bestaande sleutels en paden
+LOOKUP_CHUNK = 500
+
+# Kolommen van de CSV-export per vraag (QuestionCsvExporter)
+CSV_QUESTION_NAME = 'Vraag Naam'
+CSV_NODE_ID = 'Node ID'
+CSV_COMMENT = 'Commentaar'
+
+
+class CommentImportError(ValueError):
+    """De invoer als geheel is onleesbaar (geen geldige JSON/CSV, te veel rijen)."""
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def rows_from_json(data):
+    """Rijen uit een JSON-lijst van objecten, of een object met een lijst onder `comments`."""
+    if isinstance(data, (str, bytes)):
+        try:
+            data = json.loads(data)
+        except ValueError as e:
+            raise CommentImportError(f"Ongeldige JSON: {e}")
+    if isinstance(data, dict):
+        data = data.get('comments')
+    if not isinstance(data, list):
+        raise CommentImportError("Verwacht een JSON-lijst van commentaren (of {\"comments\": [...]}).")
+    return data
+
+
+def rows_from_csv(text):
+    """
+    Rijen uit een CSV: de export per vraag (`Vraag Naam`, `Node ID`, `Commentaar`) of met
+    dezelfde kolommen als de JSON-invoer (`element_path`, `comment_text`, ...).
+
+    Rijen zonder commentaartekst worden overgeslagen: in een ingevulde export hebben de meeste
+    vragen geen nieuw commentaar.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip('﻿')))
+    if not reader.fieldnames:
+        raise CommentImportError("Lege CSV.")
+    rows = []
+    for row in reader:
+        if CSV_COMMENT in row and 'comment_text' not in row:
+            row = {
+                'question_name': row.get(CSV_QUESTION_NAME), 'node_id': row.get(CSV_NODE_ID),
+                'comment_text': row.get(CSV_COMMENT), **{key: value for key, value in row.items()
+                                                         if key not in (CSV_QUESTION_NAME, CSV_NODE_ID, CSV_COMMENT)}
+            }
+        # De regelnummers in foutmeldingen moeten kloppen met het bestand, ook voor overgeslagen rijen
+        rows.append(row if (row.get('comment_text') or '').strip() else None)
+    return rows
+
+
+def default_client_key(element_path, author_name, comment_text):
+    digest = hashlib.sha256(f"{element_path}\n{author_name}\n{comment_text}".encode('utf-8')).hexdigest()
+    return f"auto:{digest[:40]}"
+
+
+class _QuestionResolver:
+    """
+    Vertaalt een rij naar het pad van een vraag van de template.
+
+    Met `element_path` (semantisch, Medblocks- of AQL-pad) via de `PathIndex`. Zonder pad via
+    vraagnaam + node-ID uit de CSV-export; komt die combinatie meer dan eens voor in de
+    template, dan hoort de n-de rij met die combinatie bij de n-de vraag ermee (de volgorde
+    van de export).
+    """
+
+    def __init__(self, template_id):
+        self.path_index = template_registry.get_path_index(template_id)
+        self.leaf_paths = set()
+        self._by_name = {}
+        for question in template_registry.get_leaf_map(template_id).values():
+            if question.get('comment_path'):
+                self.leaf_paths.add(question['comment_path'])
+                key = (question.get('csv_name'), question.get('csv_node_id'))
+                self._by_name.setdefault(key, []).append(question['comment_path'])
+        self._seen_names = {}
+
+    def resolve(self, row):
+        element_path = (row.get('element_path') or '').strip()
+        if element_path:
+            semantic_path = self.path_index.resolve(element_path)
+            if semantic_path not in self.leaf_paths:
+                raise ValueError(f"Pad '{element_path}' is geen vraag van deze template.")
+            return semantic_path
+        key = ((row.get('question_name') or '').strip(), (row.get('node_id') or '').strip())
+        if not key[0] and not key[1]:
+            raise ValueError("element_path (of vraagnaam en node-ID) ontbreekt.")
+        candidates = self._by_name.get(key)
+        if not candidates:
+            raise ValueError(f"Geen vraag '{key[0]}' met node-ID '{key[1]}' in deze template.")
+        occurrence = self._seen_names.get(key, 0)
+        self._seen_names[key] = occurrence + 1
+        if occurrence >= len(candidates):
+            raise ValueError(f"Vraag '{key[0]}' ({key[1]}) komt vaker voor dan in de template ({len(candidates)}x).")
+        return candidates[occurrence]
+
+
+def _intern_paths(paths):
+    """Pad → CommentPath.id voor alle paden, ontbrekende in één bulk-insert aangemaakt."""
+    path_ids = {}
+    for chunk in _chunks(paths):
+        path_ids.update(db.session.execute(select(CommentPath.path, CommentPath.id).where(CommentPath.path.in_(chunk))).all())
+    missing = [{'path': path} for path in paths if path not in path_ids]
+    if missing:
+        db.session.execute(insert(CommentPath), missing)
+        for chunk in _chunks(row['path'] for row in missing):
+            path_ids.update(db.session.execute(select(CommentPath.path, CommentPath.id).where(CommentPath.path.in_(chunk))).all())
+    return path_ids
+
+
+def import_comments(template_id, rows, default_author='Anoniem', atomic=False, dry_run=False):
+    """
+    Valideert en importeert commentaren voor één template in één transactie.
+
+    Args:
+        template_id (str): Een bekend template-ID.
+        rows (list[dict | None]): Rijen met `comment_text` en `element_path` (of `question_name`
+            + `node_id`), optioneel `author_name`, `client_key`, `parent_id` (bestaand commentaar),
+            `parent_key` (client_key van een bestaand of meegeïmporteerd commentaar) en `created_at`.
+            None staat voor een overgeslagen (lege) rij.
+        default_author (str): Auteur voor rijen zonder `author_name`.
+        atomic (bool): Niets importeren als één rij ongeldig is.
+        dry_run (bool): Alleen valideren; niets schrijven.
+    Returns:
+        dict: `created`, `duplicates`, `errors` (aantallen) en `results`: per rij het rijnummer,
+        de status (`created`, `duplicate`, `error`; bij `dry_run` `valid`, bij een afgebroken
+        `atomic`-import `skipped`), `client_key`, `comment_id` of `message`.
+    """
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise CommentImportError(f"Te veel rijen ({len(rows)}); maximaal {IMPORT_MAX_ROWS} per import.")
+    resolver = _QuestionResolver(template_id)
+    template_version = template_registry.get_questionnaire(template_id).get('version')
+    now = _utcnow()
+
+    results = []
+    valid = [] # (result, waarden voor de insert, parent_key)
+    keys_in_batch = set()
+    for row_number, row in enumerate(rows, start=1):
+        if row is None:
+            continue
+        result = {'row': row_number}
+        results.append(result)
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Rij is geen object.")
+            comment_text = str(row.get('comment_text') or '').strip()
+            if not comment_text:
+                raise ValueError("Commentaartekst mag niet leeg zijn.")
+            element_path = resolver.resolve(row)
+            author_name = str(row.get('author_name') or '').strip() or default_author
+            client_key = str(row.get('client_key') or '').strip() or default_client_key(element_path, author_name, comment_text)
+            result['client_key'] = client_key
+            if len(client_key) > 120:
+                raise ValueError("client_key is langer dan 120 tekens.")
+            if client_key in keys_in_batch:
+                raise ValueError(f"client_key '{client_key}' komt meer dan eens voor in de import.")
+            keys_in_batch.add(client_key)
+            try:
+                created_at = parse_datetime(row.get('created_at')) or now
+            except ValueError:
+                raise ValueError(f"Ongeldige datum '{row.get('created_at')}'.")
+            parent_id = row.get('parent_id')
+            if parent_id not in (None, ''):
+                try:
+                    parent_id = int(parent_id)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Ongeldige parent_id '{parent_id}'.")
+            else:
+                parent_id = None
+        except ValueError as e:
+            result.update(status='error', message=str(e))
+            continue
+        valid.append((result, {
+            'element_path': element_path, 'comment_text': comment_text, 'author_name': author_name,
+            'created_at': created_at, 'updated_at': created_at, 'parent_id': parent_id,
+            'template_id': template_id, 'template_version': template_version, 'client_key': client_key,
+        }, str(row.get('parent_key') or '').strip() or None))
+
+    # Bestaande sleutels: die rijen zijn al eerder geïmporteerd
+    existing_keys = {}
+    for chunk in _chunks(values['client_key'] for _, values, _ in valid):
+        existing_keys.update(db.session.execute(select(Comment.client_key, Comment.id).where(Comment.client_key.in_(chunk))).all())
+    parent_ids = {values['parent_id'] for _, values, _ in valid if values['parent_id'] is not None}
+    known_parent_ids = set()
+    for chunk in _chunks(parent_ids):
+        known_parent_ids.update(db.session.execute(select(Comment.id).where(Comment.id.in_(chunk))).scalars())
+    parent_keys = {parent_key for _, _, parent_key in valid if parent_key}
+    for chunk in _chunks(parent_keys - set(existing_keys)):
+        existing_keys.update(db.session.execute(select(Comment.client_key, Comment.id).where(Comment.client_key.in_(chunk))).all())
+
+    valid_keys = {values['client_key'] for _, values, _ in valid}
+    to_insert = []
+    for result, values, parent_key in valid:
+        if values['client_key'] in existing_keys:
+            result.update(status='duplicate', comment_id=existing_keys[values['client_key']])
+            continue
+        if values['parent_id'] is not None and values['parent_id'] not in known_parent_ids:
+            result.update(status='error', message=f"Opmerking {values['parent_id']} (parent_id) bestaat niet.")
+            continue
+        if parent_key and parent_key not in existing_keys and parent_key not in valid_keys:
+            result.update(status='error', message=f"Onbekende parent_key '{parent_key}'.")
+            continue
+        to_insert.append((result, values, parent_key))
+
+    errors = sum(1 for result in results if result.get('status') == 'error')
+    if dry_run or (atomic and errors):
+        for result, _, _ in to_insert:
+            result['status'] = 'valid' if dry_run else 'skipped'
+        return _summary(results)
+
+    try:
+        path_ids = _intern_paths({values['element_path'] for _, values, _ in to_insert})
+        rows_to_insert = [{
+            key: value for key, value in values.items() if key != 'element_path'
+        } | {'path_id': path_ids[values['element_path']]} for _, values, _ in to_insert]
+        inserted = {}
+        if rows_to_insert:
+            for comment_id, client_key in db.session.execute(
+                    insert(Comment).returning(Comment.id, Comment.client_key, sort_by_parameter_order=True),
+                    rows_to_insert):
+                inserted[client_key] = comment_id
+        existing_keys.update(inserted)
+        # Antwoorden op meegeïmporteerde commentaren: de parent heeft nu pas een ID
+        parent_updates = []
+        for result, values, parent_key in to_insert:
+            result.update(status='created', comment_id=inserted[values['client_key']])
+            if parent_key:
+                values['parent_id'] = existing_keys.get(parent_key)
+                parent_updates.append({'id': result['comment_id'], 'parent_id': values['parent_id'],
+                                       'updated_at': values['updated_at']})
+        if parent_updates:
+            db.session.execute(update(Comment), parent_updates)
+        if to_insert:
+            db.session.execute(insert(CommentEvent), [{
+                'template_id': template_id, 'action': 'created', 'comment_id': result['comment_id'],
+                'element_path': values['element_path'],
+                'payload': json.dumps(comment_event_data(_ImportedComment(result['comment_id'], values)), ensure_ascii=False)
+            } for result, values, _ in to_insert])
+        # Buiten het ORM om ingevoegd: de gecachte antwoorden van deze paden zelf ongeldig maken
+        response_cache.mark_changed(db.session, path_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return _summary(results)
+
+
+class _ImportedComment:
+    """Net genoeg van een `Comment` voor `comment_event_data`, zonder ORM-object per rij."""
+
+    def __init__(self, comment_id, values):
+        self.id = comment_id
+        self.__dict__.update(values)
+
+
+def _summary(results):
+    counts = {'created': 0, 'duplicate': 0, 'error': 0}
+    for result in results:
+        if result.get('status') in counts:
+            counts[result['status']] += 1
+    return {
+        'created': counts['created'], 'duplicates': counts['duplicate'], 'errors': counts['error'],
+        'results': results
+    }
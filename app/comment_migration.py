@@ -0,0 +1,110 @@
+"""
+Commentaren meenemen naar een nieuwe versie van een template.
+
+Bij een nieuwe templateversie kunnen nodes verplaatst of hernoemd zijn; hun semantische pad,
+en daarmee het `element_path` van hun commentaren, verandert dan. `template_diff` levert per
+veranderd pad het nieuwe (`path_map`); hier wordt dat een migratievoorstel voor de paden die
+werkelijk commentaar hebben, en wordt het voorstel in één bulk-update uitgevoerd.
+
+Uitvoeren zet `path_id` van de betrokken commentaren om (de triggers houden de dekking bij),
+schrijft per commentaar een 'updated'-event (live updates en /api/comments/changes zien het
+nieuwe pad) en maakt de gecachte antwoorden van de oude en nieuwe paden ongeldig. Een tweede
+keer uitvoeren (bv. door een andere worker) vindt geen commentaren meer op de oude paden en
+doet dus niets.
+"""
+import json
+
+from sqlalchemy import case, func, insert, select, update
+
+from app import db, response_cache, template_registry
+from app.comment_events import comment_event_data
+from app.comment_import import _chunks, _intern_paths
+from app.models import Comment, CommentEvent, CommentPath, _utcnow, template_path_filter
+
+
+def _comment_counts(paths):
+    counts = {}
+    for chunk in _chunks(paths):
+        counts.update(db.session.execute(
+            select(CommentPath.path, func.count(Comment.id)).join(Comment, Comment.path_id == CommentPath.id)
+            .where(CommentPath.path.in_(chunk)).group_by(CommentPath.path)
+        ).all())
+    return counts
+
+
+def plan_path_migrations(template_id, diff, old_root_path=None):
+    """
+    Migratievoorstel voor de commentaren van een template bij een `diff_web_templates`-resultaat.
+
+    Args:
+        template_id (str): De template (met de nieuwe versie geladen).
+        diff (dict): Resultaat van `template_diff.diff_web_templates(oud, nieuw)`.
+        old_root_path (str, optioneel): Eerste padsegment in de oude versie, als dat anders is.
+    Returns:
+        dict: `migrations` (per oud pad met commentaar: `old_path`, `new_path`, `comments`) en
+        `orphans` (paden met commentaar die in de nieuwe versie niet bestaan en niet meeverhuizen,
+        met `comments`).
+    """
+    path_map = diff['path_map']
+    counts = _comment_counts(sorted(path_map))
+    migrations = [{'old_path': old_path, 'new_path': path_map[old_path], 'comments': counts[old_path]}
+                  for old_path in sorted(counts)]
+
+    path_index = template_registry.get_path_index(template_id)
+    orphans = []
+    for root_path in {old_root_path or template_registry.root_path(template_id), template_registry.root_path(template_id)}:
+        rows = db.session.execute(
+            select(CommentPath.path, func.count(Comment.id)).join(Comment, Comment.path_id == CommentPath.id)
+            .where(*template_path_filter(root_path)).group_by(CommentPath.path).order_by(CommentPath.path)
+        ).all()
+        orphans.extend({'path': path, 'comments': count} for path, count in rows
+                       if path not in path_map and path not in path_index)
+    return {'migrations': migrations, 'orphans': orphans}
+
+
+def apply_path_migrations(template_id, migrations):
+    """
+    Zet de commentaren van elk `old_path` over naar `new_path`, in één transactie.
+
+    De paden gaan in één UPDATE (per blok van `LOOKUP_CHUNK` paden) met een CASE op `path_id`,
+    dus ook verwisselde paden (a → b, b → a) komen goed.
+
+    Returns:
+        dict: `paths` (aantal omgezette paden) en `comments` (aantal verplaatste commentaren).
+    """
+    mapping = {migration['old_path']: migration['new_path'] for migration in migrations
+               if migration['old_path'] != migration['new_path']}
+    if not mapping:
+        return {'paths': 0, 'comments': 0}
+    try:
+        path_ids = _intern_paths(set(mapping) | set(mapping.values()))
+        id_mapping = {path_ids[old_path]: path_ids[new_path] for old_path, new_path in mapping.items()}
+        now = _utcnow()
+        moved_ids = []
+        for chunk in _chunks(sorted(id_mapping)):
+            moved_ids.extend(db.session.execute(
+                update(Comment).where(Comment.path_id.in_(chunk))
+                .values(path_id=case({old_id: id_mapping[old_id] for old_id in chunk}, value=Comment.path_id),
+                        updated_at=now)
+                .returning(Comment.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+        if moved_ids:
+            events = []
+            for chunk in _chunks(moved_ids):
+                comments = db.session.execute(
+                    select(Comment).where(Comment.id.in_(chunk)).execution_options(populate_existing=True)
+                ).scalars()
+                events.extend({
+                    'template_id': template_id, 'action': 'updated', 'comment_id': comment.id,
+                    'element_path': comment.element_path,
+                    'payload': json.dumps(comment_event_data(comment), ensure_ascii=False)
+                } for comment in comments)
+            db.session.execute(insert(CommentEvent), events)
+        # Buiten het ORM om bijgewerkt: de gecachte antwoorden van beide kanten ongeldig maken
+        response_cache.mark_changed(db.session, set(mapping) | set(mapping.values()))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {'paths': len(mapping), 'comments': len(moved_ids)}
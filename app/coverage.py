@@ -0,0 +1,165 @@
+"""
+Reviewdekking: hoeveel commentaar en hoeveel verschillende reviewers per vraag en per
+(sub)sectie, en welke vragen nog geen commentaar hebben.
+
+De cijfers komen uit `comment_coverage`: per pad en auteur het aantal commentaren. Triggers
+op `comment` houden die tabel bij bij elke insert, update en delete, ook bij imports en
+bulk-inserts buiten het ORM om. Het dashboard leest dus hoogstens (paden × auteurs) rijen
+en nooit de commentaren zelf. De tabel wordt eenmalig gevuld door migratie 6.
+"""
+from sqlalchemy import inspect, text
+
+from app import db, template_registry
+from app.models import CommentCoverage, CommentPath, template_path_filter
+from app.template_compiler import flatten_leaf_nodes
+
+_SQLITE_SCHEMA = [
+    "CREATE TRIGGER IF NOT EXISTS comment_coverage_ai AFTER INSERT ON comment BEGIN "
+    "INSERT INTO comment_coverage (path_id, author_name, comment_count) VALUES (new.path_id, new.author_name, 1) "
+    "ON CONFLICT (path_id, author_name) DO UPDATE SET comment_count = comment_count + 1; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS comment_coverage_ad AFTER DELETE ON comment BEGIN "
+    "UPDATE comment_coverage SET comment_count = comment_count - 1 "
+    "WHERE path_id = old.path_id AND author_name = old.author_name; "
+    "DELETE FROM comment_coverage WHERE path_id = old.path_id AND author_name = old.author_name AND comment_count <= 0; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS comment_coverage_au AFTER UPDATE OF path_id, author_name ON comment "
+    "WHEN old.path_id IS NOT new.path_id OR old.author_name IS NOT new.author_name BEGIN "
+    "UPDATE comment_coverage SET comment_count = comment_count - 1 "
+    "WHERE path_id = old.path_id AND author_name = old.author_name; "
+    "DELETE FROM comment_coverage WHERE path_id = old.path_id AND author_name = old.author_name AND comment_count <= 0; "
+    "INSERT INTO comment_coverage (path_id, author_name, comment_count) VALUES (new.path_id, new.author_name, 1) "
+    "ON CONFLICT (path_id, author_name) DO UPDATE SET comment_count = comment_count + 1; "
+    "END",
+]
+
+_POSTGRESQL_SCHEMA = [
+    """
+    CREATE OR REPLACE FUNCTION comment_coverage_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            UPDATE comment_coverage SET comment_count = comment_count - 1
+            WHERE path_id = OLD.path_id AND author_name = OLD.author_name;
+            DELETE FROM comment_coverage
+            WHERE path_id = OLD.path_id AND author_name = OLD.author_name AND comment_count <= 0;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO comment_coverage (path_id, author_name, comment_count) VALUES (NEW.path_id, NEW.author_name, 1)
+            ON CONFLICT (path_id, author_name) DO UPDATE SET comment_count = comment_coverage.comment_count + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS comment_coverage_update ON comment",
+    "CREATE TRIGGER comment_coverage_update AFTER INSERT OR DELETE OR UPDATE OF path_id, author_name ON comment "
+    "FOR EACH ROW EXECUTE FUNCTION comment_coverage_update()",
+]
+
+
+def ensure_coverage_triggers(connection, logger=None):
+    """
+    Maakt de triggers aan die `comment_coverage` bijhouden. Idempotent.
+
+    Aan te roepen na `db.create_all()`; andere databases dan SQLite en PostgreSQL krijgen geen
+    triggers (en dus geen actuele dekking).
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = _SQLITE_SCHEMA
+    elif dialect == 'postgresql':
+        statements = _POSTGRESQL_SCHEMA
+    else:
+        if logger:
+            logger.warning(f"WARN: Geen triggers voor reviewdekking op {dialect}; 'comment_coverage' blijft leeg.")
+        return
+    if not inspect(connection).has_table('comment_coverage'):
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def _coverage_by_path(root_path):
+    """Pad → {auteur: aantal} voor alle paden binnen een template, uit de aggregaattabel."""
+    rows = db.session.query(CommentPath.path, CommentCoverage.author_name, CommentCoverage.comment_count) \
+        .join(CommentPath, CommentPath.id == CommentCoverage.path_id) \
+        .filter(*template_path_filter(root_path)).all()
+    by_path = {}
+    for path, author_name, comment_count in rows:
+        by_path.setdefault(path, {})[author_name] = comment_count
+    return by_path
+
+
+def template_coverage(template_id, language=None):
+    """
+    Dekking van een template per vraag en per genummerde (sub)sectie, met namen in `language`.
+
+    Een vraag is een uniek commentaarpad uit de leaf map (keuze-opties met een eigen pad
+    tellen apart). Commentaar op paden die geen vraag (meer) zijn, staat in `other_comments`.
+
+    Returns:
+        dict: `totals`, `sections` (in documentvolgorde, met `level`) en `questions`
+        (met `section_number` van de dichtstbijzijnde genummerde sectie).
+    """
+    questionnaire = template_registry.get_questionnaire(template_id, language)
+    by_path = _coverage_by_path(template_registry.root_path(template_id))
+
+    questions = {}
+    sections = []
+    # (node, ketens van open secties); elke vraag telt mee in alle secties erboven
+    stack = [(item, ()) for item in reversed(questionnaire.get('content', []))]
+    while stack:
+        node, open_sections = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if node.get('is_leaf'):
+            for row in flatten_leaf_nodes(node, {}).values():
+                path = row['comment_path']
+                if not path or path in questions:
+                    continue
+                authors = by_path.get(path, {})
+                questions[path] = {
+                    'element_path': path, 'name': row['csv_name'],
+                    'section_number': open_sections[-1]['number'] if open_sections else None,
+                    'comments': sum(authors.values()), 'authors': len(authors)
+                }
+                for section in open_sections:
+                    section['_paths'].append(path)
+            continue
+        if node.get('section_number'):
+            section = {
+                'number': node['section_number'], 'name': node.get('name', {}).get('value'),
+                'semantic_path': node.get('semantic_path'), 'level': len(open_sections), '_paths': []
+            }
+            sections.append(section)
+            open_sections = open_sections + (section,)
+        stack.extend((child, open_sections) for child in reversed(node.get('children') or []))
+
+    for section in sections:
+        paths = section.pop('_paths')
+        authors = set()
+        for path in paths:
+            authors.update(by_path.get(path, ()))
+        section.update(
+            questions=len(paths),
+            commented=sum(1 for path in paths if questions[path]['comments']),
+            comments=sum(questions[path]['comments'] for path in paths),
+            authors=len(authors),
+            uncommented=[path for path in paths if not questions[path]['comments']]
+        )
+
+    all_authors = set()
+    for authors in by_path.values():
+        all_authors.update(authors)
+    commented = sum(1 for question in questions.values() if question['comments'])
+    question_comments = sum(question['comments'] for question in questions.values())
+    return {
+        'template_id': template_id,
+        'totals': {
+            'questions': len(questions), 'commented': commented, 'uncommented': len(questions) - commented,
+            'comments': question_comments, 'authors': len(all_authors),
+            'other_comments': sum(sum(authors.values()) for authors in by_path.values()) - question_comments
+        },
+        'sections': sections,
+        'questions': list(questions.values())
+    }
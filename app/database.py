@@ -0,0 +1,132 @@
+"""
+Configuratie van de database-engines voor productie: SQLite met WAL, PostgreSQL met een
+connection pool, en optioneel een leesreplica.
+
+SQLite
+    Elke verbinding krijgt bij het openen `journal_mode=WAL` (lezers blokkeren de schrijver niet
+    meer en omgekeerd), `synchronous=NORMAL` (veilig in WAL, geen fsync per commit), een
+    `busy_timeout` en een grotere page cache. Transacties die schrijven beginnen met
+    `BEGIN IMMEDIATE`: de schrijflock wordt vooraf genomen, met wachten op de busy timeout, in
+    plaats van halverwege de transactie met direct `database is locked` als gevolg.
+
+PostgreSQL
+    Een pool per worker van `DATABASE_POOL_SIZE` verbindingen plus `DATABASE_MAX_OVERFLOW`,
+    met `pool_pre_ping` (verbindingen die de server of een proxy heeft gesloten, worden
+    vervangen in plaats van een fout op te leveren) en `pool_recycle`.
+
+Leesreplica
+    Met `DATABASE_REPLICA_URL` gaan de queries van views met `@read_only` (lijsten, zoeken,
+    dekking, exports) naar de replica. Schrijven binnen zo'n request gaat altijd naar de primaire.
+    Zonder replica verandert er niets; SQLite in WAL heeft geen aparte leesverbinding nodig.
+"""
+import functools
+
+import flask_sqlalchemy.session
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.sql import CompoundSelect, Select
+
+REPLICA_BIND = 'replica'
+
+
+def read_only(view):
+    """Decorator voor views die alleen lezen: hun queries mogen naar de leesreplica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g._db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(flask_sqlalchemy.session.Session):
+    """
+    Session die SELECT-queries in `@read_only`-views naar de replica stuurt (als die er is).
+    Flushes en UPDATE/DELETE-statements gaan altijd naar de primaire database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, (Select, CompoundSelect))
+                and has_request_context() and g.get('_db_read_only')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _sqlite_options(app):
+    # timeout: hoe lang sqlite3 op een lock wacht (seconden); zet de busy timeout van de verbinding
+    return {'connect_args': {'timeout': app.config.get('SQLITE_BUSY_TIMEOUT', 30.0)}}
+
+
+def _pool_options(app):
+    return {
+        'pool_size': app.config.get('DATABASE_POOL_SIZE', 5),
+        'max_overflow': app.config.get('DATABASE_MAX_OVERFLOW', 10),
+        'pool_timeout': app.config.get('DATABASE_POOL_TIMEOUT', 30),
+        'pool_recycle': app.config.get('DATABASE_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+def engine_options(app, url, explicit=None):
+    """Engine-opties voor een database-URL; `explicit` (uit `SQLALCHEMY_ENGINE_OPTIONS`) gaat voor."""
+    options = _sqlite_options(app) if url.startswith('sqlite') else _pool_options(app)
+    return {**options, **(explicit or {})}
+
+
+def _configure_sqlite_engine(app, engine):
+    pragmas = [
+        f"PRAGMA journal_mode={app.config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA synchronous={app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA cache_size=-{int(app.config.get('SQLITE_CACHE_SIZE_KB', 65536))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        # pysqlite opent vóór de eerste INSERT/UPDATE/DELETE zelf een transactie; met IMMEDIATE
+        # wacht die op de schrijflock. Lezen daarvoor gebeurt buiten een transactie, zoals voorheen
+        dbapi_connection.isolation_level = 'IMMEDIATE'
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+class Database:
+    """
+    Zet de engine-opties klaar, initialiseert Flask-SQLAlchemy en koppelt de SQLite-instellingen.
+
+    Vervangt `db.init_app(app)`: de opties moeten vóór het aanmaken van de engines bekend zijn.
+    Met `DATABASE_TUNING = False` blijft alles bij de standaardinstellingen (voor vergelijkingen).
+    """
+
+    def __init__(self, db=None, app=None):
+        self.db = db
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config['SQLALCHEMY_DATABASE_URI']
+        tuning = app.config.get('DATABASE_TUNING', True)
+        explicit = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        if tuning:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app, url, explicit)
+        replica_url = app.config.get('DATABASE_REPLICA_URL')
+        if replica_url:
+            binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+            binds[REPLICA_BIND] = {'url': replica_url, **(engine_options(app, replica_url, explicit) if tuning else {})}
+            app.config['SQLALCHEMY_BINDS'] = binds
+        self.db.init_app(app)
+        if tuning:
+            with app.app_context():
+                for engine in self.db.engines.values():
+                    if engine.dialect.name == 'sqlite':
+                        _configure_sqlite_engine(app, engine)
+        app.extensions['database'] = self
+
+    @staticmethod
+    def pool_status():
+        """Bezetting van de connection pools per bind (`pool.status()`), voor diagnose."""
+        db = current_app.extensions['sqlalchemy']
+        return {key or 'primary': engine.pool.status() for key, engine in db.engines.items()}
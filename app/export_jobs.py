@@ -0,0 +1,189 @@
+"""
+Exports op de achtergrond.
+
+Grote exports draaien niet meer binnen een gunicorn-request maar in een kleine threadpool
+per worker. De status en voortgang staan in de tabel `export_job`, het resultaat als
+bestand in `EXPORT_DIR`; zo kan elke worker de status tonen en het bestand serveren.
+
+Het resultaat wordt hergebruikt zolang de template (content-hash) en de commentaren
+(aantal, hoogste ID, laatste wijziging) niet veranderd zijn: dat vormt samen de `cache_key`.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db, template_registry
+from app.exporters import get_exporter
+from app.models import ExportJob, _utcnow, comment_state, template_path_filter
+
+# Voortgang hoogstens zo vaak (seconden) naar de database schrijven
+PROGRESS_INTERVAL = 1.0
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class ExportJobQueue:
+    """
+    Lokale wachtrij voor exports, zonder externe broker.
+
+    Een thread (geen proces) per job: de export heeft de app-context, de template-cache
+    en de databaseverbinding nodig, en besteedt zijn tijd vooral aan I/O.
+    """
+
+    def __init__(self, app=None):
+        self.export_dir = None
+        self.max_workers = 2
+        self.stale_seconds = 120.0
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.export_dir = app.config.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+        self.max_workers = app.config.get('EXPORT_JOB_WORKERS', 2)
+        self.stale_seconds = app.config.get('EXPORT_JOB_STALE_SECONDS', 120.0)
+        app.extensions['export_jobs'] = self
+
+    def _get_executor(self):
+        # Pas bij de eerste job aanmaken: na een fork (gunicorn --preload) heeft elke worker een eigen pool nodig
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='export-job')
+        return self._executor
+
+    def cache_key(self, template_id, export_format):
+        """Sleutel van de invoer van een export: template-inhoud, commentaarstand en formaat."""
+        content_hash = template_registry.get_snapshot(template_id).content_hash
+        count, max_id, max_updated_at = comment_state(*template_path_filter(template_registry.root_path(template_id)))
+        state = f"{template_id}:{export_format}:{content_hash}:{count}:{max_id}:{max_updated_at}"
+        return hashlib.sha256(state.encode('utf-8')).hexdigest()
+
+    def submit(self, template_id, export_format):
+        """
+        Vraagt een export aan, of hergebruikt een bestaande job met dezelfde invoer.
+
+        Args:
+            template_id (str): Een bekend template-ID.
+            export_format (str): Naam van een beschikbare exporter.
+        Returns:
+            tuple[ExportJob, bool]: De job en of hij nieuw is aangemaakt.
+        """
+        self.expire_stale()
+        cache_key = self.cache_key(template_id, export_format)
+        for existing in ExportJob.query.filter_by(cache_key=cache_key) \
+                .filter(ExportJob.status.in_(ACTIVE_STATUSES + ('done',))) \
+                .order_by(ExportJob.created_at.desc()):
+            if existing.status != 'done' or (existing.result_path and os.path.exists(existing.result_path)):
+                return existing, False
+            existing.status = 'expired' # Resultaatbestand is verdwenen (bv. opgeruimd)
+        job = ExportJob(id=uuid.uuid4().hex, template_id=template_id, export_format=export_format,
+                        cache_key=cache_key, status='queued', progress=0)
+        db.session.add(job)
+        db.session.commit()
+        self._get_executor().submit(self._run, current_app._get_current_object(), job.id)
+        return job, True
+
+    def get(self, job_id):
+        self.expire_stale()
+        return db.session.get(ExportJob, job_id)
+
+    def expire_stale(self):
+        """Markeert jobs zonder recente heartbeat als mislukt (de worker is gestopt of herstart)."""
+        threshold = _utcnow() - timedelta(seconds=self.stale_seconds)
+        updated = ExportJob.query \
+            .filter(ExportJob.status.in_(ACTIVE_STATUSES)) \
+            .filter(func.coalesce(ExportJob.heartbeat_at, ExportJob.created_at) < threshold) \
+            .update({'status': 'failed', 'error': 'Export afgebroken (geen heartbeat meer ontvangen).',
+                     'finished_at': _utcnow()}, synchronize_session=False)
+        if updated:
+            db.session.commit()
+        return updated
+
+    def _run(self, app, job_id):
+        with app.app_context():
+            part_path = None
+            try:
+                job = db.session.get(ExportJob, job_id)
+                if job is None or job.status != 'queued':
+                    return
+                job.status = 'running'
+                job.started_at = job.heartbeat_at = _utcnow()
+                db.session.commit()
+
+                exporter = get_exporter(job.export_format)
+                if exporter is None:
+                    raise ValueError(f"Exportformaat '{job.export_format}' is niet beschikbaar.")
+                all_questions_map = template_registry.get_leaf_map(job.template_id)
+
+                os.makedirs(self.export_dir, exist_ok=True)
+                result_path = os.path.join(self.export_dir, f"{job.id}.{exporter.extension}")
+                part_path = f"{result_path}.part"
+                last_progress_write = [time.monotonic()]
+
+                def progress(done, total):
+                    # Aangeroepen tussen blokken, als de cursor van het vorige blok leeg is
+                    now = time.monotonic()
+                    if now - last_progress_write[0] < PROGRESS_INTERVAL:
+                        return
+                    last_progress_write[0] = now
+                    job.progress = int(done * 100 / total) if total else 100
+                    job.heartbeat_at = _utcnow()
+                    db.session.commit()
+
+                started = time.perf_counter()
+                with open(part_path, 'wb') as f:
+                    exporter.write(job.template_id, all_questions_map, f, progress=progress)
+                os.replace(part_path, result_path)
+                part_path = None
+
+                job.status = 'done'
+                job.progress = 100
+                job.result_path = result_path
+                job.result_size = os.path.getsize(result_path)
+                job.finished_at = job.heartbeat_at = _utcnow()
+                db.session.commit()
+                app.logger.info(f"Export {job.id} ({job.template_id}, {job.export_format}) klaar in "
+                                f"{time.perf_counter() - started:.2f}s, {job.result_size} bytes.")
+                self._prune(job)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"FOUT: Export {job_id} mislukt: {e}", exc_info=True)
+                job = db.session.get(ExportJob, job_id)
+                if job is not None:
+                    job.status = 'failed'
+                    job.error = str(e)
+                    job.finished_at = _utcnow()
+                    db.session.commit()
+                if part_path:
+                    try:
+                        os.unlink(part_path)
+                    except OSError:
+                        pass
+            finally:
+                db.session.remove()
+
+    def _prune(self, job):
+        """Oudere resultaten van dezelfde template en hetzelfde formaat zijn achterhaald: bestanden weg."""
+        older = ExportJob.query.filter(
+            ExportJob.template_id == job.template_id, ExportJob.export_format == job.export_format,
+            ExportJob.status == 'done', ExportJob.id != job.id, ExportJob.created_at <= job.created_at
+        ).all()
+        for old_job in older:
+            if old_job.result_path:
+                try:
+                    os.unlink(old_job.result_path)
+                except OSError:
+                    pass
+            old_job.status = 'expired'
+        if older:
+            db.session.commit()
@@ -0,0 +1,270 @@
+"""
+Exportformaten voor commentaren.
+
+Alle exporters werken op dezelfde platte vragenlijst (leaf map uit
+`template_compiler.flatten_leaf_nodes`) en halen commentaren per blok vragen op, zodat het
+geheugengebruik niet meegroeit met de commentaartabel. Een exporter streamt tekst/bytes
+(`stream`) of schrijft naar een bestand (`write`) voor formaten die een complete
+container nodig hebben (XLSX, Parquet).
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+
+from app import db, template_registry
+from app.models import Comment, CommentPath
+
+try:
+    from openpyxl import Workbook
+except ImportError: # Optioneel: zonder openpyxl geen XLSX-export
+    Workbook = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError: # Optioneel: zonder pyarrow geen Parquet-export
+    pyarrow = None
+
+# Aantal vragen per blok, en batchgrootte van de commentaar-cursor
+EXPORT_CHUNK_QUESTIONS = 500
+EXPORT_YIELD_PER = 1000
+# Aantal rijen per Parquet row group
+PARQUET_BATCH_ROWS = 10000
+
+# Kolommen van de exports met één rij per commentaar
+COMMENT_ROW_FIELDS = [
+    'template_id', 'section_number', 'question_name', 'node_id', 'element_path', 'aql_path',
+    'comment_id', 'parent_id', 'author_name', 'created_at', 'updated_at', 'comment_text'
+]
+
+
+def _iter_question_chunks(all_questions_map, progress=None):
+    """
+    Splitst de vragenlijst in blokken van EXPORT_CHUNK_QUESTIONS.
+
+    Args:
+        progress (callable, optioneel): Wordt na elk verwerkt blok aangeroepen met
+            (aantal verwerkte vragen, totaal aantal vragen).
+    """
+    questions = list(all_questions_map.values())
+    for chunk_start in range(0, len(questions), EXPORT_CHUNK_QUESTIONS):
+        yield questions[chunk_start:chunk_start + EXPORT_CHUNK_QUESTIONS]
+        if progress is not None:
+            progress(min(chunk_start + EXPORT_CHUNK_QUESTIONS, len(questions)), len(questions))
+
+
+def _execute_for_paths(columns, paths):
+    """
+    Voert een select op kale kolommen uit voor een reeks paden, gesorteerd per pad en tijd.
+
+    Leest in batches via yield_per, wat op Postgres een server-side cursor gebruikt.
+    """
+    statement = db.select(CommentPath.path, *columns) \
+        .join(Comment.path) \
+        .where(CommentPath.path.in_(paths)) \
+        .order_by(CommentPath.path, Comment.created_at.asc(), Comment.id) \
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    return db.session.execute(statement)
+
+
+def _isoformat(value):
+    return value.isoformat() + 'Z' if value else None
+
+
+def iter_comment_rows(template_id, all_questions_map, progress=None):
+    """
+    Eén dict per commentaar (zie COMMENT_ROW_FIELDS), in de volgorde van de vragenlijst.
+
+    Een pad dat bij meerdere vragen hoort (bv. keuze-opties zonder eigen pad), levert zijn
+    commentaren maar één keer op, bij de eerste vraag.
+    """
+    columns = (Comment.id, Comment.parent_id, Comment.author_name,
+               Comment.created_at, Comment.updated_at, Comment.comment_text)
+    path_index = template_registry.get_path_index(template_id)
+    seen_paths = set()
+    for chunk in _iter_question_chunks(all_questions_map, progress):
+        chunk_paths = {question.get('comment_path') for question in chunk if question.get('comment_path')} - seen_paths
+        if not chunk_paths:
+            continue
+        rows_by_path = defaultdict(list)
+        for row in _execute_for_paths(columns, chunk_paths):
+            rows_by_path[row[0]].append(row)
+        for question in chunk:
+            element_path = question.get('comment_path')
+            if element_path not in chunk_paths or element_path in seen_paths:
+                continue
+            seen_paths.add(element_path)
+            node = path_index.get(element_path)
+            section_number = path_index.section_number(element_path)
+            for _, comment_id, parent_id, author_name, created_at, updated_at, comment_text in rows_by_path.get(element_path, []):
+                yield {
+                    'template_id': template_id,
+                    'section_number': section_number,
+                    'question_name': question.get('csv_name', 'N.v.t.'),
+                    'node_id': question.get('csv_node_id', 'N.v.t.'),
+                    'element_path': element_path,
+                    'aql_path': node['aql_path'] if node else None,
+                    'comment_id': comment_id,
+                    'parent_id': parent_id,
+                    'author_name': author_name,
+                    'created_at': _isoformat(created_at),
+                    'updated_at': _isoformat(updated_at),
+                    'comment_text': comment_text,
+                }
+
+
+class Exporter:
+    """
+    Basisklasse. `streaming` exporters implementeren `stream`, de andere `write`.
+
+    Beide accepteren een optionele `progress`-callback (zie `_iter_question_chunks`),
+    die de achtergrond-exports gebruiken om de voortgang bij te houden.
+    """
+    name = None
+    label = None
+    mimetype = 'application/octet-stream'
+    extension = None
+    streaming = False
+
+    @property
+    def available(self):
+        return True
+
+    def filename(self, template_id):
+        return f"commentaren_{template_id}.{self.extension}"
+
+    def stream(self, template_id, all_questions_map, progress=None):
+        raise NotImplementedError
+
+    def write(self, template_id, all_questions_map, fileobj, progress=None):
+        """Schrijft de volledige export naar een binair bestandsobject."""
+        for chunk in self.stream(template_id, all_questions_map, progress):
+            fileobj.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+
+class QuestionCsvExporter(Exporter):
+    """De oorspronkelijke export: één rij per vraag, commentaren samengevoegd met '; '."""
+    name = 'csv'
+    label = 'CSV (per vraag)'
+    mimetype = 'text/csv'
+    extension = 'csv'
+    streaming = True
+
+    def filename(self, template_id):
+        return "commentaren_export_per_vraag.csv"
+
+    def stream(self, template_id, all_questions_map, progress=None):
+        output = io.StringIO()
+        writer = csv.writer(output, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(['Vraag Naam', 'Node ID', 'Commentaar'])
+        yield output.getvalue()
+
+        for chunk in _iter_question_chunks(all_questions_map, progress):
+            chunk_paths = {question.get('comment_path') for question in chunk if question.get('comment_path')}
+            comments_by_element_path = defaultdict(list)
+            if chunk_paths:
+                for element_path, comment_text in _execute_for_paths((Comment.comment_text,), chunk_paths):
+                    comments_by_element_path[element_path].append(comment_text.replace('\r', '').replace('\n', ' '))
+
+            output.seek(0)
+            output.truncate(0)
+            for question_details in chunk:
+                comment_path_for_this_question = question_details.get('comment_path')
+                associated_comments_list = comments_by_element_path.get(comment_path_for_this_question, []) \
+                    if comment_path_for_this_question else []
+                writer.writerow([
+                    question_details.get('csv_name', 'N.v.t.'),
+                    question_details.get('csv_node_id', 'N.v.t.'),
+                    "; ".join(associated_comments_list)
+                ])
+            yield output.getvalue()
+
+
+class JsonLinesExporter(Exporter):
+    name = 'jsonl'
+    label = 'JSON Lines (per commentaar)'
+    mimetype = 'application/x-ndjson'
+    extension = 'jsonl'
+    streaming = True
+
+    def stream(self, template_id, all_questions_map, progress=None):
+        lines = []
+        for row in iter_comment_rows(template_id, all_questions_map, progress):
+            lines.append(json.dumps(row, ensure_ascii=False))
+            if len(lines) >= EXPORT_YIELD_PER:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
+class XlsxExporter(Exporter):
+    name = 'xlsx'
+    label = 'Excel (per commentaar)'
+    mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    extension = 'xlsx'
+
+    @property
+    def available(self):
+        return Workbook is not None
+
+    def write(self, template_id, all_questions_map, fileobj, progress=None):
+        # write_only: rijen worden direct naar de zip-stream geschreven, niet als cellen bewaard
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(title='Commentaren')
+        worksheet.append(COMMENT_ROW_FIELDS)
+        for row in iter_comment_rows(template_id, all_questions_map, progress):
+            worksheet.append([row[field] for field in COMMENT_ROW_FIELDS])
+        workbook.save(fileobj)
+
+
+class ParquetExporter(Exporter):
+    name = 'parquet'
+    label = 'Parquet (per commentaar)'
+    mimetype = 'application/vnd.apache.parquet'
+    extension = 'parquet'
+
+    @property
+    def available(self):
+        return pyarrow is not None
+
+    def _schema(self):
+        return pyarrow.schema([
+            ('template_id', pyarrow.string()), ('section_number', pyarrow.string()),
+            ('question_name', pyarrow.string()), ('node_id', pyarrow.string()),
+            ('element_path', pyarrow.string()), ('aql_path', pyarrow.string()),
+            ('comment_id', pyarrow.int64()), ('parent_id', pyarrow.int64()),
+            ('author_name', pyarrow.string()),
+            ('created_at', pyarrow.string()), ('updated_at', pyarrow.string()),
+            ('comment_text', pyarrow.string()),
+        ])
+
+    def write(self, template_id, all_questions_map, fileobj, progress=None):
+        schema = self._schema()
+        writer = pyarrow_parquet.ParquetWriter(fileobj, schema)
+        try:
+            batch = []
+            for row in iter_comment_rows(template_id, all_questions_map, progress):
+                batch.append(row)
+                if len(batch) >= PARQUET_BATCH_ROWS:
+                    writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                    batch = []
+            # Ook een lege export krijgt een geldig bestand met schema
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+        finally:
+            writer.close()
+
+
+EXPORTERS = {exporter.name: exporter for exporter in (
+    QuestionCsvExporter(), JsonLinesExporter(), XlsxExporter(), ParquetExporter()
+)}
+
+
+def get_exporter(name):
+    exporter = EXPORTERS.get(name)
+    return exporter if exporter is not None and exporter.available else None
+
+
+def available_exporters():
+    return [exporter for exporter in EXPORTERS.values() if exporter.available]
@@ -0,0 +1,87 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Woorden in kleine letters en zonder accenten ('Wilsverklaring, één' → ['wilsverklaring', 'een'])."""
+    if not text:
+        return []
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return _WORD.findall(''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+class LabelIndex:
+    """
+    Omgekeerde index over de weergavenamen van de nodes van één templateversie.
+
+    Wordt opgebouwd uit de `PathIndex` (de namen die `get_node_name` in de voorkeurstaal
+    opleverde) en verandert niet meer; een nieuwe templateversie krijgt een nieuwe index.
+    Elk zoekwoord moet voorkomen, als heel woord of als begin van een woord.
+
+    Args:
+        path_index (PathIndex): Index van dezelfde templateversie.
+    """
+
+    def __init__(self, path_index):
+        self._entries = []
+        postings = defaultdict(set)
+        for semantic_path, node in path_index.nodes.items():
+            tokens = tokenize(node.get('name'))
+            if not tokens:
+                continue
+            position = len(self._entries)
+            self._entries.append((semantic_path, node))
+            for token in tokens:
+                postings[token].add(position)
+        self._postings = dict(postings)
+        self._tokens = sorted(postings)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _matches(self, term):
+        """Posities met `term` als heel woord (score 2) of als begin van een woord (score 1)."""
+        scores = {}
+        start = bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            weight = 2 if token == term else 1
+            for position in self._postings[token]:
+                if scores.get(position, 0) < weight:
+                    scores[position] = weight
+        return scores
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Nodes waarvan de naam alle woorden uit `query` bevat, best passend eerst.
+
+        Vragen (leaf-nodes) gaan bij gelijke score voor secties; daarna geldt de documentvolgorde.
+
+        Returns:
+            tuple[list[dict], bool]: De resultaten (node-gegevens met `semantic_path` en `score`)
+            en of er meer zijn.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return [], False
+        scores = None
+        for term in dict.fromkeys(terms):
+            matches = self._matches(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {position: score + matches[position] for position, score in scores.items() if position in matches}
+            if not scores:
+                return [], False
+        ranked = sorted(scores, key=lambda position: (-(scores[position] + self._entries[position][1].get('is_leaf', False)), position))
+        page = ranked[offset:offset + limit]
+        results = []
+        for position in page:
+            semantic_path, node = self._entries[position]
+            results.append({'semantic_path': semantic_path, 'score': scores[position], **node})
+        return results, len(ranked) > offset + limit
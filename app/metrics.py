@@ -0,0 +1,393 @@
+"""
+Metingen per request: duur per route, SQL-statements (aantal en tijd) en de tellers van de
+template-cache en de response-cache.
+
+Elke worker houdt zijn eigen tellers bij en schrijft ze hoogstens eens per
+`METRICS_FLUSH_INTERVAL` seconden naar `METRICS_DIR/metrics-<ppid>-<pid>.json`. Het endpoint
+`/metrics` telt de bestanden van alle workers onder dezelfde master (ppid) op en geeft het
+resultaat in het tekstformaat van Prometheus. Tellers van gestopte workers blijven meetellen
+(tellers mogen niet dalen): bij het scrapen gaan hun bestanden op in één
+`metrics-<ppid>-retired.json`. Na een herstart van de master begint de telling opnieuw; de
+eerste flush van een worker ruimt de bestanden van masters die niet meer draaien op.
+
+Daarnaast krijgt elk antwoord een `Server-Timing`-header (totaal, database, template, cache), zodat
+de browser-devtools laten zien waar de tijd van een trage request zit.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Grenzen (seconden) van de histogram-buckets voor requestduur
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    'http_requests_total': ('counter', "Aantal afgehandelde requests."),
+    'http_request_duration_seconds': ('histogram', "Duur van requests tot het antwoord klaarstaat."),
+    'db_statements_total': ('counter', "Aantal SQL-statements binnen requests (ook tijdens het streamen)."),
+    'db_statement_duration_seconds_total': ('counter', "Totale tijd van SQL-statements binnen requests (ook tijdens het streamen)."),
+    'template_cache_hits_total': ('counter', "Treffers in de template-cache."),
+    'template_cache_misses_total': ('counter', "Missers in de template-cache."),
+    'template_cache_evictions_total': ('counter', "Uit de template-cache verwijderde templates."),
+    'template_builds_total': ('counter', "Opgebouwde afgeleide vormen van templates, per soort."),
+    'template_reloads_total': ('counter', "Templates herladen na een wijziging op schijf."),
+    'template_reload_failures_total': ('counter', "Mislukte template-reloads."),
+    'template_reload_seconds_total': ('counter', "Totale duur van template-reloads."),
+    'template_last_reload_seconds': ('gauge', "Duur van de laatste template-reload (langste over de workers)."),
+    'response_cache_hits_total': ('counter', "Antwoorden uit de gedeelde response-cache."),
+    'response_cache_misses_total': ('counter', "Missers in de response-cache (antwoord opnieuw opgebouwd)."),
+    'response_cache_stores_total': ('counter', "In de response-cache opgeslagen antwoorden."),
+    'response_cache_invalidations_total': ('counter', "Ongeldig gemaakte paden in de response-cache."),
+    'response_cache_evictions_total': ('counter', "Uit de response-cache verwijderde (minst recent gebruikte) antwoorden."),
+    'response_cache_seconds_total': ('counter', "Totale tijd van lezen, opslaan en invalideren in de response-cache."),
+    'metrics_workers': ('gauge', "Aantal workers waarvan metingen zijn meegeteld."),
+}
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+def add_server_timing(name, seconds):
+    """Telt tijd op bij een onderdeel van de Server-Timing-header van de huidige request (indien aanwezig)."""
+    if has_request_context():
+        timings = g.get('_metrics_timings')
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+class Metrics:
+    """
+    Flask-extensie voor metingen per request en het `/metrics`-endpoint.
+
+    Tellers zijn per proces; zie de moduledocumentatie voor de aggregatie over workers.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.metrics_dir = None
+        self.flush_interval = 2.0
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._stale_files_removed = False
+        self._template_registry = None
+        self._response_cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.metrics_dir = app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'review-metrics')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 2.0)
+        self._template_registry = app.extensions.get('template_registry')
+        self._response_cache = app.extensions.get('response_cache')
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        if not getattr(Metrics, '_sql_listeners_installed', False):
+            # Op de Engine-klasse: geldt voor elke engine, ook die pas later wordt aangemaakt
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            Metrics._sql_listeners_installed = True
+
+    # --- Per request ---
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_sql = [0, 0.0]
+        g._metrics_timings = {}
+
+    def _after_request(self, response):
+        started = g.get('_metrics_started')
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        sql_count, sql_time = g._metrics_sql
+        endpoint = request.endpoint or 'onbekend'
+
+        timing_parts = [f'app;dur={duration * 1000:.1f}',
+                        f'db;dur={sql_time * 1000:.1f};desc="{sql_count} queries"']
+        for name, seconds in g._metrics_timings.items():
+            timing_parts.append(f'{name};dur={seconds * 1000:.1f}')
+        response.headers.add('Server-Timing', ', '.join(timing_parts))
+
+        with self._lock:
+            self._counters[('http_requests_total', (('endpoint', endpoint), ('method', request.method),
+                                                    ('status', str(response.status_code))))] += 1
+            self._counters[('db_statements_total', (('endpoint', endpoint),))] += sql_count
+            self._counters[('db_statement_duration_seconds_total', (('endpoint', endpoint),))] += sql_time
+            self._observe('http_request_duration_seconds', (('endpoint', endpoint),), duration)
+        if response.is_streamed:
+            # Een gestreamd antwoord (stream_with_context, bv. de CSV-export) doet zijn queries pas
+            # na deze hook; ze komen in dezelfde teller en tellen mee als de stream gesloten wordt
+            response.call_on_close(self._streamed_sql_recorder(endpoint, g._metrics_sql, sql_count, sql_time))
+        self._maybe_flush()
+        return response
+
+    def _streamed_sql_recorder(self, endpoint, sql, counted, counted_time):
+        def record():
+            with self._lock:
+                self._counters[('db_statements_total', (('endpoint', endpoint),))] += sql[0] - counted
+                self._counters[('db_statement_duration_seconds_total', (('endpoint', endpoint),))] += sql[1] - counted_time
+            self._maybe_flush()
+        return record
+
+    def _observe(self, name, labels, value):
+        histogram = self._histograms.get((name, labels))
+        if histogram is None:
+            histogram = self._histograms[(name, labels)] = {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    # --- Delen tussen workers ---
+
+    def _worker_file(self, pid=None):
+        return os.path.join(self.metrics_dir, f"metrics-{os.getppid()}-{pid or os.getpid()}.json")
+
+    def _template_samples(self):
+        if self._template_registry is None or self._template_registry._snapshots is None:
+            return [], []
+        stats = self._template_registry.stats()
+        cache = stats['snapshots']
+        counters = [
+            ['template_cache_hits_total', [], cache['hits']],
+            ['template_cache_misses_total', [], cache['misses']],
+            ['template_cache_evictions_total', [], cache['evictions']],
+            ['template_reloads_total', [], stats['reloads']],
+            ['template_reload_failures_total', [], stats['reload_failures']],
+            ['template_reload_seconds_total', [], stats['reload_seconds_total']],
+        ]
+        for kind in ('questionnaire_builds', 'asset_builds', 'section_asset_builds', 'artifact_loads', 'artifact_writes'):
+            counters.append(['template_builds_total', [['kind', kind]], stats[kind]])
+        gauges = [['template_last_reload_seconds', [], stats['last_reload_seconds'] or 0.0]]
+        return counters, gauges
+
+    def _response_cache_samples(self):
+        if self._response_cache is None or not self._response_cache.enabled:
+            return []
+        stats = self._response_cache.stats()
+        return [[f'response_cache_{name}_total', [], stats[name]]
+                for name in ('hits', 'misses', 'stores', 'invalidations', 'evictions', 'seconds')]
+
+    def _snapshot(self):
+        with self._lock:
+            counters = [[name, [list(label) for label in labels], value]
+                        for (name, labels), value in self._counters.items()]
+            histograms = [[name, [list(label) for label in labels], dict(histogram, buckets=list(histogram['buckets']))]
+                          for (name, labels), histogram in self._histograms.items()]
+        template_counters, gauges = self._template_samples()
+        return {'pid': os.getpid(), 'updated_at': time.time(),
+                'counters': counters + template_counters + self._response_cache_samples(),
+                'histograms': histograms, 'gauges': gauges}
+
+    def flush(self):
+        """Schrijft de tellers van deze worker atomair naar zijn bestand."""
+        self._last_flush = time.monotonic()
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            if not self._stale_files_removed:
+                self._stale_files_removed = True
+                self._remove_stale_files()
+            fd, tmp_path = tempfile.mkstemp(prefix='.metrics-', dir=self.metrics_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp_path, self._worker_file())
+        except OSError:
+            pass # Metingen mogen een request nooit laten mislukken
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _remove_stale_files(self):
+        """Verwijdert de bestanden van vorige masters (een ander ppid dat niet meer draait)."""
+        master = str(os.getppid())
+        for name in os.listdir(self.metrics_dir):
+            parts = name.split('-')
+            if len(parts) < 3 or parts[0] != 'metrics' or parts[1] == master or not parts[1].isdigit():
+                continue
+            if not _process_exists(int(parts[1])):
+                try:
+                    os.unlink(os.path.join(self.metrics_dir, name))
+                except OSError:
+                    pass
+
+    def _retire_dead_workers(self):
+        """
+        Telt de bestanden van gestopte workers onder deze master op in het `retired`-bestand en
+        verwijdert ze. Onder een bestandslock, zodat twee workers die tegelijk gescrapet worden
+        een worker niet dubbel optellen; `pids` in het retired-bestand maakt het ook na een
+        onderbreking tussen schrijven en verwijderen idempotent.
+        """
+        prefix = f"metrics-{os.getppid()}-"
+        retired_path = os.path.join(self.metrics_dir, f"{prefix}retired.json")
+        try:
+            lock_file = open(os.path.join(self.metrics_dir, f"{prefix}retired.lock"), 'a')
+        except OSError:
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            dead = []
+            for name in os.listdir(self.metrics_dir):
+                pid = name[len(prefix):-len('.json')] if name.startswith(prefix) and name.endswith('.json') else ''
+                if pid.isdigit() and int(pid) != os.getpid() and not _process_exists(int(pid)):
+                    dead.append((name, int(pid)))
+            if not dead:
+                return
+            try:
+                with open(retired_path) as f:
+                    retired = json.load(f)
+            except (OSError, ValueError):
+                retired = {'pid': 'retired', 'counters': [], 'histograms': [], 'gauges': [], 'pids': []}
+            counters = {(name, tuple(map(tuple, labels))): value for name, labels, value in retired['counters']}
+            histograms = {(name, tuple(map(tuple, labels))): histogram for name, labels, histogram in retired['histograms']}
+            for name, pid in dead:
+                if pid in retired['pids']:
+                    continue
+                try:
+                    with open(os.path.join(self.metrics_dir, name)) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for metric, labels, value in snapshot['counters']:
+                    key = (metric, tuple(map(tuple, labels)))
+                    counters[key] = counters.get(key, 0.0) + value
+                for metric, labels, histogram in snapshot['histograms']:
+                    total = histograms.setdefault((metric, tuple(map(tuple, labels))),
+                                                  {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0.0, 'count': 0})
+                    total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                    total['sum'] += histogram['sum']
+                    total['count'] += histogram['count']
+                retired['pids'].append(pid)
+            retired.update(
+                counters=[[metric, [list(label) for label in labels], value] for (metric, labels), value in counters.items()],
+                histograms=[[metric, [list(label) for label in labels], histogram]
+                            for (metric, labels), histogram in histograms.items()],
+                pids=retired['pids'][-1000:], updated_at=time.time())
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix='.metrics-', dir=self.metrics_dir)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(retired, f)
+                os.replace(tmp_path, retired_path)
+            except OSError:
+                return
+            for name, _ in dead:
+                try:
+                    os.unlink(os.path.join(self.metrics_dir, name))
+                except OSError:
+                    pass
+
+    def _worker_snapshots(self):
+        """Snapshots van alle workers onder dezelfde master; die van dit proces is altijd actueel."""
+        own_file = self._worker_file()
+        prefix = f"metrics-{os.getppid()}-"
+        snapshots = [self._snapshot()]
+        try:
+            names = os.listdir(self.metrics_dir)
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(self.metrics_dir, name)
+            if not name.startswith(prefix) or not name.endswith('.json') or path == own_file:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Alle metingen, opgeteld over de workers, in het Prometheus-tekstformaat."""
+        snapshots = self._worker_snapshots()
+        counters = defaultdict(float)
+        gauges = {}
+        histograms = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, value in snapshot['gauges']:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = max(gauges.get(key, value), value)
+            for name, labels, histogram in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0.0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                total['sum'] += histogram['sum']
+                total['count'] += histogram['count']
+        gauges[('metrics_workers', ())] = sum(1 for snapshot in snapshots if snapshot['pid'] != 'retired')
+
+        samples = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            samples[name].append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), value in sorted(gauges.items()):
+            samples[name].append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), histogram in sorted(histograms.items()):
+            for bound, count in zip(DURATION_BUCKETS, histogram['buckets']):
+                samples[name].append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+            samples[name].append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            samples[name].append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:g}")
+            samples[name].append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+        lines = []
+        for name in sorted(samples):
+            metric_type, help_text = _HELP.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples[name])
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        self.flush()
+        try:
+            self._retire_dead_workers()
+        except OSError:
+            pass # Metingen mogen een request nooit laten mislukken
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('_metrics_sql') is not None:
+        conn.info.setdefault('_metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_stack = conn.info.get('_metrics_query_started')
+    if not started_stack or not has_request_context():
+        return
+    sql = g.get('_metrics_sql')
+    started = started_stack.pop()
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += time.perf_counter() - started
@@ -0,0 +1,206 @@
+"""
+Eenvoudige, idempotente schema-migraties voor bestaande databases (zoals `app.db`).
+
+`db.create_all()` maakt alleen ontbrekende tabellen aan; nieuwe kolommen of indexen op
+bestaande tabellen komen via de stappen hieronder. Het toegepaste niveau staat in de
+tabel `schema_version`. Een nieuwe database krijgt meteen het actuele schema via
+`create_all()` en wordt op het laatste niveau gezet.
+"""
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+from app import db
+from app.coverage import ensure_coverage_triggers
+from app.search import ensure_comment_search_index
+
+
+def _column_type(connection, column_type):
+    return column_type.compile(dialect=connection.dialect)
+
+
+def _comment_updated_at(connection):
+    connection.execute(text(
+        f"ALTER TABLE comment ADD COLUMN updated_at {_column_type(connection, db.DateTime())}"
+    ))
+    connection.execute(text("UPDATE comment SET updated_at = created_at"))
+
+
+def _intern_comment_paths(connection):
+    """
+    Zet `comment.element_path` om naar een verwijzing naar `comment_path`, voegt
+    template_id/template_version toe en de index (path_id, created_at).
+
+    De tabel wordt opnieuw opgebouwd (rename + create + copy), omdat SQLite geen NOT NULL
+    kolom zonder default kan toevoegen. De tabeldefinities staan hier bewust los van de
+    modellen: ze beschrijven het schema op dít migratieniveau.
+    """
+    metadata = sa.MetaData()
+    comment_path = sa.Table(
+        'comment_path', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('path', sa.String(500), nullable=False, unique=True),
+    )
+    comment = sa.Table(
+        'comment', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('path_id', sa.Integer, sa.ForeignKey('comment_path.id'), nullable=False),
+        sa.Column('comment_text', sa.Text, nullable=False),
+        sa.Column('author_name', sa.String(120), nullable=False),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('parent_id', sa.Integer, sa.ForeignKey('comment.id'), nullable=True),
+        sa.Column('template_id', sa.String(120), nullable=True),
+        sa.Column('template_version', sa.String(64), nullable=True),
+        sa.Index('ix_comment_path_id_created_at', 'path_id', 'created_at'),
+    )
+    comment_path.create(connection, checkfirst=True)
+    connection.execute(text(
+        "INSERT INTO comment_path (path) SELECT DISTINCT element_path FROM comment "
+        "WHERE element_path NOT IN (SELECT path FROM comment_path)"
+    ))
+    connection.execute(text("ALTER TABLE comment RENAME TO comment_legacy"))
+    comment.create(connection)
+    connection.execute(text(
+        "INSERT INTO comment (id, path_id, comment_text, author_name, created_at, updated_at, parent_id) "
+        "SELECT c.id, p.id, c.comment_text, c.author_name, c.created_at, c.updated_at, c.parent_id "
+        "FROM comment_legacy c JOIN comment_path p ON p.path = c.element_path"
+    ))
+    connection.execute(text("DROP TABLE comment_legacy"))
+    if connection.dialect.name == 'postgresql':
+        # De nieuwe SERIAL-sequence moet verder tellen vanaf de gekopieerde ID's
+        connection.execute(text(
+            "SELECT setval(pg_get_serial_sequence('comment', 'id'), COALESCE(MAX(id), 1)) FROM comment"
+        ))
+
+
+def _comment_change_log(connection):
+    """
+    Maakt `comment_event` het volledige wijzigingslog: index op comment_id, en een
+    'created'-event (zonder payload) voor elk bestaand commentaar, zodat een sync vanaf
+    cursor 0 alle commentaren ziet.
+    """
+    metadata = sa.MetaData()
+    comment_event = sa.Table(
+        'comment_event', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('template_id', sa.String(120), nullable=False),
+        sa.Column('action', sa.String(10), nullable=False),
+        sa.Column('comment_id', sa.Integer, nullable=False),
+        sa.Column('element_path', sa.String(500), nullable=False),
+        sa.Column('payload', sa.Text, nullable=True),
+        sa.Column('created_at', sa.DateTime),
+        sa.Index('ix_comment_event_created_at', 'created_at'),
+        sa.Index('ix_comment_event_template_id_id', 'template_id', 'id'),
+        sqlite_autoincrement=True,
+    )
+    comment_event.create(connection, checkfirst=True)
+    if 'ix_comment_event_comment_id' not in {index['name'] for index in inspect(connection).get_indexes('comment_event')}:
+        sa.Index('ix_comment_event_comment_id', comment_event.c.comment_id).create(connection)
+    # Template-ID is voor oude commentaren vaak onbekend; het eerste padsegment is de beste benadering
+    if connection.dialect.name == 'postgresql':
+        root_segment = "split_part(p.path, '/', 1)"
+    else:
+        root_segment = "CASE WHEN instr(p.path, '/') > 0 THEN substr(p.path, 1, instr(p.path, '/') - 1) ELSE p.path END"
+    connection.execute(text(
+        "INSERT INTO comment_event (template_id, action, comment_id, element_path, created_at) "
+        f"SELECT COALESCE(c.template_id, {root_segment}), 'created', c.id, p.path, COALESCE(c.updated_at, c.created_at) "
+        "FROM comment c JOIN comment_path p ON p.id = c.path_id "
+        "WHERE NOT EXISTS (SELECT 1 FROM comment_event e WHERE e.comment_id = c.id) "
+        "ORDER BY c.id"
+    ))
+
+
+def _comment_client_key(connection):
+    """Kolom `comment.client_key` met een unieke index (meerdere NULLs zijn toegestaan)."""
+    connection.execute(text(
+        f"ALTER TABLE comment ADD COLUMN client_key {_column_type(connection, db.String(120))}"
+    ))
+    connection.execute(text("CREATE UNIQUE INDEX ix_comment_client_key ON comment (client_key)"))
+
+
+def _comment_keyset_indexes(connection):
+    """
+    Indexen voor keyset-paginering op (created_at, id), en created_at met microseconden.
+
+    SQLite bewaart datetimes als tekst; `server_default` (CURRENT_TIMESTAMP) schreef ze zonder
+    microseconden, SQLAlchemy met. '2024-01-01 10:00:00' is dan niet gelijk aan dezelfde tijd
+    als parameter, en een cursor op zo'n rij zou rijen overslaan.
+    """
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(
+            "UPDATE comment SET created_at = created_at || '.000000' WHERE length(created_at) = 19"
+        ))
+    connection.execute(text("CREATE INDEX ix_comment_created_at_id ON comment (created_at, id)"))
+    connection.execute(text(
+        "CREATE INDEX ix_comment_author_name_created_at_id ON comment (author_name, created_at, id)"
+    ))
+
+
+def _comment_coverage(connection):
+    """
+    Aggregaattabel `comment_coverage` (aantal per pad en auteur), eenmalig gevuld uit `comment`.
+
+    Daarna houden triggers hem bij (zie `app.coverage`); die worden na `create_all()` aangemaakt.
+    """
+    metadata = sa.MetaData()
+    sa.Table('comment_path', metadata, sa.Column('id', sa.Integer, primary_key=True))
+    comment_coverage = sa.Table(
+        'comment_coverage', metadata,
+        sa.Column('path_id', sa.Integer, sa.ForeignKey('comment_path.id'), primary_key=True),
+        sa.Column('author_name', sa.String(120), primary_key=True),
+        sa.Column('comment_count', sa.Integer, nullable=False),
+    )
+    comment_coverage.create(connection, checkfirst=True)
+    connection.execute(text("DELETE FROM comment_coverage"))
+    connection.execute(text(
+        "INSERT INTO comment_coverage (path_id, author_name, comment_count) "
+        "SELECT path_id, author_name, COUNT(*) FROM comment GROUP BY path_id, author_name"
+    ))
+
+
+# (versie, omschrijving, functie) in volgorde van toepassen; nooit hernummeren
+MIGRATIONS = [
+    (1, "comment.updated_at", _comment_updated_at),
+    (2, "comment_path interning, template_id/version, index (path_id, created_at)", _intern_comment_paths),
+    (3, "comment_event als wijzigingslog (index comment_id, backfill)", _comment_change_log),
+    (4, "comment.client_key (idempotente import)", _comment_client_key),
+    (5, "indexen (created_at, id) en (author_name, created_at, id), created_at met microseconden", _comment_keyset_indexes),
+    (6, "comment_coverage (aantal per pad en auteur) voor het dekkingsdashboard", _comment_coverage),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _current_version(connection):
+    return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def _stamp(connection, version):
+    connection.execute(text("DELETE FROM schema_version"))
+    connection.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+
+
+def upgrade(logger=None):
+    """Brengt de database naar het actuele schema. Aan te roepen binnen een app context."""
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        is_new_database = not inspector.has_table('comment')
+        if not inspector.has_table('schema_version'):
+            connection.execute(text("CREATE TABLE schema_version (version INTEGER NOT NULL)"))
+        current_version = _current_version(connection)
+        if is_new_database:
+            current_version = LATEST_VERSION
+        for version, description, migrate in MIGRATIONS:
+            if version <= current_version:
+                continue
+            if logger:
+                logger.info(f"Database migratie {version}: {description}")
+            migrate(connection)
+            current_version = version
+        _stamp(connection, current_version)
+    # Alleen de primaire database; een leesreplica krijgt het schema via de replicatie
+    db.create_all(bind_key=None)
+    # Objecten die create_all() niet kent; idempotent, dus ook voor nieuwe databases
+    with db.engine.begin() as connection:
+        ensure_comment_search_index(connection, logger)
+        ensure_coverage_triggers(connection, logger)
@@ -1,11 +1,167 @@
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
 
+def _utcnow():
+    # Microseconden-precisie, zodat ETags op basis van updated_at elke wijziging zien
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class CommentPath(db.Model):
+    """
+    Geïnternde semantische paden: elk (lang) pad staat één keer in de database,
+    commentaren verwijzen ernaar via `Comment.path_id`.
+    """
+    __tablename__ = 'comment_path'
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), nullable=False, unique=True)
+
+    @classmethod
+    def intern(cls, path):
+        """Geeft de bestaande CommentPath voor `path` terug, of maakt hem aan (veilig bij gelijktijdige workers)."""
+        existing = db.session.execute(select(cls).filter_by(path=path)).scalar_one_or_none()
+        if existing is not None:
+            return existing
+        try:
+            with db.session.begin_nested():
+                comment_path = cls(path=path)
+                db.session.add(comment_path)
+            return comment_path
+        except IntegrityError:
+            # Een andere worker heeft hetzelfde pad net aangemaakt
+            return db.session.execute(select(cls).filter_by(path=path)).scalar_one()
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    element_path = db.Column(db.String(500), nullable=False)
+    path_id = db.Column(db.Integer, db.ForeignKey('comment_path.id'), nullable=False)
     comment_text = db.Column(db.Text, nullable=False)
     author_name = db.Column(db.String(120), nullable=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # default in Python: dezelfde precisie als updated_at, zodat (created_at, id) als cursor klopt
+    created_at = db.Column(db.DateTime, default=_utcnow, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow)
     parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)
-    
-    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy='dynamic')
\ No newline at end of file
+    template_id = db.Column(db.String(120), nullable=True)
+    template_version = db.Column(db.String(64), nullable=True)
+    # Idempotentiesleutel van een import (zie app.comment_import); leeg voor commentaren via de UI
+    client_key = db.Column(db.String(120), nullable=True)
+
+    path = db.relationship(CommentPath, lazy='joined', innerjoin=True)
+    # Niet dynamisch: threads worden in één query geladen via threads_for_path()
+    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]),
+                              lazy='select', order_by='Comment.created_at')
+
+    __table_args__ = (
+        # Opzoeken per pad, gesorteerd op tijd, zonder table scan
+        db.Index('ix_comment_path_id_created_at', 'path_id', 'created_at'),
+        db.Index('ix_comment_client_key', 'client_key', unique=True),
+        # Keyset-paginering op (created_at, id), zie app.pagination: alle commentaren en per auteur
+        db.Index('ix_comment_created_at_id', 'created_at', 'id'),
+        db.Index('ix_comment_author_name_created_at_id', 'author_name', 'created_at', 'id'),
+    )
+
+    @hybrid_property
+    def element_path(self):
+        return self.path.path if self.path is not None else None
+
+    @element_path.setter
+    def element_path(self, value):
+        self.path = CommentPath.intern(value)
+
+    @element_path.expression
+    def element_path(cls):
+        # Alleen als vangnet; gebruik in queries bij voorkeur een join op CommentPath
+        return select(CommentPath.path).where(CommentPath.id == cls.path_id).scalar_subquery()
+
+    @classmethod
+    def for_path_query(cls, element_path):
+        return cls.query.join(cls.path).filter(CommentPath.path == element_path)
+
+    @classmethod
+    def threads_for_path(cls, element_path):
+        """
+        Alle commentaren op een pad als threads, in één query.
+
+        Returns:
+            list[Comment]: Top-level commentaren; `replies` is per commentaar al gevuld (recursief).
+        """
+        comments = cls.for_path_query(element_path).order_by(cls.created_at.asc(), cls.id).all()
+        replies_by_parent = {}
+        for comment in comments:
+            replies_by_parent.setdefault(comment.parent_id, []).append(comment)
+        known_ids = {comment.id for comment in comments}
+        for comment in comments:
+            set_committed_value(comment, 'replies', replies_by_parent.get(comment.id, []))
+        # Antwoorden waarvan de parent op een ander pad staat, tonen we als top-level
+        return [comment for comment in comments if comment.parent_id is None or comment.parent_id not in known_ids]
+
+class ExportJob(db.Model):
+    """Een export die op de achtergrond draait; status en resultaatbestand zijn voor alle workers zichtbaar."""
+    __tablename__ = 'export_job'
+    id = db.Column(db.String(32), primary_key=True)
+    template_id = db.Column(db.String(120), nullable=False)
+    export_format = db.Column(db.String(20), nullable=False)
+    cache_key = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, done, failed, expired
+    progress = db.Column(db.Integer, nullable=False, default=0) # procent van de vragen verwerkt
+    rows_written = db.Column(db.Integer, nullable=True)
+    result_path = db.Column(db.String(500), nullable=True)
+    result_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=_utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class CommentEvent(db.Model):
+    """
+    Een toevoeging, wijziging of verwijdering van een commentaar: het append-only wijzigingslog.
+
+    Wordt in dezelfde transactie als de wijziging zelf geschreven. Het `id` is de revisie:
+    het SSE-event-ID (`Last-Event-ID`) voor live updates, de cursor van
+    /api/comments/changes, en samen met `payload` de bewerkingsgeschiedenis van een
+    commentaar. Een 'deleted'-event is de tombstone. Een ID mag dus nooit hergebruikt
+    worden, vandaar AUTOINCREMENT.
+    """
+    __tablename__ = 'comment_event'
+    id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.String(120), nullable=False)
+    action = db.Column(db.String(10), nullable=False) # created, updated, deleted
+    comment_id = db.Column(db.Integer, nullable=False, index=True) # Geen foreign key: het commentaar kan verwijderd zijn
+    element_path = db.Column(db.String(500), nullable=False)
+    payload = db.Column(db.Text, nullable=True) # JSON van het commentaar na de wijziging (leeg bij migratie-backfill)
+    created_at = db.Column(db.DateTime, default=_utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_comment_event_template_id_id', 'template_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+class CommentCoverage(db.Model):
+    """
+    Aantal commentaren per pad en auteur: het aggregaat achter het dekkingsdashboard.
+
+    Wordt door databasetriggers bijgehouden (zie `app.coverage`), niet door de applicatie;
+    schrijf er dus zelf niet in.
+    """
+    __tablename__ = 'comment_coverage'
+    path_id = db.Column(db.Integer, db.ForeignKey('comment_path.id'), primary_key=True)
+    author_name = db.Column(db.String(120), primary_key=True)
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+
+def template_path_filter(root_path):
+    """
+    Filter op alle paden binnen een template.
+
+    Semantische paden beginnen met het ID van de compositie (bv. `individueel_zorgplan_palliatieve_zorg/...`).
+    Een bereik-vergelijking ('prefix/' <= pad < 'prefix0') gebruikt de index en heeft, anders dan LIKE,
+    geen last van '_' in template-ID's. Te gebruiken in een query die CommentPath joint.
+    """
+    return CommentPath.path >= f"{root_path}/", CommentPath.path < f"{root_path}0"
+
+def comment_state(*path_filter):
+    """(aantal, hoogste ID, laatste updated_at) van de commentaren binnen het filter: de 'high-water mark'."""
+    return tuple(db.session.query(
+        func.count(Comment.id), func.max(Comment.id), func.max(Comment.updated_at)
+    ).join(Comment.path).filter(*path_filter).one())
\ No newline at end of file
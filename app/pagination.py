@@ -0,0 +1,73 @@
+"""
+Keyset-paginering (cursor) op `(created_at, id)`.
+
+Een pagina begint direct na de laatste rij van de vorige, via de index, in plaats van
+OFFSET-rijen over te slaan: pagina 1000 kost evenveel als pagina 1, en een nieuw
+commentaar tussendoor verschuift geen rijen tussen pagina's.
+
+De cursor is voor de client ondoorzichtig (base64 van de sleutel van de laatste rij) en
+hoort bij een sorteerrichting; filters geeft de client bij elke pagina opnieuw mee.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, id) uit een cursor van `encode_cursor`; InvalidCursor bij onzin."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(f"Ongeldige cursor '{cursor}'.")
+
+
+def parse_datetime(value):
+    """ISO-datum/tijd als naïeve UTC-datetime (zoals in de database); None voor een lege waarde."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def keyset_page(query, created_at_column, id_column, cursor=None, limit=50, descending=False):
+    """
+    Eén pagina van `query`, gesorteerd op (created_at, id).
+
+    Args:
+        query: Een SQLAlchemy-query met de filters al toegepast.
+        created_at_column, id_column: De sorteerkolommen.
+        cursor (str, optioneel): `next_cursor` van de vorige pagina.
+        limit (int): Aantal rijen per pagina.
+        descending (bool): Nieuwste eerst.
+    Returns:
+        tuple[list, str | None]: De rijen en de cursor voor de volgende pagina (None als dit de laatste is).
+    """
+    key = tuple_(created_at_column, id_column)
+    if cursor:
+        after = decode_cursor(cursor)
+        query = query.filter(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(created_at_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(created_at_column.asc(), id_column.asc())
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_at_column.key), getattr(last, id_column.key))
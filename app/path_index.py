@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_left
+
+from app.template_compiler import build_path_index
+
+# Medblocks-paden kunnen herhalingsindexen (`/probleem:0/`) en een suffix (`|code`) bevatten
+_OCCURRENCE_INDEX = re.compile(r':\d+(?=/|\||$)')
+
+
+def normalize_path(path):
+    """Semantisch pad zonder herhalingsindexen en zonder `|suffix`."""
+    if not path:
+        return path
+    return _OCCURRENCE_INDEX.sub('', path.split('|', 1)[0])
+
+
+class PathIndex:
+    """
+    Index van alle nodes van één templateversie, op semantisch pad.
+
+    Wordt één keer per templateversie gebouwd (en in het gecompileerde artefact bewaard) en
+    beantwoordt opzoekingen zonder de boom opnieuw te doorlopen: pad → node (naam, rm-type,
+    AQL-pad, sectienummer, ouder), AQL-pad → semantisch pad, kinderen van een node en alle
+    paden onder een prefix (via bisect op een gesorteerde lijst).
+
+    Args:
+        nodes (dict): Semantisch pad → node-gegevens, in documentvolgorde.
+        aql_to_semantic (dict): AQL-pad → semantisch pad.
+    """
+
+    def __init__(self, nodes, aql_to_semantic):
+        self.nodes = nodes
+        self.aql_to_semantic = aql_to_semantic
+        self._sorted_paths = sorted(nodes)
+        self._children = None
+
+    @classmethod
+    def build(cls, web_template_data, questionnaire):
+        return cls(*build_path_index(web_template_data, questionnaire))
+
+    @classmethod
+    def from_data(cls, data):
+        """Herstelt een index uit `to_data()` (bv. uit een gecompileerd artefact)."""
+        return cls(data['nodes'], data['aql_to_semantic'])
+
+    def to_data(self):
+        return {'nodes': self.nodes, 'aql_to_semantic': self.aql_to_semantic}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, path):
+        return self.resolve(path) is not None
+
+    def resolve(self, path):
+        """
+        Vertaalt een pad uit de UI naar het semantische pad in de index.
+
+        Accepteert een semantisch pad, een Medblocks-pad (met `:0`-indexen of `|suffix`) of
+        een AQL-pad. Returns None als het pad niet bij deze template hoort.
+        """
+        if not path:
+            return None
+        if path in self.nodes:
+            return path
+        normalized = normalize_path(path)
+        if normalized in self.nodes:
+            return normalized
+        return self.aql_to_semantic.get(path)
+
+    def get(self, path):
+        """Node-gegevens (met `semantic_path`) voor een pad, of None."""
+        semantic_path = self.resolve(path)
+        if semantic_path is None:
+            return None
+        return {'semantic_path': semantic_path, **self.nodes[semantic_path]}
+
+    def children(self, path):
+        """Directe kinderen van een node, in documentvolgorde."""
+        if self._children is None:
+            children = {}
+            for semantic_path, node in self.nodes.items():
+                children.setdefault(node['parent'], []).append(semantic_path)
+            self._children = children
+        return self._children.get(self.resolve(path), [])
+
+    def ancestors(self, path):
+        """Paden van de ouder tot en met de root."""
+        result = []
+        semantic_path = self.resolve(path)
+        while semantic_path is not None:
+            semantic_path = self.nodes[semantic_path]['parent'] if semantic_path in self.nodes else None
+            if semantic_path is not None:
+                result.append(semantic_path)
+        return result
+
+    def section_number(self, path):
+        """Sectienummer van de node zelf of van de dichtstbijzijnde genummerde voorouder."""
+        semantic_path = self.resolve(path)
+        while semantic_path is not None and semantic_path in self.nodes:
+            node = self.nodes[semantic_path]
+            if node['section_number']:
+                return node['section_number']
+            semantic_path = node['parent']
+        return None
+
+    def with_prefix(self, prefix, limit=None):
+        """
+        Alle paden gelijk aan `prefix` of eronder (`prefix/...`), alfabetisch.
+
+        Args:
+            prefix (str): Semantisch pad (zonder slash aan het eind).
+            limit (int, optioneel): Maximaal aantal resultaten.
+        """
+        prefix = prefix.rstrip('/')
+        paths = self._sorted_paths
+        result = [prefix] if prefix in self.nodes else []
+        start = bisect_left(paths, f"{prefix}/")
+        end = bisect_left(paths, f"{prefix}0", lo=start)
+        result.extend(paths[start:end])
+        return result[:limit] if limit is not None else result
@@ -0,0 +1,239 @@
+"""
+Gedeelde cache van de JSON-antwoorden van `/api/comments/get/<pad>`, voor alle workers.
+
+De antwoorden staan in een apart SQLite-bestand (`RESPONSE_CACHE_PATH`, standaard per
+database één bestand in `instance/`), met per pad een generatienummer. Een antwoord geldt
+alleen zolang het generatienummer van zijn pad niet veranderd is:
+
+- Bij een flush waarin commentaren op een pad worden toegevoegd, gewijzigd of verwijderd
+  (ook antwoorden waarvan de parent verdwijnt) wordt de generatie van dat pad verhoogd, en
+  na de commit nog een keer. Antwoorden die een andere worker tussendoor nog met de oude
+  gegevens heeft opgeslagen, vallen daarmee ook af.
+- Schrijven buiten het ORM om (bv. de import) meldt de paden zelf via `mark_changed`.
+- Een antwoord wordt opgeslagen met de generatie van vóór het lezen uit de database; is het
+  pad intussen gewijzigd, dan klopt die niet meer en telt het als misser.
+
+De cache is begrensd op `RESPONSE_CACHE_MAX_ENTRIES` antwoorden; de minst recent gebruikte
+gaan eruit (`last_used` wordt hoogstens eens per `TOUCH_INTERVAL` seconden bijgewerkt, zodat
+een treffer meestal alleen leest). Treffers, missers en de tijd in de cache staan in /metrics.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from itertools import chain
+
+from flask import Response
+from sqlalchemy import event, inspect, select
+
+from app.metrics import add_server_timing
+
+# Seconden waarbinnen een treffer `last_used` niet opnieuw bijwerkt
+TOUCH_INTERVAL = 30.0
+# Na zoveel opgeslagen antwoorden (per worker) wordt de grootte gecontroleerd
+EVICT_CHECK_EVERY = 50
+
+_SESSION_KEY = 'response_cache_paths'
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS path_generation (path TEXT PRIMARY KEY, generation INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS response (key TEXT PRIMARY KEY, path TEXT NOT NULL, generation INTEGER NOT NULL, "
+    "body BLOB NOT NULL, last_used REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_response_path ON response (path)",
+    "CREATE INDEX IF NOT EXISTS ix_response_last_used ON response (last_used)",
+]
+
+_LOOKUP = (
+    "SELECT COALESCE(g.generation, 0), r.body, r.last_used FROM (SELECT ? AS path) p "
+    "LEFT JOIN path_generation g ON g.path = p.path "
+    "LEFT JOIN response r ON r.key = ? AND r.generation = COALESCE(g.generation, 0)"
+)
+
+
+def _default_path(app):
+    # Eén bestand per database: een andere database (tests, benchmarks) deelt nooit antwoorden
+    database_hash = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode('utf-8')).hexdigest()[:12]
+    return os.path.join(app.instance_path, f"response-cache-{database_hash}.db")
+
+
+class ResponseCache:
+    """Flask-extensie; zie de moduledocumentatie."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.path = None
+        self.max_entries = 20000
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'evictions': 0, 'seconds': 0.0}
+        self._stores_since_check = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.path = app.config.get('RESPONSE_CACHE_PATH') or _default_path(app)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 20000)
+        app.extensions['response_cache'] = self
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection()
+        db = app.extensions['sqlalchemy']
+        if not getattr(self, '_session_listeners_installed', False):
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            self._session_listeners_installed = True
+
+    # --- Opslag ---
+
+    def _connection(self):
+        """Eén verbinding per thread (en per proces: na een fork een nieuwe)."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, name, amount=1, seconds=0.0):
+        with self._stats_lock:
+            self._stats[name] += amount
+            self._stats['seconds'] += seconds
+        add_server_timing('cache', seconds)
+
+    def json_response(self, key, path, build_response):
+        """
+        Het gecachte antwoord voor `key` (met commentaren op `path`), of `build_response()`.
+
+        Alleen antwoorden met status 200 worden opgeslagen. Het antwoord heeft een
+        `X-Cache`-header (HIT of MISS), handig bij het meten.
+        """
+        if not self.enabled:
+            return build_response()
+        started = time.perf_counter()
+        try:
+            connection = self._connection()
+            generation, body, last_used = connection.execute(_LOOKUP, (path, key)).fetchone()
+            if body is not None:
+                now = time.time()
+                if now - last_used > TOUCH_INTERVAL:
+                    connection.execute("UPDATE response SET last_used = ? WHERE key = ?", (now, key))
+                self._count('hits', seconds=time.perf_counter() - started)
+                return Response(body, mimetype='application/json', headers={'X-Cache': 'HIT'})
+        except sqlite3.Error:
+            # Een kapotte of vergrendelde cache mag een request nooit laten mislukken
+            return build_response()
+        self._count('misses', seconds=time.perf_counter() - started)
+
+        response = build_response()
+        response.headers['X-Cache'] = 'MISS'
+        if response.status_code == 200 and not response.is_streamed:
+            started = time.perf_counter()
+            try:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO response (key, path, generation, body, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, path, generation, response.get_data(), time.time()))
+                self._stores_since_check += 1
+                if self._stores_since_check >= EVICT_CHECK_EVERY:
+                    self._stores_since_check = 0
+                    self._evict()
+            except sqlite3.Error:
+                pass
+            self._count('stores', seconds=time.perf_counter() - started)
+        return response
+
+    def _evict(self):
+        """Verwijdert de minst recent gebruikte antwoorden boven `max_entries` (plus 10% ruimte)."""
+        connection = self._connection()
+        excess = connection.execute("SELECT COUNT(*) FROM response").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        excess += self.max_entries // 10
+        connection.execute(
+            "DELETE FROM response WHERE key IN (SELECT key FROM response ORDER BY last_used LIMIT ?)", (excess,))
+        self._count('evictions', excess)
+
+    def invalidate(self, paths):
+        """Verhoogt de generatie van de paden: hun antwoorden zijn vanaf nu ongeldig."""
+        paths = sorted(set(paths))
+        if not self.enabled or not paths:
+            return
+        started = time.perf_counter()
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT INTO path_generation (path, generation) VALUES (?, 1) "
+                    "ON CONFLICT (path) DO UPDATE SET generation = generation + 1", [(path,) for path in paths])
+                connection.executemany("DELETE FROM response WHERE path = ?", [(path,) for path in paths])
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            # Zonder invalidatie zou de cache oude antwoorden blijven geven: alles weg
+            self.clear()
+        self._count('invalidations', len(paths), seconds=time.perf_counter() - started)
+
+    def clear(self):
+        """Leegt de cache (alle paden krijgen een nieuwe generatie)."""
+        connection = self._connection()
+        connection.execute("UPDATE path_generation SET generation = generation + 1")
+        connection.execute("DELETE FROM response")
+
+    def mark_changed(self, session, paths):
+        """
+        Voor schrijven buiten het ORM om (bulk-inserts): de paden worden in deze transactie
+        gewijzigd. Invalideert nu en nog een keer na de commit.
+        """
+        paths = set(paths)
+        session.info.setdefault(_SESSION_KEY, set()).update(paths)
+        self.invalidate(paths)
+
+    # --- Koppeling met de SQLAlchemy-session ---
+
+    def _after_flush(self, session, flush_context):
+        from app.models import Comment, CommentPath
+
+        paths, path_ids = set(), set()
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if not isinstance(obj, Comment):
+                continue
+            state = inspect(obj)
+            path_history = state.attrs.path.history
+            loaded_paths = [comment_path.path for comment_path in chain(*path_history) if comment_path is not None]
+            paths.update(loaded_paths)
+            if not loaded_paths:
+                path_ids.update(value for value in chain(*state.attrs.path_id.history) if value is not None)
+        if path_ids:
+            paths.update(session.execute(select(CommentPath.path).where(CommentPath.id.in_(path_ids))).scalars())
+        if paths:
+            session.info.setdefault(_SESSION_KEY, set()).update(paths)
+            self.invalidate(paths)
+
+    def _after_commit(self, session):
+        paths = session.info.pop(_SESSION_KEY, None)
+        if paths:
+            self.invalidate(paths)
+
+    def _after_rollback(self, session):
+        # De generaties zijn al verhoogd; dat kost hoogstens een paar onnodige missers
+        session.info.pop(_SESSION_KEY, None)
+
+    # --- Metingen ---
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['enabled'] = self.enabled
+        return stats
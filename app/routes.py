@@ -1,809 +1,743 @@
 
 from flask import (
     render_template, flash, redirect, url_for, Blueprint,
-    request, abort, current_app, Response, jsonify
+    request, abort, current_app, Response, jsonify, stream_with_context, send_file, make_response
 )
-from app import db # Ervan uitgaande dat db correct is geïnitialiseerd in app/__init__.py
-from app.models import Comment # Zorg ervoor dat dit model correct is gedefinieerd
+from app import db, template_registry, export_jobs, comment_events, response_cache # Ervan uitgaande dat db correct is geïnitialiseerd in app/__init__.py
+from app.models import Comment, CommentPath, CommentEvent, template_path_filter, comment_state # Zorg ervoor dat dit model correct is gedefinieerd
+from app.exporters import get_exporter, available_exporters
+from app.search import search_comments
+from app.coverage import template_coverage
+from app.comment_events import CLIENT_RETRY_MS, comment_event_data
+from app.pagination import keyset_page, parse_datetime, InvalidCursor
+from app.comment_import import import_comments, rows_from_csv, rows_from_json, CommentImportError
+from app.database import read_only
+from app.template_diff import diff_web_templates
+from app.comment_migration import plan_path_migrations, apply_path_migrations
 import json
 import os
 from datetime import datetime
 import pytz # pytz is nodig voor tijdzones
-import io
-import csv
-import re
+import tempfile
+import hashlib
 from collections import defaultdict
+from sqlalchemy import and_, func, or_
 
 bp = Blueprint('main', __name__)
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-# Pad naar je OpenEHR web template JSON-bestand
-TEMPLATE_FILEPATH = os.path.join(BASE_DIR, 'templates_openehr', 'ACP-DUTCH.json') 
-
-# Definities van sectie- en containertypes (behoud van bestaande logica)
-ORIGINAL_SECTION_TYPES = {"SECTION"}
-NUMBERABLE_CONTAINER_TYPES = {
-    "EVALUATION", "ADMIN_ENTRY", "OBSERVATION",
-    "INSTRUCTION", "ACTION", "GENERIC_ENTRY", "CLUSTER"
-}
-_questionnaire_cache = None # Voor de getransformeerde structuur (gebruikt door CSV export)
-_original_web_template_cache = None # Voor de ruwe template data (gebruikt door Medblocks UI)
-
-# --- Functies voor Web Template Verwerking (Volledige Implementaties) ---
-
-def get_original_web_template_data():
-    global _original_web_template_cache
-    if _original_web_template_cache is None:
-        current_app.logger.info(f"CACHE MISS: Origineel Web Template. Laden vanaf: {TEMPLATE_FILEPATH}")
-        try:
-            with open(TEMPLATE_FILEPATH, 'r', encoding='utf-8') as f:
-                _original_web_template_cache = json.load(f)
-            current_app.logger.info(f"Origineel Web Template '{TEMPLATE_FILEPATH}' succesvol geladen en gecached.")
-        except FileNotFoundError:
-            current_app.logger.error(f"FOUT: Origineel Web Template niet gevonden: {TEMPLATE_FILEPATH}")
-            flash(f"Kritiek: Web Template '{os.path.basename(TEMPLATE_FILEPATH)}' niet gevonden.", "danger")
-            _original_web_template_cache = {} # Geef een leeg dict terug ipv None om verdere errors te voorkomen
-        except json.JSONDecodeError as e:
-            current_app.logger.error(f"FOUT: JSON parse error in {TEMPLATE_FILEPATH}: {e}")
-            flash(f"Kritiek: Fout in Web Template JSON: {e}.", "danger")
-            _original_web_template_cache = {}
-        except Exception as e:
-            current_app.logger.error(f"FOUT: Onverwachte error bij laden {TEMPLATE_FILEPATH}: {e}", exc_info=True)
-            flash(f"Kritiek: Onverwachte fout Web Template: {e}", "danger")
-            _original_web_template_cache = {}
-    else:
-        current_app.logger.info("CACHE HIT: Gebruik _original_web_template_cache uit cache.")
-    return _original_web_template_cache
-
-def _get_node_name(node_json, lang_codes=['nl', 'en']):
-    # Volledige implementatie van _get_node_name zoals eerder gedeeld
-    if not isinstance(node_json, dict): return "Ongeldige Node Structuur"
-    if isinstance(node_json.get('localizedName'), str) and node_json['localizedName'].strip():
-        return node_json['localizedName']
-    localized_names_dict = node_json.get('localizedNames', {})
-    if isinstance(localized_names_dict, dict):
-        for lang_code in lang_codes:
-            if lang_code in localized_names_dict and \
-               isinstance(localized_names_dict[lang_code], str) and \
-               localized_names_dict[lang_code].strip():
-                return localized_names_dict[lang_code]
-    if isinstance(node_json.get('name'), str) and node_json['name'].strip():
-        return node_json['name']
-    if isinstance(node_json.get('label'), str) and node_json['label'].strip():
-        return node_json['label']
-    node_id = node_json.get('id')
-    if isinstance(node_id, str) and node_id.strip():
-        return node_id 
-    return "Naamloos Veld"
-
-def _create_value_structure(node_json, lang_codes=['nl', 'en'], parent_semantic_path_for_options=""):
-    """
-    Creëert de waarde-structuur voor een gegeven node, inclusief het doorgeven van semantische paden.
-
-    Args:
-        node_json (dict): De JSON-definitie van de huidige node.
-        lang_codes (list): Lijst van voorkeurstaalcodes.
-        parent_semantic_path_for_options (str): Het semantische pad van de bovenliggende node,
-                                                 gebruikt om paden voor geneste opties te vormen.
-    Returns:
-        dict: De geconstrueerde waarde-structuur.
-    """
-    default_value_structure = {"_type": "DV_TEXT", "value": f"[Onbekend Type: {node_json.get('rmType','GEEN RM TYPE')}]"}
-    if not isinstance(node_json, dict):
-        return default_value_structure
-
-    node_rm_type = node_json.get('rmType', '').upper()
-    input_def_list = node_json.get('inputs', [])
-    input_def = input_def_list[0] if isinstance(input_def_list, list) and input_def_list else {}
-    
-    effective_data_type = node_rm_type if node_rm_type.startswith("DV_") else input_def.get('type', '').upper()
-
-    # Specifieke behandeling voor ELEMENT nodes die een CHOICE van andere RM types bevatten
-    # Dit zijn vaak keuzes tussen verschillende DV_ types of zelfs CLUSTERs.
-    if node_rm_type == 'ELEMENT' and not effective_data_type.startswith("DV_"):
-        node_children = node_json.get('children', []) # Dit zijn de JSON definities van de keuze-opties
-        if node_children and all(isinstance(child, dict) for child in node_children):
-            choice_options_list = [] # Hernoemd om verwarring met de uiteindelijke 'options' key te voorkomen
-            for child_node_json_for_option in node_children: # child_node_json_for_option is de definitie van een optie
-                option_name = _get_node_name(child_node_json_for_option, lang_codes)
-                # archetype_node_id voor de optie zelf (kan een at-code zijn of een type)
-                option_archetype_node_id = child_node_json_for_option.get('nodeId') or child_node_json_for_option.get('id')
-                option_aql_path = child_node_json_for_option.get('aqlPath', '')
-                
-                # Bouw het semantische pad voor deze specifieke optie
-                option_id_segment = child_node_json_for_option.get('id') # De 'id' van de optie-node
-                current_option_semantic_path = parent_semantic_path_for_options # Begin met het pad van de parent
-                
-                if option_id_segment:
-                    if parent_semantic_path_for_options:
-                        # Voeg het ID-segment van de optie toe aan het pad van de parent.
-                        # Dit is cruciaal als de 'id' van de child_node_json_for_option (de optie)
-                        # daadwerkelijk een segment in het pad is (bv. .../parent_element_id/option_id)
-                        # Als de 'id' van de optie niet direct een padsegment is (bv. 'at0001' voor een code),
-                        # dan is het semantische pad voor de opmerking waarschijnlijk parent_semantic_path_for_options.
-                        # De frontend bepaalt welk pad wordt gebruikt. Hier proberen we het zo specifiek mogelijk te maken.
-                        # De logica in _flatten_leaf_nodes_for_export zal dit gebruiken.
-                        current_option_semantic_path = f"{parent_semantic_path_for_options}/{option_id_segment}"
-                    else:
-                        current_option_semantic_path = option_id_segment
-                
-                # De 'value' van de optie zelf (bv. een DV_TEXT structuur, of een geneste DV_INTERVAL)
-                # Geef het zojuist gevormde current_option_semantic_path door voor eventuele diepere structuren binnen de optie.
-                option_value_data = _create_value_structure(child_node_json_for_option, lang_codes, parent_semantic_path_for_options=current_option_semantic_path)
-                
-                choice_options_list.append({
-                    "_type": child_node_json_for_option.get('rmType'), # RM Type van de optie
-                    "name": {"value": option_name},
-                    "archetype_node_id": option_archetype_node_id, # Kan de 'code' zijn voor DV_CODED_TEXT opties of at-code
-                    "aqlPath": option_aql_path,
-                    "semantic_path": current_option_semantic_path, # Semantisch pad voor deze specifieke optie
-                    "min": child_node_json_for_option.get('min'),
-                    "max": child_node_json_for_option.get('max'),
-                    "value": option_value_data, # De daadwerkelijke datastructuur van deze optie
-                    "is_leaf": True # De optie zelf wordt als een 'blad' in de lijst van keuzes beschouwd
-                })
-            return {"_type": "CHOICE", "original_rm_type": node_rm_type, "options": choice_options_list, "value": None}
-        
-        # Als een ELEMENT geen DV_ type is en geen children heeft die opties zijn,
-        # behandel het als een simpel tekstveld als fallback.
-        effective_data_type = "DV_TEXT"
-
-    # Standaard waarde-structuren voor diverse DV_ types
-    value_structure = {}
-    if effective_data_type in ['TEXT', 'STRING', 'DV_TEXT']:
-        value_structure = {"_type": "DV_TEXT", "value": ""}
-    elif effective_data_type in ['CODED_TEXT', 'DV_CODED_TEXT']:
-        options_for_coded_text = [] # Dit zijn de voorgedefinieerde codes, niet de 'CHOICE' opties hierboven
-        options_list_source = input_def.get('list', [])
-        for option_item_json in options_list_source: # option_item_json is een {label, value, localizedLabels, ...} dict
-            if isinstance(option_item_json, dict):
-                label = _get_node_name(option_item_json, lang_codes)
-                # De 'value' hier is de code string (bv. "at0002")
-                # Deze opties krijgen geen eigen semantic_path; commentaar is op het DV_CODED_TEXT element zelf.
-                options_for_coded_text.append({"label": label, "value": option_item_json.get('value')})
-        value_structure = {
-            "_type": "DV_CODED_TEXT", "value": "",
-            "defining_code": {"code_string": "", "terminology_id": {"value": input_def.get('terminology', '')}},
-            "options": options_for_coded_text # Dit zijn de codes, niet de structurele CHOICE opties
-        }
-    elif effective_data_type in ['BOOLEAN', 'DV_BOOLEAN']:
-        value_structure = {"_type": "DV_BOOLEAN", "value": None}
-    elif effective_data_type in ['INTEGER', 'COUNT', 'DV_COUNT']:
-        value_structure = {"_type": "DV_COUNT", "magnitude": None}
-    elif effective_data_type in ['DECIMAL', 'REAL', 'DOUBLE', 'DV_QUANTITY', 'QUANTITY']:
-        units = input_def.get('units', '')
-        validation = input_def.get('validation', {})
-        if not units and validation and isinstance(validation.get('range'), dict):
-            range_info = validation['range']
-            if isinstance(range_info, list) and range_info:
-                units = range_info[0].get('units', '')
-            elif isinstance(range_info, dict):
-                units = range_info.get('units', '')
-        value_structure = {"_type": "DV_QUANTITY", "magnitude": None, "units": units}
-    elif effective_data_type in ['DATETIME', 'DV_DATE_TIME']:
-        value_structure = {"_type": "DV_DATE_TIME", "value": None}
-    elif effective_data_type in ['DATE', 'DV_DATE']:
-        value_structure = {"_type": "DV_DATE", "value": None}
-    elif effective_data_type in ['TIME', 'DV_TIME']:
-        value_structure = {"_type": "DV_TIME", "value": None}
-    elif effective_data_type in ['IDENTIFIER', 'DV_IDENTIFIER']:
-        value_structure = {"_type": "DV_IDENTIFIER", "id_value": "", "type": "", "issuer": "", "assigner": ""}
-    elif effective_data_type in ['URI', 'DV_URI']:
-        value_structure = {"_type": "DV_URI", "value": ""}
-    elif effective_data_type.startswith("DV_INTERVAL"):
-        inner_type_str = "DV_TEXT" # Default inner type
-        match = re.search(r"DV_INTERVAL<([A-Z_]+)>", effective_data_type)
-        if match:
-            inner_type_str = match.group(1)
-        
-        lower_input_def, upper_input_def = {}, {}
-        if isinstance(input_def_list, list):
-            for sub_input in input_def_list:
-                if sub_input.get("suffix") == "lower": lower_input_def = sub_input
-                elif sub_input.get("suffix") == "upper": upper_input_def = sub_input
-        
-        if not lower_input_def and input_def: lower_input_def = input_def
-        if not upper_input_def and input_def: upper_input_def = input_def
+# Versie-URL's veranderen mee met de inhoud, dus de browser mag ze onbeperkt bewaren
+WEB_TEMPLATE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
-        # Creëer de JSON structuur voor de innerlijke 'lower' en 'upper' nodes
-        lower_inner_node_json = {"rmType": inner_type_str, "inputs": [lower_input_def] if lower_input_def else []}
-        upper_inner_node_json = {"rmType": inner_type_str, "inputs": [upper_input_def] if upper_input_def else []}
-        
-        # Bouw semantische paden voor lower en upper componenten
-        lower_semantic_path = f"{parent_semantic_path_for_options}/lower" if parent_semantic_path_for_options else "lower"
-        upper_semantic_path = f"{parent_semantic_path_for_options}/upper" if parent_semantic_path_for_options else "upper"
-
-        value_structure = {
-            "_type": "DV_INTERVAL",
-            "lower": _create_value_structure(lower_inner_node_json, lang_codes, parent_semantic_path_for_options=lower_semantic_path),
-            "upper": _create_value_structure(upper_inner_node_json, lang_codes, parent_semantic_path_for_options=upper_semantic_path),
-            "lower_included": input_def.get("lower_included", True),
-            "upper_included": input_def.get("upper_included", True)
-        }
-    elif effective_data_type == 'DV_DURATION':
-        value_structure = {
-            "_type": "DV_DURATION", "months": None, "weeks": None, "days": None,
-            "hours": None, "minutes": None, "seconds": None
-        }
-    elif effective_data_type == 'DV_PROPORTION':
-        prop_type = 0
-        if input_def.get("list") and isinstance(input_def["list"], list) and len(input_def["list"]) > 0:
-            try: prop_type = int(input_def["list"][0].get("value", 0))
-            except ValueError: pass
-        value_structure = {"_type": "DV_PROPORTION", "numerator": None, "denominator": None, "type": prop_type}
-    else:
-        current_app.logger.warning(f"WARN: Onbehandeld effective_data_type '{effective_data_type}' voor node '{node_json.get('id', 'unknown id')}' (rmType: {node_rm_type}). Gebruik default structuur.")
-        return default_value_structure
-            
-    return value_structure
-
-def _process_node_for_ui(current_node_json, lang_codes=['nl', 'en'], parent_aql_path="",
-                         current_node_number_str="", current_node_level=-1, parent_semantic_path=""):
-    if not isinstance(current_node_json, dict): return None
-
-    node_rm_type = current_node_json.get('rmType', '').upper()
-    aql_path = current_node_json.get('aqlPath', '')
-    original_id_from_json = current_node_json.get('id') # ID van de huidige node, bv. "context", "relationship"
-
-    # --- NIEUW: Bouw semantic_path ---
-    current_id_segment = original_id_from_json
-    full_semantic_path = parent_semantic_path # Standaard, als deze node geen eigen ID-segment heeft
-
-    if current_id_segment: # Alleen toevoegen als er een ID-segment is voor deze node
-        if parent_semantic_path:
-            full_semantic_path = f"{parent_semantic_path}/{current_id_segment}"
-        else:
-            full_semantic_path = current_id_segment # Dit is het eerste segment
-    # ---------------------------------
+# --- Functies voor Web Template Verwerking ---
+# De transformatie zit in app.template_compiler, laden en cachen per template in app.template_registry;
+# deze functies zijn de toegang vanuit de routes.
 
-    relative_aql_path = aql_path.replace(parent_aql_path, '', 1).lstrip('/') if parent_aql_path else aql_path.lstrip('/')
-    structural_metadata_names_to_skip = [
-        'language', 'encoding', 'subject', 'category',
-        'territory', 'composer', 'health_care_facility', 'location'
-    ]
-    is_structural_metadata = current_node_json.get('inContext') is True and \
-                             relative_aql_path.count('/') == 0 and \
-                             relative_aql_path in structural_metadata_names_to_skip
-    if is_structural_metadata:
-        return None
-
-    node_name = _get_node_name(current_node_json, lang_codes)
-    node_id_val = current_node_json.get('nodeId')
-    display_id = node_id_val or original_id_from_json or 'uid_' + str(hash(aql_path))[-6:]
-    min_occ = current_node_json.get('min')
-    max_occ = current_node_json.get('max')
-
-    is_leaf_element = False
-    # ... (bestaande logica voor is_leaf_element blijft hetzelfde) ...
-    if node_rm_type.startswith('DV_') and node_rm_type not in ['DV_INTERVAL']:
-        is_leaf_element = True
-    elif node_rm_type == 'ELEMENT':
-        children_nodes = current_node_json.get('children', [])
-        if not children_nodes and current_node_json.get('inputs'):
-            is_leaf_element = True
-        elif children_nodes and all(child.get('rmType','').upper().startswith('DV_') for child in children_nodes if isinstance(child,dict)):
-            is_leaf_element = True
-        elif not children_nodes and not current_node_json.get('inputs'):
-            is_leaf_element = (not current_node_json.get('children') and not current_node_json.get('inputs')) or \
-                              (current_node_json.get('children') and not any(c.get('rmType','').upper() in (ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | {'EVENT_CONTEXT'}) for c in current_node_json.get('children',[]) if isinstance(c,dict)))
-        elif not any(child.get('rmType','').upper() in (ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | {'EVENT_CONTEXT'}) \
-                                 for child in children_nodes if isinstance(child,dict)):
-            is_leaf_element = True
-
-
-    if is_leaf_element and (aql_path or full_semantic_path): # Moet een pad hebben
-        # Belangrijk: _create_value_structure moet ook de semantic_path context krijgen als opties diep genest zijn
-        # en hun eigen semantic_path segmenten moeten vormen. Voor nu gaan we ervan uit dat de options in
-        # _create_value_structure geen verdere semantic path extensies nodig hebben *voorbij* full_semantic_path van het parent ELEMENT.
-        # De opties zelf (de child_node_json in _create_value_structure) hebben hun eigen 'id' die daar gebruikt kan worden.
-        
-        # We moeten de `_create_value_structure` aanpassen om `full_semantic_path` door te geven aan zijn interne logica voor opties
-        # als die opties ook een `semantic_path` moeten krijgen.
-        # Voor nu, de options in de value structuur krijgen geen eigen `semantic_path` in dit voorbeeld,
-        # de `semantic_path` hieronder is voor het element zelf.
-        # De `opt.get('semantic_path')` in _flatten_leaf_nodes zal moeten komen van de `child_node_json` 'id' binnen `_create_value_structure`.
-
-        leaf_data = {
-            "_type": node_rm_type,
-            "name": {"value": node_name},
-            "archetype_node_id": display_id,
-            "original_json_id": original_id_from_json, 
-            "aqlPath": aql_path,
-            "element_path_for_comments": aql_path, # Behoud AQL path voor eventueel ander gebruik
-            "semantic_path": full_semantic_path,   # --- TOEGEVOEGD ---
-            "min": min_occ,
-            "max": max_occ,
-            # Geef parent_semantic_path (hier full_semantic_path) door aan _create_value_structure
-            "value": _create_value_structure(current_node_json, lang_codes, parent_semantic_path_for_options=full_semantic_path),
-            "is_leaf": True
-        }
-        if current_node_level >= 0:
-            leaf_data['level'] = current_node_level
-        return leaf_data
-
-    is_displayable_container_type = node_rm_type in (ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | {'EVENT_CONTEXT'})
-    if is_displayable_container_type:
-        processed_children = []
-        json_children_list = current_node_json.get('children', [])
-        child_numbering_counter = 0
-        if isinstance(json_children_list, list):
-            for child_idx, child_json_node in enumerate(json_children_list):
-                if not isinstance(child_json_node, dict): continue
-                child_rm_type = child_json_node.get('rmType', '').upper()
-                child_full_number_str = ""
-                child_level = current_node_level + 1 if current_node_level != -1 else 0
-                if current_node_number_str and child_rm_type in (ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | {'EVENT_CONTEXT'}):
-                    child_numbering_counter += 1
-                    child_full_number_str = f"{current_node_number_str}.{child_numbering_counter}"
-                
-                processed_child_node = _process_node_for_ui(
-                    child_json_node,
-                    lang_codes,
-                    aql_path, # parent_aql_path voor het kind
-                    current_node_number_str=child_full_number_str,
-                    current_node_level=child_level,
-                    parent_semantic_path=full_semantic_path # --- TOEGEVOEGD ---
-                )
-                # ... (rest van de logica voor processed_children) ...
-                if processed_child_node:
-                    if isinstance(processed_child_node, list):
-                        for sub_child in processed_child_node:
-                            if isinstance(sub_child, dict) and 'level' not in sub_child:
-                                sub_child['level'] = child_level
-                            processed_children.append(sub_child)
-                    elif isinstance(processed_child_node, dict):
-                        if 'level' not in processed_child_node : processed_child_node['level'] = child_level
-                        if child_full_number_str and 'section_number' not in processed_child_node and \
-                           processed_child_node.get('_type') in (ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | {'EVENT_CONTEXT'}):
-                            processed_child_node['section_number'] = child_full_number_str
-                        processed_children.append(processed_child_node)
-
-
-        # Alleen een node teruggeven als het een AQL-pad heeft (of semantisch pad) EN kinderen
-        # Of als het de root call is die alleen kinderen mag teruggeven (impliciet)
-        if (aql_path or full_semantic_path): # Containers moeten een of ander pad hebben
-            node_data = {
-                "_type": node_rm_type,
-                "name": {"value": node_name},
-                "archetype_node_id": display_id,
-                "original_json_id": original_id_from_json,
-                "min": min_occ,
-                "max": max_occ,
-                "aqlPath": aql_path,
-                "semantic_path": full_semantic_path, # --- TOEGEVOEGD ---
-                "children": processed_children,
-                "is_leaf": False
-            }
-            if current_node_level != -1:
-                node_data['level'] = current_node_level
-            if current_node_number_str:
-                node_data['section_number'] = current_node_number_str
-            return node_data
-        elif processed_children: # Als het een anonieme root-achtige container is zonder eigen pad
-             return processed_children
-
-
-    # Fallback voor andere typen nodes die kinderen kunnen hebben maar niet "displayable containers" zijn
-    if isinstance(current_node_json.get('children'), list):
-        fallback_elements = []
-        for child_json in current_node_json.get('children', []):
-            processed_child = _process_node_for_ui(
-                child_json,
-                lang_codes,
-                parent_aql_path, # Blijft parent_aql_path van de huidige node
-                current_node_number_str=current_node_number_str, # Nummering niet voortzetten
-                current_node_level=current_node_level, # Level niet per se verhogen
-                parent_semantic_path=full_semantic_path # --- TOEGEVOEGD ---
-            )
-            if processed_child:
-                if isinstance(processed_child, list): fallback_elements.extend(p for p in processed_child if p)
-                else: fallback_elements.append(processed_child)
-        if fallback_elements: return fallback_elements
-            
-    return None
-
-def transform_web_template_to_questionnaire(web_template_data):
-    if not web_template_data or not isinstance(web_template_data.get('tree'), dict):
-        return {"_type": "COMPOSITION", "name": {"value": "Fout: Template 'tree' ongeldig"}, "version": "", "content": []}
-
-    # --- NIEUW: Haal de root template ID op voor de semantic path ---
-    # Het pad dat je gaf begint met 'individueel_zorgplan_palliatieve_zorg'. Dit is waarschijnlijk de templateId.
-    root_template_id = web_template_data.get('templateId', web_template_data.get('id', 'unknown_template'))
-    # Als de templateId niet direct het gewenste prefix is, moet je dit aanpassen.
-    # Bijvoorbeeld, als de templateId 'ACP-DUTCH' is maar de paden beginnen met iets anders.
-    # Voor nu nemen we aan dat `root_template_id` het eerste deel van je semantic path is.
-    # Echter, het pad dat je gaf begint met 'individueel_zorgplan_palliatieve_zorg', wat een specifieke template naam lijkt.
-    # Laten we aannemen dat de `id` van de `tree` node (de COMPOSITION) dit is, of anders de templateId.
-    # De `current_node_json.get('id')` in _process_node_for_ui zal de segmenten toevoegen.
-    # Dus de eerste `parent_semantic_path` zou leeg kunnen zijn, en de `id` van de COMPOSITION node vormt het eerste segment.
-    # Of, als de COMPOSITION geen 'id' heeft, en de top-level sections wel, dan beginnen de paden met die section 'id's.
-    #
-    # Jouw pad: individueel_zorgplan_palliatieve_zorg/context/wettelijk_vertegenwoordiger_contactpersoon/relationship
-    # 'individueel_zorgplan_palliatieve_zorg' is waarschijnlijk de `id` van de COMPOSITION node (root_tree).
-    # Dus de eerste `parent_semantic_path` voor de kinderen van root_tree moet de `id` van root_tree zijn.
-
-    initial_parent_semantic_path = web_template_data.get('tree', {}).get('id', root_template_id)
-    # Als tree.id niet bestaat, gebruik root_template_id. Als die ook niet relevant is, start leeg
-    # en laat de eerste _process_node_for_ui call het eerste segment bepalen.
-    # Voor jouw pad lijkt het erop dat `initial_parent_semantic_path` de `id` van de root COMPOSITION node moet zijn.
-    # Als de root tree `id` bijvoorbeeld `ACP_zorgplan` is, en de templateId `individueel_zorgplan_palliatieve_zorg`,
-    # en het pad dat Medblocks gebruikt is `individueel_zorgplan_palliatieve_zorg/context/...`, dan moet
-    # `initial_parent_semantic_path` = "individueel_zorgplan_palliatieve_zorg" zijn.
-    # Dit kan handmatig worden ingesteld of uit een specifieke template eigenschap worden gehaald.
-    # Laten we voor nu aannemen dat de root_tree een 'id' heeft die het eerste deel van het pad is.
-    # Of dat we de templateId als basis gebruiken.
-
-    # De `id` van de `root_tree` (de COMPOSITION node)
-    composition_id = web_template_data.get('tree', {}).get('id')
-    # Als de `id` van de compositie niet `individueel_zorgplan_palliatieve_zorg` is, moet de `base_path_for_comments` anders worden ingesteld.
-    # Voor nu gaan we ervan uit dat `composition_id` het eerste deel van je pad is.
-    # Als de `pathElement.getAttribute('path')` in JS niet start met de composition ID, maar bv. direct met `context/...`,
-    # dan moet `initial_parent_semantic_path` leeg zijn.
-    # Gezien jouw pad `individueel_zorgplan_palliatieve_zorg/...`, is dit waarschijnlijk de `templateId`.
-    # Laten we die als basis nemen voor de kinderen.
-
-    base_semantic_path_for_content = web_template_data.get('templateId', 'default_template') 
-    # Pas dit aan als 'individueel_zorgplan_palliatieve_zorg' ergens anders vandaan komt (bv. `tree.id`)
-
-    # ... (bestaande code voor default_lang, composition_name etc.) ...
-    default_lang = web_template_data.get('defaultLanguage', 'nl')
-    available_langs = web_template_data.get('languages', ['nl', 'en'])
-    pref_langs = []
-    if 'nl' in available_langs: pref_langs.append('nl')
-    if default_lang not in pref_langs and default_lang in available_langs: pref_langs.append(default_lang)
-    for lang in available_langs:
-        if lang not in pref_langs: pref_langs.append(lang)
-    if not pref_langs: pref_langs = ['nl', 'en']
-
-    root_tree = web_template_data['tree']
-    composition_name = _get_node_name(root_tree, pref_langs)
-    composition_version = web_template_data.get('version', web_template_data.get('semVer', ''))
-    composition_archetype_id = root_tree.get('nodeId', root_tree.get('id', 'root_id_onbekend'))
-    # Semantic path voor de compositie zelf
-    composition_semantic_path = root_tree.get('id', base_semantic_path_for_content) # Het eerste deel van het pad.
-
-    content_list_for_flask = []
-    top_level_section_counter = 0
-    if isinstance(root_tree.get('children'), list):
-        for idx, top_level_json_node in enumerate(root_tree.get('children', [])): # Dit zijn de SECTIONS, EVALUATIONS etc.
-            if not isinstance(top_level_json_node, dict): continue
-            
-            top_level_rm_type = top_level_json_node.get('rmType', '').upper()
-            is_main_section_type = top_level_rm_type in ORIGINAL_SECTION_TYPES or \
-                                   (top_level_rm_type == 'EVENT_CONTEXT' and top_level_json_node.get('id') == 'context')
-
-            if is_main_section_type:
-                top_level_section_counter += 1
-                current_section_number_str = str(top_level_section_counter)
-                current_level_int = 0
-                hoofdstuk_naam = _get_node_name(top_level_json_node, pref_langs)
-                if top_level_rm_type == 'EVENT_CONTEXT' and hoofdstuk_naam in ["Event Context", "Naamloos Veld", "context"]:
-                    hoofdstuk_naam = "Context"
-                top_level_aql_path = top_level_json_node.get('aqlPath')
-                if not top_level_aql_path:
-                    node_id_for_aql = top_level_json_node.get('nodeId') or top_level_json_node.get('id', f'generated_section_id_{idx}')
-                    top_level_aql_path = f"/content[openEHR-EHR-SECTION.adhoc.v1 and name/value='{node_id_for_aql}']"
-                    current_app.logger.warning(f"WARN: Hoofdsectie '{hoofdstuk_naam}' heeft geen aqlPath. Fallback: {top_level_aql_path}")
-
-                # Semantic path voor deze hoofdsectie
-                section_id_segment = top_level_json_node.get('id')
-                current_main_section_semantic_path = composition_semantic_path # Standaard
-                if section_id_segment:
-                    if composition_semantic_path : # Als de compositie al een ID-pad segment had
-                         current_main_section_semantic_path = f"{composition_semantic_path}/{section_id_segment}"
-                    else: # Als de sectie het eerste ID-segment is
-                         current_main_section_semantic_path = section_id_segment
-                
-                main_section_node = {
-                    "_type": top_level_rm_type, "name": {"value": hoofdstuk_naam},
-                    "archetype_node_id": top_level_json_node.get('nodeId') or top_level_json_node.get('id'),
-                    "aqlPath": top_level_aql_path, 
-                    "semantic_path": current_main_section_semantic_path, # --- TOEGEVOEGD ---
-                    "min": top_level_json_node.get('min'),
-                    "max": top_level_json_node.get('max'), "children": [],
-                    "is_leaf": False, "level": current_level_int,
-                    "section_number": current_section_number_str
-                }
-                processed_children_list = []
-                if isinstance(top_level_json_node.get('children'), list):
-                    child_numbering_counter = 0
-                    for child_json in top_level_json_node.get('children', []):
-                        if not isinstance(child_json, dict): continue
-                        child_rm_type = child_json.get('rmType', '').upper()
-                        child_full_number_str = ""
-                        if current_section_number_str and child_rm_type in (ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | {'EVENT_CONTEXT'}):
-                            child_numbering_counter += 1
-                            child_full_number_str = f"{current_section_number_str}.{child_numbering_counter}"
-                        
-                        # Geef het semantic_path van de huidige hoofdsectie door als parent
-                        processed_child = _process_node_for_ui(
-                            child_json, pref_langs, parent_aql_path=top_level_aql_path,
-                            current_node_number_str=child_full_number_str, current_node_level=current_level_int + 1,
-                            parent_semantic_path=current_main_section_semantic_path # --- TOEGEVOEGD ---
-                        )
-                        if processed_child:
-                            if isinstance(processed_child, list):
-                                processed_children_list.extend(p for p in processed_child if p)
-                            else:
-                                processed_children_list.append(processed_child)
-                main_section_node['children'] = processed_children_list
-                content_list_for_flask.append(main_section_node)
-            else:
-                initial_level_for_other_types = 0 if top_level_rm_type in NUMBERABLE_CONTAINER_TYPES else -1
-                # Voor andere top-level items, de parent_semantic_path is nog steeds die van de compositie
-                processed_node = _process_node_for_ui(
-                    top_level_json_node, pref_langs, parent_aql_path=root_tree.get('aqlPath',''),
-                    current_node_number_str="", current_node_level=initial_level_for_other_types,
-                    parent_semantic_path=composition_semantic_path # --- TOEGEVOEGD ---
-                )
-                # ... (rest van de logica voor processed_node) ...
-                if processed_node:
-                    if isinstance(processed_node, dict):
-                        if 'level' not in processed_node and initial_level_for_other_types != -1 :
-                            processed_node['level'] = initial_level_for_other_types
-                        content_list_for_flask.append(processed_node)
-                    elif isinstance(processed_node, list):
-                        content_list_for_flask.extend(p for p in processed_node if p)
+def _resolve_template_or_404(template_ref=None):
+    template_id = template_registry.resolve(template_ref)
+    if template_id is None:
+        abort(404)
+    return template_id
 
-    return {
-        "_type": "COMPOSITION", "name": {"value": composition_name},
-        "version": composition_version, "archetype_node_id": composition_archetype_id,
-        "semantic_path": composition_semantic_path, # --- TOEGEVOEGD ---
-        "content": content_list_for_flask
-    }
+def get_original_web_template_data(template_id=None):
+    return template_registry.get_web_template(template_id or template_registry.resolve())
+
+def get_web_template_asset(template_id=None):
+    """Geeft de eenmalig geserialiseerde web template terug, of None als de template niet laadt."""
+    return template_registry.get_asset(template_id or template_registry.resolve())
+
+def get_cached_questionnaire_structure(template_id=None, language=None):
+    return template_registry.get_questionnaire(template_id or template_registry.resolve(), language)
+
+def _request_language(template_id, negotiate=True):
+    """
+    Taal van de vragenlijst voor deze request: `?lang=`, anders (met `negotiate`) de beste match
+    uit `Accept-Language`. None betekent de standaardtaal van de template.
+    """
+    languages = template_registry.languages(template_id)
+    language = request.args.get('lang')
+    if not language and negotiate:
+        language = request.accept_languages.best_match(languages)
+    return language if language in languages[1:] else None
+
+def _vary_on_language(response):
+    # De taal kan uit Accept-Language komen; caches mogen het antwoord dus niet zomaar hergebruiken
+    response = make_response(response)
+    response.vary.add('Accept-Language')
+    return response
 
-def get_cached_questionnaire_structure():
-    global _questionnaire_cache
-    if _questionnaire_cache is None:
-        current_app.logger.info("CACHE MISS: Getransformeerde vragenlijst. Bezig met laden en transformeren...")
-        web_template_data = get_original_web_template_data() 
-        if web_template_data and web_template_data != {}: 
-            _questionnaire_cache = transform_web_template_to_questionnaire(web_template_data)
-            if not _questionnaire_cache.get("content"):
-                 current_app.logger.warning("Getransformeerde vragenlijst heeft lege 'content'.")
-        else:
-            _questionnaire_cache = {
-                "_type": "COMPOSITION", "name": {"value": "FOUT: Template kon niet geladen of verwerkt worden."}, 
-                "version": "", "content": []
-            }
-    else:
-        current_app.logger.info("CACHE HIT: Gebruik _questionnaire_cache (getransformeerd) uit cache.")
-    return _questionnaire_cache
-
-def _collect_element_paths(node_or_list):
-    paths = set()
-    if isinstance(node_or_list, list):
-        for item in node_or_list: paths.update(_collect_element_paths(item))
-    elif isinstance(node_or_list, dict):
-        node = node_or_list
-        path_key = node.get('element_path_for_comments') or node.get('aqlPath')
-        if path_key: paths.add(path_key) 
-        if isinstance(node.get('value'), dict) and node['value'].get('_type') == 'CHOICE':
-            for option in node['value'].get('options', []):
-                if isinstance(option, dict) and option.get('aqlPath'): paths.add(option['aqlPath'])
-        if 'children' in node and isinstance(node['children'], list):
-            for child in node['children']: paths.update(_collect_element_paths(child))
-    return paths
-
-def _flatten_leaf_nodes_for_export(node, leaf_nodes_dict):
-    if isinstance(node, dict):
-        # Haal het semantische pad op dat door _process_node_for_ui is toegevoegd
-        current_node_semantic_path = node.get('semantic_path')
-
-        if node.get('is_leaf') and current_node_semantic_path: # Gebruik semantic_path
-            element_name = node.get('name', {}).get('value', 'Naamloos')
-            # Node ID voor CSV is nog steeds archetype_node_id van het element (zoals in logs)
-            element_node_id_for_csv = node.get('archetype_node_id', 'Geen ID')
-
-            if node.get('value') and isinstance(node['value'], dict) and node['value'].get('_type') == 'CHOICE':
-                options = node['value'].get('options', [])
-                if not options:
-                    # Gebruik semantic_path van het element als key en comment_path
-                    leaf_nodes_dict[current_node_semantic_path] = {
-                        'csv_name': element_name,
-                        'csv_node_id': element_node_id_for_csv,
-                        'comment_path': current_node_semantic_path
-                    }
-                else:
-                    for i, opt in enumerate(options):
-                        if isinstance(opt, dict):
-                            # Opties hebben nu ook een 'semantic_path' veld door aanpassing in _create_value_structure
-                            option_specific_semantic_path = opt.get('semantic_path')
-                            
-                            # Als een optie geen eigen semantic_path heeft (bv. geen 'id'),
-                            # dan is de opmerking waarschijnlijk bedoeld voor het parent element.
-                            # Of we moeten een manier hebben om de optie uniek te identificeren binnen de semantic path.
-                            # Voor nu: als de optie een eigen semantic path heeft, gebruik dat. Anders, het pad van het element.
-                            # Jouw pad `.../relationship` suggereert dat 'relationship' de 'id' is en dus deel van semantic path.
-                            # Als 'relationship' een DV_CODED_TEXT is, zijn de opties (codes) meestal niet aparte ID-segmenten in zo'n pad.
-                            # De opmerking is dan waarschijnlijk op '.../relationship' zelf.
-
-                            comment_path_for_option_row = option_specific_semantic_path or current_node_semantic_path
-
-                            # Naamgeving voor CSV (behoud originele logica die elementnaam en optie-ID combineert)
-                            option_value_id_for_name = opt.get('archetype_node_id', '') # ID/code van de optie
-                            csv_name_for_option = f"{element_name} ({option_value_id_for_name})" \
-                                if i > 0 and option_value_id_for_name and option_value_id_for_name.lower() != 'value' \
-                                else (f"{element_name} (als {opt.get('value',{}).get('_type',f'Optie{i+1}')})" \
-                                if i > 0 else element_name)
-                            
-                            # De unieke sleutel voor all_questions_map.
-                            # Als we overstappen op semantic_path als primaire identificatie,
-                            # zou de key idealiter `comment_path_for_option_row` moeten zijn,
-                            # mogelijk aangevuld om uniekheid te garanderen als meerdere opties dezelfde path zouden krijgen.
-                            # Voor nu houden we de oude #CHOICE_OPT structuur voor de dict key, maar vullen met semantic path.
-                            # Echter, als `comment_path_for_option_row` de unieke identifier wordt,
-                            # dan moet de `all_questions_map` daarmee geïndexeerd worden.
-                            # Laten we `comment_path_for_option_row` als sleutel gebruiken als die er is.
-                            dict_key_for_map = comment_path_for_option_row
-                            if not dict_key_for_map : # Fallback als semantic path ontbreekt
-                                dict_key_for_map = f"{current_node_semantic_path or node.get('aqlPath')}#CHOICE_OPT_{i}_{option_value_id_for_name or i}"
-
-
-                            leaf_nodes_dict[dict_key_for_map] = {
-                                'csv_name': csv_name_for_option,
-                                'csv_node_id': element_node_id_for_csv, # Nog steeds Node ID van het parent element
-                                'comment_path': comment_path_for_option_row
-                            }
-            else: # Regulier blad-element
-                # Gebruik semantic_path als key en comment_path
-                leaf_nodes_dict[current_node_semantic_path] = {
-                    'csv_name': element_name,
-                    'csv_node_id': element_node_id_for_csv,
-                    'comment_path': current_node_semantic_path
-                }
-
-        # Recursie voor kinderen van container nodes (als node zelf geen blad is)
-        if 'children' in node and isinstance(node.get('children'), list) and not node.get('is_leaf'):
-            for child_node in node.get('children', []):
-                _flatten_leaf_nodes_for_export(child_node, leaf_nodes_dict) # child_node heeft zijn eigen semantic_path
-
-    elif isinstance(node, list):
-        for item_node in node:
-            _flatten_leaf_nodes_for_export(item_node, leaf_nodes_dict)
-            
 # --- Routes ---
 @bp.route('/')
 def index():
     # AANGEPAST: Redirect naar de Medblocks-compatibele form_page zonder section_index
     return redirect(url_for('main.form_page'))
 
+def _section_toc(template_id, language=None):
+    """Inhoudsopgave van de secties: klein genoeg om direct in de pagina mee te sturen."""
+    toc = []
+    version = template_registry.sections_version(template_id)
+    for index, section in enumerate(template_registry.get_sections(template_id, language)):
+        toc.append({
+            "index": index, "number": section['number'], "name": section['name'],
+            "semantic_path": section['semantic_path'], "questions": section['questions'],
+            "url": url_for('main.section_web_template_json', template_id=template_id, index=index, version=version,
+                           lang=language)
+        })
+    return toc
+
 @bp.route('/formulier', methods=['GET']) # AANGEPAST: Geen section_index meer
-def form_page():
-    original_web_template_dict_for_mb = get_original_web_template_data()
-    questionnaire_transformed_structure = get_cached_questionnaire_structure() 
+@bp.route('/formulier/<template_ref>', methods=['GET'])
+def form_page(template_ref=None):
+    template_id = _resolve_template_or_404(template_ref)
+    language = _request_language(template_id)
+    questionnaire_transformed_structure = get_cached_questionnaire_structure(template_id, language)
+    sections = template_registry.get_sections(template_id, language)
     error_msg_for_template = None
-    if not original_web_template_dict_for_mb or original_web_template_dict_for_mb == {}:
-        error_msg_for_template = "Kritieke fout: De web template definitie (ACP-DUTCH.json) kon niet geladen worden."
+    if not sections:
+        error_msg_for_template = f"Kritieke fout: De web template definitie ({template_id}.json) kon niet geladen worden."
         questionnaire_name = "Fout bij laden vragenlijst"
     else:
         questionnaire_name = questionnaire_transformed_structure.get('name',{}).get('value','Vragenlijst')
-    
-    # De comments_by_path variabele wordt hier niet meer meegegeven aan de template,
-    # omdat de API endpoints gebruikt zullen worden door de frontend.
-    return render_template('index.html',
+
+    # Alleen de inhoudsopgave gaat mee; de browser haalt per sectie de web template op (gecached)
+    return _vary_on_language(render_template('index.html',
                            title=f"Review: {questionnaire_name}",
-                           web_template_for_mb_js=original_web_template_dict_for_mb, 
-                           questionnaire_for_js=questionnaire_transformed_structure, 
-                           error_message=error_msg_for_template)
+                           template_id=template_id,
+                           questionnaire_name=questionnaire_name,
+                           questionnaire_version=questionnaire_transformed_structure.get('version'),
+                           sections=_section_toc(template_id, language) if sections else [],
+                           export_formats=available_exporters(),
+                           error_message=error_msg_for_template))
+
+def _asset_response(asset, current_url=None):
+    """
+    Antwoord met een voorgecomprimeerde asset als onveranderlijk bestand (ETag per encoding).
+
+    Is `current_url` gegeven, dan hoort de URL bij een verouderde versie: doorsturen.
+    """
+    if current_url is not None:
+        response = redirect(current_url)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    encoding = asset.select_encoding(request.accept_encodings)
+    if any(request.if_none_match.contains(etag) for etag in asset.all_etags()):
+        response = Response(status=304)
+    else:
+        response = Response(asset.variants[encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(asset.etag_for(encoding))
+    response.headers['Cache-Control'] = WEB_TEMPLATE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/formulier/<template_id>/web-template/<version>.json', methods=['GET'])
+def web_template_json(template_id, version):
+    """
+    Serveert de web template als onveranderlijk, gecomprimeerd bestand.
+
+    De URL bevat de content-hash, dus een nieuwe templateversie krijgt vanzelf een nieuwe URL.
+    Een verouderde versie wordt doorgestuurd naar de actuele.
+    """
+    template_id = _resolve_template_or_404(template_id)
+    web_template_asset = get_web_template_asset(template_id)
+    if web_template_asset is None:
+        abort(404)
+    current_url = None
+    if version != web_template_asset.version:
+        current_url = url_for('main.web_template_json', template_id=template_id, version=web_template_asset.version)
+    return _asset_response(web_template_asset, current_url)
+
+@bp.route('/formulier/<template_id>/secties/<int:index>/<version>.json', methods=['GET'])
+def section_web_template_json(template_id, index, version):
+    """
+    De web template van één sectie (zie `template_compiler.split_sections`), net als de volledige
+    als onveranderlijk bestand met de content-hash van de template in de URL. Een verouderde
+    versie wordt doorgestuurd naar de actuele. De taal staat in de URL (`?lang=`), niet in
+    `Accept-Language`: anders zou een onveranderlijke URL per browser iets anders opleveren.
+    """
+    template_id = _resolve_template_or_404(template_id)
+    language = _request_language(template_id, negotiate=False)
+    section_asset = template_registry.get_section_asset(template_id, index, language)
+    if section_asset is None:
+        abort(404)
+    current_url = None
+    current_version = template_registry.sections_version(template_id)
+    if version != current_version:
+        current_url = url_for('main.section_web_template_json', template_id=template_id, index=index,
+                              version=current_version, lang=language)
+    return _asset_response(section_asset, current_url)
+
+@bp.route('/api/templates/<template_ref>/sections', methods=['GET'])
+def template_sections_api(template_ref):
+    """
+    Inhoudsopgave: per sectie nummer, naam, semantisch pad, aantal vragen en de URL van de web template.
+    Namen in de taal van `?lang=` of `Accept-Language` (zie `languages`).
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    language = _request_language(template_id)
+    questionnaire = get_cached_questionnaire_structure(template_id, language)
+    return _vary_on_language(jsonify({
+        "template_id": template_id, "name": questionnaire.get('name', {}).get('value'),
+        "version": questionnaire.get('version'), "sections": _section_toc(template_id, language),
+        "language": language or (template_registry.languages(template_id) or [None])[0],
+        "languages": template_registry.languages(template_id)
+    }))
+
+@bp.route('/dekking/<template_ref>', methods=['GET'])
+@read_only
+def coverage_page(template_ref):
+    """Dashboard: per sectie hoeveel vragen commentaar hebben, en welke nog niet."""
+    template_id = _resolve_template_or_404(template_ref)
+    language = _request_language(template_id)
+    coverage = template_coverage(template_id, language)
+    questionnaire_name = get_cached_questionnaire_structure(template_id, language).get('name', {}).get('value', 'Vragenlijst')
+    return _vary_on_language(render_template('coverage.html', title=f"Dekking: {questionnaire_name}",
+                           template_id=template_id, questionnaire_name=questionnaire_name, coverage=coverage,
+                           questions={question['element_path']: question for question in coverage['questions']}))
+
+@bp.route('/api/templates/<template_ref>/coverage', methods=['GET'])
+@read_only
+def template_coverage_api(template_ref):
+    """
+    Reviewdekking per vraag en per (sub)sectie: aantal opmerkingen, aantal reviewers en de
+    vragen zonder commentaar. Leest alleen de aggregaattabel, nooit alle commentaren.
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    return _vary_on_language(jsonify(template_coverage(template_id, _request_language(template_id))))
+
+@bp.route('/api/templates', methods=['GET'])
+def list_templates_api():
+    """Overzicht van beschikbare templates plus de hit/miss/eviction-tellers van de template-caches."""
+    templates = [
+        {"index": index, "id": template_id, "url": url_for('main.form_page', template_ref=template_id)}
+        for index, template_id in enumerate(template_registry.template_ids())
+    ]
+    return jsonify({"templates": templates, "cache": template_registry.stats()})
 
 @bp.route('/submit-openehr-data', methods=['POST'])
 def submit_openehr_data():
     if not request.is_json:
         return jsonify({"error": "Request moet JSON zijn", "status": "error"}), 400
     data = request.get_json()
-    current_app.logger.info(f"Ontvangen Medblocks UI data: {json.dumps(data, indent=2, ensure_ascii=False)}")
+    current_app.logger.debug(f"Ontvangen Medblocks UI data: {json.dumps(data, indent=2, ensure_ascii=False)}")
     return jsonify({"message": "Data succesvol ontvangen (simulatie)", "status": "success"}), 200
 
+def _export_response(exporter, template_id, all_questions_map):
+    if exporter.streaming:
+        # In blokken gestreamd; de eerste bytes (header) gaan direct de deur uit
+        return Response(
+            stream_with_context(exporter.stream(template_id, all_questions_map)), mimetype=exporter.mimetype,
+            headers={"Content-Disposition": f"attachment;filename={exporter.filename(template_id)}"}
+        )
+    # Containerformaten (XLSX, Parquet) worden eerst naar een tijdelijk bestand geschreven
+    export_file = tempfile.TemporaryFile()
+    exporter.write(template_id, all_questions_map, export_file)
+    export_file.seek(0)
+    return send_file(export_file, mimetype=exporter.mimetype, as_attachment=True,
+                     download_name=exporter.filename(template_id))
+
 @bp.route('/export/comments')
-def export_comments_csv():
+@bp.route('/export/comments/<template_ref>')
+@read_only
+def export_comments_csv(template_ref=None):
+    template_id = _resolve_template_or_404(template_ref)
     try:
-        current_app.logger.info("Start genereren CSV-export voor commentaren (per vraag)...")
-        questionnaire = get_cached_questionnaire_structure()
-        all_questions_map = {}
-        _flatten_leaf_nodes_for_export(questionnaire.get('content', []), all_questions_map)
+        current_app.logger.info(f"Start genereren CSV-export voor commentaren (per vraag) van template '{template_id}'...")
+        all_questions_map = template_registry.get_leaf_map(template_id)
         current_app.logger.info(f"Aantal unieke 'vragen' (items in all_questions_map): {len(all_questions_map)}")
-
-        all_comments_db = Comment.query.order_by(Comment.element_path, Comment.created_at.asc()).all()
-        current_app.logger.info(f"Totaal aantal commentaren opgehaald uit DB: {len(all_comments_db)}")
-
-        comments_by_element_path = defaultdict(list)
-        if not all_comments_db:
-            current_app.logger.info("Geen commentaren gevonden in de database.")
-        else:
-            for comment_obj in all_comments_db:
-                cleaned_comment_text = comment_obj.comment_text.replace('\r', '').replace('\n', ' ')
-                comments_by_element_path[comment_obj.element_path].append(cleaned_comment_text)
-                # Log een paar voorbeelden van geladen commentaren en hun paden
-                if len(comments_by_element_path) <= 5: # Log details voor de eerste paar paden
-                     current_app.logger.debug(f"Commentaar voor pad '{comment_obj.element_path}': '{cleaned_comment_text}'")
-        current_app.logger.info(f"Commentaren gegroepeerd per element_path. Aantal paden met commentaren: {len(comments_by_element_path)}")
-        # Optioneel: log alle gegroepeerde commentaren als het er niet te veel zijn
-        # current_app.logger.debug(f"Gegroepeerde commentaren: {comments_by_element_path}")
-
-
-        output = io.StringIO()
-        writer = csv.writer(output, quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(['Vraag Naam', 'Node ID', 'Commentaar'])
-
-        rows_written = 0
-        for question_key, question_details in all_questions_map.items(): # Itereer over items om ook de key te hebben voor logging
-            vraag_naam = question_details.get('csv_name', 'N.v.t.')
-            node_id_at_code = question_details.get('csv_node_id', 'N.v.t.')
-            comment_path_for_this_question = question_details.get('comment_path')
-
-            # Logging voor elke vraag in de CSV
-            current_app.logger.debug(f"--- Verwerken voor CSV-rij ---")
-            current_app.logger.debug(f"Vraag Key (uit all_questions_map): '{question_key}'")
-            current_app.logger.debug(f"Vraag Naam: '{vraag_naam}', Node ID: '{node_id_at_code}'")
-            current_app.logger.debug(f"Verwacht comment_path voor deze vraag: '{comment_path_for_this_question}'")
-
-            associated_comments_list = []
-            if comment_path_for_this_question:
-                associated_comments_list = comments_by_element_path.get(comment_path_for_this_question, [])
-                if not associated_comments_list:
-                    current_app.logger.debug(f"GEEN commentaren gevonden in 'comments_by_element_path' voor pad: '{comment_path_for_this_question}'")
-                else:
-                    current_app.logger.debug(f"GEVONDEN commentaren voor pad '{comment_path_for_this_question}': {associated_comments_list}")
-            else:
-                current_app.logger.warning(f"Geen 'comment_path' gedefinieerd voor vraag: '{vraag_naam}' (key: {question_key})")
-            
-            concatenated_comments = "; ".join(associated_comments_list)
-            # current_app.logger.debug(f"Samengevoegde commentaren voor CSV: '{concatenated_comments}'") # Kan veel output geven
-
-            writer.writerow([vraag_naam, node_id_at_code, concatenated_comments])
-            rows_written += 1
-        
-        current_app.logger.info(f"Totaal aantal rijen geschreven naar CSV: {rows_written}")
-
-        output.seek(0)
-        current_app.logger.info("CSV-export succesvol gegenereerd.")
-        return Response(
-            output, mimetype="text/csv",
-            headers={"Content-Disposition": "attachment;filename=commentaren_export_per_vraag.csv"}
-        )
+        return _export_response(get_exporter('csv'), template_id, all_questions_map)
     except Exception as e:
         current_app.logger.error(f"FATALE Fout bij het genereren van CSV-export (per vraag): {e}", exc_info=True)
         flash(f'Fout bij het genereren van CSV-export (per vraag): {str(e)}', 'danger')
         referrer_url = request.referrer
         if not referrer_url:
             try:
-                referrer_url = url_for('main.form_page') 
+                referrer_url = url_for('main.form_page', template_ref=template_id) 
             except Exception:
                  referrer_url = url_for('/')
         return redirect(referrer_url)
 
+@bp.route('/export/comments/<template_ref>/<export_format>')
+@read_only
+def export_comments(template_ref, export_format):
+    """Export in een gekozen formaat: csv (per vraag), jsonl, xlsx of parquet (per commentaar)."""
+    template_id = _resolve_template_or_404(template_ref)
+    exporter = get_exporter(export_format)
+    if exporter is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Onbekend of niet beschikbaar exportformaat '{export_format}'.",
+            "available_formats": [available.name for available in available_exporters()]
+        }), 400
+    if not exporter.streaming:
+        # Containerformaten kunnen niet streamen: op de achtergrond maken, of het kant-en-klare resultaat sturen
+        job, _ = export_jobs.submit(template_id, exporter.name)
+        if job.status == 'done':
+            return _export_job_download(job, exporter)
+        return _export_job_response(job, 202)
+    current_app.logger.info(f"Start export '{exporter.name}' voor template '{template_id}'...")
+    return _export_response(exporter, template_id, template_registry.get_leaf_map(template_id))
+
+# --- Achtergrond-exports ---
+
+def _export_job_json(job):
+    return {
+        "id": job.id,
+        "template_id": job.template_id,
+        "format": job.export_format,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "result_size": job.result_size,
+        "created_at": job.created_at.isoformat() + 'Z' if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() + 'Z' if job.finished_at else None,
+        "status_url": url_for('main.export_job_status_api', job_id=job.id),
+        "download_url": url_for('main.export_job_download', job_id=job.id) if job.status == 'done' else None,
+    }
+
+def _export_job_response(job, status_code):
+    response = jsonify({"status": "success", "job": _export_job_json(job)})
+    response.status_code = status_code
+    response.headers['Location'] = url_for('main.export_job_status_api', job_id=job.id)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _export_job_download(job, exporter):
+    if not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({"status": "error", "message": "Exportresultaat is niet meer beschikbaar; vraag de export opnieuw aan."}), 410
+    return send_file(job.result_path, mimetype=exporter.mimetype, as_attachment=True,
+                     download_name=exporter.filename(job.template_id))
+
+@bp.route('/api/exports', methods=['POST'])
+def create_export_job_api():
+    """
+    Vraagt een export op de achtergrond aan.
+
+    Verwacht JSON met `template_id` (optioneel, anders de standaardtemplate) en `format`.
+    Geeft 202 met de job (en een Location-header naar de status), of 200 als een eerder
+    resultaat met dezelfde template en commentaarstand hergebruikt kan worden.
+    """
+    data = request.get_json(silent=True) or {}
+    export_format = data.get('format') or 'csv'
+    template_id = template_registry.resolve(data.get('template_id'))
+    if not template_id:
+        return jsonify({"status": "error", "message": f"Onbekende template '{data.get('template_id')}'."}), 404
+    exporter = get_exporter(export_format)
+    if exporter is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Onbekend of niet beschikbaar exportformaat '{export_format}'.",
+            "available_formats": [available.name for available in available_exporters()]
+        }), 400
+    try:
+        job, created = export_jobs.submit(template_id, exporter.name)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Fout bij aanvragen export '{export_format}' voor '{template_id}': {e}", exc_info=True)
+        return jsonify({"status": "error", "message": "Kon export niet aanvragen."}), 500
+    if created:
+        current_app.logger.info(f"Export {job.id} ({template_id}, {exporter.name}) in de wachtrij gezet.")
+    return _export_job_response(job, 200 if job.status == 'done' else 202)
+
+@bp.route('/api/exports/<job_id>', methods=['GET'])
+def export_job_status_api(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Export niet gevonden."}), 404
+    return _export_job_response(job, 200)
+
+@bp.route('/api/exports/<job_id>/download', methods=['GET'])
+def export_job_download(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Export niet gevonden."}), 404
+    if job.status == 'expired':
+        return jsonify({"status": "error", "message": "Exportresultaat is niet meer beschikbaar; vraag de export opnieuw aan.",
+                        "job": _export_job_json(job)}), 410
+    if job.status != 'done':
+        return jsonify({"status": "error", "message": f"Export is nog niet klaar (status: {job.status}).",
+                        "job": _export_job_json(job)}), 409
+    exporter = get_exporter(job.export_format)
+    if exporter is None:
+        return jsonify({"status": "error", "message": f"Exportformaat '{job.export_format}' is niet beschikbaar."}), 410
+    return _export_job_download(job, exporter)
+
 # --- API Endpoints voor Commentaren (voor Medblocks UI integratie) ---
 
+def _template_path_range(template_id):
+    return template_path_filter(template_registry.root_path(template_id))
+
+def _comments_state_etag(kind, template_id, path_filter):
+    """ETag op basis van de laatste wijziging: aantal, hoogste ID en laatste updated_at binnen de template."""
+    count, max_id, max_updated_at = comment_state(*path_filter)
+    state = f"{kind}:{template_id}:{count}:{max_id}:{max_updated_at}"
+    return hashlib.sha1(state.encode('utf-8')).hexdigest()[:20]
+
+def _not_modified_or(etag, build_response):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build_response()
+    response.set_etag(etag)
+    # Altijd opnieuw valideren: het antwoord mag gecached worden, maar verandert bij elke nieuwe opmerking
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/api/templates/<template_ref>/comments', methods=['GET'])
+def template_comments_api(template_ref):
+    """
+    Alle commentaren van een template in één antwoord, gegroepeerd per element_path.
+
+    Vervangt een aanroep van /api/comments/get/<pad> per vraag. Ondersteunt If-None-Match.
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    path_filter = _template_path_range(template_id)
+    etag = _comments_state_etag('comments', template_id, path_filter)
+
+    def build_response():
+        last_event_id = db.session.query(func.max(CommentEvent.id)).scalar() or 0
+        rows = db.session.query(
+            Comment.id, CommentPath.path, Comment.comment_text,
+            Comment.author_name, Comment.created_at, Comment.parent_id
+        ).join(Comment.path).filter(*path_filter).order_by(CommentPath.path, Comment.created_at.asc(), Comment.id).all()
+        comments_by_path = defaultdict(list)
+        for comment_id, element_path, comment_text, author_name, created_at, parent_id in rows:
+            comments_by_path[element_path].append({
+                'id': comment_id, 'comment_text': comment_text,
+                'author_name': author_name,
+                'created_at': created_at.isoformat() + 'Z' if created_at else None,
+                'parent_id': parent_id
+            })
+        # Vóór de commentaren gelezen: live updates vanaf dit punt missen niets (hooguit dubbel)
+        return jsonify({"template_id": template_id, "total": len(rows), "comments": comments_by_path,
+                        "last_event_id": last_event_id})
+
+    return _not_modified_or(etag, build_response)
+
+@bp.route('/api/templates/<template_ref>/comments/events', methods=['GET'])
+def template_comment_events(template_ref):
+    """
+    Server-Sent Events met elke toevoeging, wijziging en verwijdering van commentaren in een template.
+
+    Begint na `Last-Event-ID` (bij opnieuw verbinden) of `?since=<event-ID>` (het `last_event_id`
+    uit /api/templates/<template>/comments); zonder beide alleen nieuwe events.
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('since', type=int)
+    subscription = comment_events.subscribe(template_id)
+    if subscription is None:
+        # Alle streamplaatsen van deze worker bezet; de client probeert het later opnieuw
+        retry_seconds = max(1, CLIENT_RETRY_MS // 1000)
+        response = Response(f"retry: {CLIENT_RETRY_MS}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(retry_seconds)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    try:
+        replayed, reset_to = comment_events.replay(template_id, last_event_id)
+    except Exception:
+        comment_events.unsubscribe(subscription)
+        raise
+    # De stream zelf heeft geen databaseverbinding nodig
+    db.session.remove()
+    response = Response(comment_events.stream(subscription, replayed, reset_to), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no' # nginx: niet bufferen
+    return response
+
+@bp.route('/api/templates/<template_ref>/comments/counts', methods=['GET'])
+@read_only
+def template_comment_counts_api(template_ref):
+    """Alleen het aantal commentaren per element_path, bv. om vragen met commentaar te markeren."""
+    template_id = _resolve_template_or_404(template_ref)
+    path_filter = _template_path_range(template_id)
+    etag = _comments_state_etag('counts', template_id, path_filter)
+
+    def build_response():
+        rows = db.session.query(CommentPath.path, func.count(Comment.id)) \
+            .join(Comment.path).filter(*path_filter).group_by(CommentPath.path).all()
+        counts = {element_path: count for element_path, count in rows}
+        return jsonify({"template_id": template_id, "total": sum(counts.values()), "counts": counts})
+
+    return _not_modified_or(etag, build_response)
+
+@bp.route('/api/templates/<template_ref>/nodes', methods=['GET'])
+def template_nodes_api(template_ref):
+    """
+    Paden van een template onder een prefix (`?prefix=...`, standaard de hele template).
+
+    Met `?limit=N` (standaard 1000) wordt de lijst afgekapt; `truncated` geeft aan of dat gebeurde.
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    path_index = template_registry.get_path_index(template_id)
+    prefix = request.args.get('prefix') or template_registry.root_path(template_id)
+    limit = max(1, request.args.get('limit', 1000, type=int))
+    paths = path_index.with_prefix(path_index.resolve(prefix) or prefix, limit=limit + 1)
+    return jsonify({
+        "template_id": template_id,
+        "prefix": prefix,
+        "nodes": [path_index.get(path) for path in paths[:limit]],
+        "truncated": len(paths) > limit
+    })
+
+@bp.route('/api/templates/<template_ref>/nodes/<path:node_path>', methods=['GET'])
+def template_node_api(template_ref, node_path):
+    """Eén node op semantisch pad (ook Medblocks-pad met `:0`/`|suffix`, of AQL-pad), met ouders en kinderen."""
+    template_id = _resolve_template_or_404(template_ref)
+    path_index = template_registry.get_path_index(template_id)
+    node = path_index.get(node_path)
+    if node is None:
+        return jsonify({"status": "error", "message": f"Onbekend pad '{node_path}'."}), 404
+    return jsonify({
+        "template_id": template_id,
+        "node": node,
+        "ancestors": path_index.ancestors(node_path),
+        "children": [path_index.get(path) for path in path_index.children(node_path)]
+    })
+
+# Maximaal aantal zoekresultaten per pagina
+SEARCH_MAX_LIMIT = 100
+
+@bp.route('/api/search', methods=['GET'])
+@read_only
+def search_api():
+    """
+    Zoekt in commentaren (tekst en auteur) en in de namen van vragen.
+
+    Query-parameters: `q` (verplicht), `template_id` (standaard: alle commentaren, en de vragen
+    van de standaardtemplate), `scope` (`all`, `comments` of `questions`), `limit` en `offset`.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"status": "error", "message": "Zoekterm (q) is verplicht."}), 400
+    scope = request.args.get('scope', 'all')
+    if scope not in ('all', 'comments', 'questions'):
+        return jsonify({"status": "error", "message": f"Onbekende scope '{scope}'."}), 400
+    template_ref = request.args.get('template_id')
+    template_id = _resolve_template_or_404(template_ref)
+    limit = min(max(1, request.args.get('limit', 20, type=int)), SEARCH_MAX_LIMIT)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    result = {"query": query, "template_id": template_id}
+
+    if scope in ('all', 'comments'):
+        root_path = template_registry.root_path(template_id) if template_ref else None
+        comments, has_more = search_comments(query, root_path=root_path, limit=limit, offset=offset)
+        path_indexes = {}
+        for comment in comments:
+            # Naam van de vraag erbij, uit de index van de template waar het pad bij hoort
+            path_template_id = template_registry.template_for_path(comment['element_path'])
+            if path_template_id is not None and path_template_id not in path_indexes:
+                path_indexes[path_template_id] = template_registry.get_path_index(path_template_id)
+            node = path_indexes[path_template_id].get(comment['element_path']) if path_template_id else None
+            comment['template_id'] = path_template_id
+            comment['question_name'] = node['name'] if node else None
+        result['comments'] = {"results": comments, "has_more": has_more,
+                              "next_offset": offset + limit if has_more else None}
+
+    if scope in ('all', 'questions'):
+        questions, has_more = template_registry.get_label_index(template_id).search(query, limit=limit, offset=offset)
+        path_index = template_registry.get_path_index(template_id)
+        result['questions'] = {
+            "results": [{
+                'semantic_path': question['semantic_path'], 'name': question['name'],
+                'section_number': path_index.section_number(question['semantic_path']), 'is_leaf': question['is_leaf'],
+                'rm_type': question['rm_type'], 'score': question['score']
+            } for question in questions],
+            "has_more": has_more, "next_offset": offset + limit if has_more else None
+        }
+    return jsonify(result)
+
 @bp.route('/api/comments/get/<path:element_path>', methods=['GET'])
 def get_comments_api(element_path):
-    comments = Comment.query.filter_by(element_path=element_path).order_by(Comment.created_at.asc()).all()
+    if 'limit' in request.args or 'cursor' in request.args:
+        # Gepagineerd: voor vragen met veel commentaar
+        return _comment_listing(CommentPath.path == element_path)
+    # Beide vormen komen uit de gedeelde cache; een wijziging op het pad maakt ze ongeldig
+    if request.args.get('threaded'):
+        return response_cache.json_response(f"threaded:{element_path}", element_path,
+                                            lambda: _threaded_comments_response(element_path))
+    return response_cache.json_response(f"flat:{element_path}", element_path,
+                                        lambda: _path_comments_response(element_path))
+
+def _threaded_comments_response(element_path):
+    # Geneste threads (antwoorden onder hun parent), geladen in één query
+    def thread_to_dict(comment):
+        return {
+            'id': comment.id, 'comment_text': comment.comment_text,
+            'author_name': comment.author_name,
+            'created_at': comment.created_at.isoformat() + 'Z',
+            'replies': [thread_to_dict(reply) for reply in comment.replies]
+        }
+    return jsonify([thread_to_dict(comment) for comment in Comment.threads_for_path(element_path)])
+
+def _path_comments_response(element_path):
+    comments = Comment.for_path_query(element_path).order_by(Comment.created_at.asc()).all()
     comments_data = []
     for comment in comments:
         comments_data.append({
             'id': comment.id, 'comment_text': comment.comment_text,
             'author_name': comment.author_name,
-            'created_at': comment.created_at.isoformat() + 'Z' 
+            'created_at': comment.created_at.isoformat() + 'Z',
+            'parent_id': comment.parent_id
         })
     return jsonify(comments_data)
 
+# Standaard- en maximumaantal commentaren per pagina van /api/comments
+LISTING_DEFAULT_LIMIT = 50
+LISTING_MAX_LIMIT = 200
+
+def _comment_listing(*filters):
+    """Eén pagina commentaren (keyset op created_at, id) binnen de filters; zie comment_listing_api."""
+    limit = min(max(1, request.args.get('limit', LISTING_DEFAULT_LIMIT, type=int)), LISTING_MAX_LIMIT)
+    descending = request.args.get('order', 'asc') == 'desc'
+    query = db.session.query(
+        Comment.id, CommentPath.path, Comment.comment_text, Comment.author_name,
+        Comment.created_at, Comment.updated_at, Comment.parent_id
+    ).join(Comment.path).filter(*filters)
+    try:
+        rows, next_cursor = keyset_page(query, Comment.created_at, Comment.id, cursor=request.args.get('cursor'),
+                                        limit=limit, descending=descending)
+    except InvalidCursor as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({
+        "comments": [{
+            'id': comment_id, 'element_path': element_path, 'comment_text': comment_text,
+            'author_name': author_name,
+            'created_at': created_at.isoformat() + 'Z' if created_at else None,
+            'updated_at': updated_at.isoformat() + 'Z' if updated_at else None,
+            'parent_id': parent_id
+        } for comment_id, element_path, comment_text, author_name, created_at, updated_at, parent_id in rows],
+        "next_cursor": next_cursor, "has_more": next_cursor is not None
+    })
+
+@bp.route('/api/comments', methods=['GET'])
+@read_only
+def comment_listing_api():
+    """
+    Commentaren over alle paden heen, gepagineerd met een cursor.
+
+    Query-parameters (alle optioneel, te combineren): `template_id`, `section` (semantisch pad
+    van een sectie of vraag; ook alles eronder), `author` (exact), `since`/`until` (ISO-tijd,
+    op created_at, `until` exclusief), `order` (`asc` of `desc`), `limit` (max 200) en
+    `cursor` (`next_cursor` van de vorige pagina, met dezelfde filters en volgorde).
+    """
+    filters = []
+    template_ref = request.args.get('template_id')
+    if template_ref:
+        filters.extend(_template_path_range(_resolve_template_or_404(template_ref)))
+    section = request.args.get('section', '').strip().rstrip('/')
+    if section:
+        filters.append(or_(CommentPath.path == section, and_(*template_path_filter(section))))
+    author = request.args.get('author', '').strip()
+    if author:
+        filters.append(Comment.author_name == author)
+    try:
+        since = parse_datetime(request.args.get('since'))
+        until = parse_datetime(request.args.get('until'))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Ongeldige datum in 'since' of 'until' (verwacht ISO 8601)."}), 400
+    if since:
+        filters.append(Comment.created_at >= since)
+    if until:
+        filters.append(Comment.created_at < until)
+    return _comment_listing(*filters)
+
+# Maximaal aantal wijzigingen per batch van /api/comments/changes
+CHANGES_MAX_LIMIT = 1000
+
+@bp.route('/api/comments/changes', methods=['GET'])
+def comment_changes_api():
+    """
+    Wijzigingen in commentaren na een cursor, voor incrementeel synchroniseren.
+
+    Query-parameters: `since` (cursor, standaard 0: alles), `limit` (standaard 500) en optioneel
+    `template_id`. Per commentaar staat er in een batch hoogstens één wijziging: de huidige stand,
+    of `deleted: true` (tombstone). Vraag de volgende batch op met de teruggegeven `cursor`
+    zolang `has_more` waar is. 410 als het log vanaf die cursor al is opgeruimd.
+    """
+    since = max(0, request.args.get('since', 0, type=int))
+    limit = min(max(1, request.args.get('limit', 500, type=int)), CHANGES_MAX_LIMIT)
+    if comment_events.retention_seconds > 0:
+        oldest_id = db.session.query(func.min(CommentEvent.id)).scalar()
+        if oldest_id is not None and oldest_id > since + 1:
+            return jsonify({"status": "error", "message": "Wijzigingen na deze cursor zijn niet meer beschikbaar; "
+                                                          "synchroniseer opnieuw vanaf cursor 0."}), 410
+    event_query = db.session.query(CommentEvent.id, CommentEvent.comment_id).filter(CommentEvent.id > since)
+    template_ref = request.args.get('template_id')
+    if template_ref:
+        root_path = template_registry.root_path(_resolve_template_or_404(template_ref))
+        event_query = event_query.filter(CommentEvent.element_path >= f"{root_path}/",
+                                         CommentEvent.element_path < f"{root_path}0")
+    events = event_query.order_by(CommentEvent.id).limit(limit + 1).all()
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    # Alleen de laatste wijziging per commentaar, met de huidige stand uit de tabel zelf
+    revisions = {}
+    for revision, comment_id in events:
+        revisions.pop(comment_id, None)
+        revisions[comment_id] = revision
+    comments = {comment.id: comment for comment in Comment.query.filter(Comment.id.in_(list(revisions))).all()} if revisions else {}
+    changes = []
+    for comment_id, revision in revisions.items():
+        if comment_id in comments:
+            changes.append({'revision': revision, 'comment_id': comment_id, 'comment': comment_event_data(comments[comment_id])})
+        else:
+            changes.append({'revision': revision, 'comment_id': comment_id, 'deleted': True})
+    return jsonify({
+        "changes": changes,
+        "cursor": events[-1].id if events else since,
+        "has_more": has_more
+    })
+
+@bp.route('/api/comments/<int:comment_id>/history', methods=['GET'])
+def comment_history_api(comment_id):
+    """Alle revisies van één commentaar, oudste eerst (de inhoud per revisie, leeg bij verwijderen)."""
+    events = CommentEvent.query.filter_by(comment_id=comment_id).order_by(CommentEvent.id).all()
+    if not events:
+        return jsonify({"status": "error", "message": f"Geen geschiedenis voor opmerking {comment_id}."}), 404
+    return jsonify({
+        "comment_id": comment_id,
+        "revisions": [{
+            'revision': event.id, 'action': event.action,
+            'at': event.created_at.isoformat() + 'Z' if event.created_at else None,
+            'comment': json.loads(event.payload) if event.payload else None
+        } for event in events]
+    })
+
 @bp.route('/api/comments/add', methods=['POST'])
 def add_comment_api():
     comment_text = request.form.get('comment_text')
     author_name = request.form.get('author_name', 'Anoniem').strip()
     element_path = request.form.get('element_path')
+    template_id = template_registry.resolve(request.form.get('template_id')) if request.form.get('template_id') else None
+    parent_id = request.form.get('parent_id', type=int)
     if not author_name: author_name = 'Anoniem'
     if not comment_text or not comment_text.strip():
         return jsonify({"status": "error", "message": "Commentaartekst mag niet leeg zijn."}), 400
     if not element_path:
         return jsonify({"status": "error", "message": "Element pad (element_path) is verplicht."}), 400
+    if parent_id is not None and db.session.get(Comment, parent_id) is None:
+        return jsonify({"status": "error", "message": f"Opmerking {parent_id} (parent_id) bestaat niet."}), 400
+    # Opgeslagen wordt het semantische pad (zoals bij importeren), niet een Medblocks- of AQL-pad:
+    # alleen dan hoort de opmerking bij zijn vraag in exports, dekking en de response-cache
+    _, semantic_path = template_registry.resolve_path(element_path, template_id)
+    if semantic_path is None:
+        current_app.logger.warning(f"API: Commentaar geweigerd voor onbekend pad '{element_path}'.")
+        return jsonify({"status": "error", "message": f"Onbekend element pad '{element_path}'."}), 400
+    element_path = semantic_path
     try:
         timestamp = datetime.now(pytz.utc) 
         comment = Comment(
             comment_text=comment_text.strip(), author_name=author_name,
-            element_path=element_path, created_at=timestamp
+            element_path=element_path, created_at=timestamp, parent_id=parent_id,
+            template_id=template_id,
+            template_version=get_cached_questionnaire_structure(template_id).get('version') if template_id else None
         )
         db.session.add(comment)
+        db.session.flush()
+        _record_comment_event('created', comment)
         db.session.commit()
         current_app.logger.info(f"API: Commentaar succesvol opgeslagen voor pad '{element_path}' door '{author_name}'")
         return jsonify({
@@ -820,6 +754,82 @@ def add_comment_api():
         current_app.logger.error(f"API Fout bij plaatsen commentaar voor pad '{element_path}': {e}", exc_info=True)
         return jsonify({"status": "error", "message": f"Serverfout bij het plaatsen van uw opmerking: {str(e)}"}), 500
 
+def _record_comment_event(action, comment):
+    """Event voor het wijzigingslog en live updates, in dezelfde transactie als de wijziging."""
+    template_id = comment.template_id or template_registry.template_for_path(comment.element_path) \
+        or comment.element_path.split('/', 1)[0] # Pad buiten bekende templates: het eerste segment
+    comment_events.record(template_id, action, comment)
+
+@bp.route('/api/templates/<template_ref>/comments/import', methods=['POST'])
+def import_comments_api(template_ref):
+    """
+    Importeert commentaren in bulk, in één transactie.
+
+    Body: een JSON-lijst (of {"comments": [...]}), een CSV (`text/csv`, of een upload in het
+    veld `file`) in de vorm van de export per vraag of met de JSON-kolommen als kop.
+    Query: `author` (standaardauteur), `dry_run=1` (alleen valideren), `atomic=1` (niets
+    importeren als een rij ongeldig is).
+    Antwoord: aantallen en een resultaat per rij; 200 ook als sommige rijen fouten hebben.
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            content = upload.read().decode('utf-8-sig')
+            is_json = upload.filename.lower().endswith('.json') or upload.mimetype == 'application/json'
+            rows = rows_from_json(content) if is_json else rows_from_csv(content)
+        elif request.mimetype in ('text/csv', 'text/plain'):
+            rows = rows_from_csv(request.get_data(as_text=True))
+        else:
+            rows = rows_from_json(request.get_json(silent=True))
+    except (CommentImportError, UnicodeDecodeError) as e:
+        return jsonify({"status": "error", "message": f"Import niet leesbaar: {e}"}), 400
+    try:
+        summary = import_comments(
+            template_id, rows, default_author=request.args.get('author', '').strip() or 'Anoniem',
+            atomic=request.args.get('atomic') in ('1', 'true'), dry_run=request.args.get('dry_run') in ('1', 'true')
+        )
+    except CommentImportError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"API Fout bij importeren van commentaren voor '{template_id}': {e}", exc_info=True)
+        return jsonify({"status": "error", "message": f"Serverfout bij het importeren: {str(e)}"}), 500
+    current_app.logger.info(f"API: Import voor '{template_id}': {summary['created']} nieuw, "
+                            f"{summary['duplicates']} al aanwezig, {summary['errors']} fouten.")
+    return jsonify({"status": "success", "template_id": template_id, **summary})
+
+@bp.route('/api/templates/<template_ref>/diff', methods=['POST'])
+def template_diff_api(template_ref):
+    """
+    Vergelijkt een oude versie van de template met de huidige (zie `app.template_diff`).
+
+    Body: de oude web template als JSON, of een upload in het veld `file`.
+    Query: `apply=1` verplaatst de commentaren op verplaatste en hernoemde nodes naar hun
+    nieuwe pad, in één transactie.
+    Antwoord: `added`, `removed`, `moved`, `renamed`, `path_map`, het migratievoorstel
+    (`migrations`, met het aantal commentaren per pad), `orphans` en bij `apply` `applied`.
+    """
+    template_id = _resolve_template_or_404(template_ref)
+    try:
+        upload = request.files.get('file')
+        old_web_template = json.loads(upload.read().decode('utf-8-sig')) if upload is not None else request.get_json(silent=True)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"status": "error", "message": f"Oude template niet leesbaar: {e}"}), 400
+    if not isinstance(old_web_template, dict) or not isinstance(old_web_template.get('tree'), dict):
+        return jsonify({"status": "error", "message": "Oude template heeft geen 'tree'."}), 400
+    diff = diff_web_templates(old_web_template, template_registry.get_web_template(template_id))
+    plan = plan_path_migrations(template_id, diff, old_web_template['tree'].get('id'))
+    applied = None
+    if request.args.get('apply') in ('1', 'true'):
+        try:
+            applied = apply_path_migrations(template_id, plan['migrations'])
+        except Exception as e:
+            current_app.logger.error(f"API Fout bij migreren van commentaren voor '{template_id}': {e}", exc_info=True)
+            return jsonify({"status": "error", "message": f"Serverfout bij het migreren: {str(e)}"}), 500
+        current_app.logger.info(f"API: {applied['comments']} commentaren van '{template_id}' verplaatst "
+                                f"naar het nieuwe pad ({applied['paths']} paden).")
+    return jsonify({"status": "success", "template_id": template_id, **diff, **plan, "applied": applied})
+
 @bp.route('/api/comments/update/<int:comment_id>', methods=['PUT'])
 def update_comment_api(comment_id):
     comment_to_update = Comment.query.get_or_404(comment_id) # Haalt comment op of geeft 404 als niet gevonden
@@ -835,6 +845,8 @@ def update_comment_api(comment_id):
 
 
     try:
+        db.session.flush()
+        _record_comment_event('updated', comment_to_update)
         db.session.commit()
         current_app.logger.info(f"API: Commentaar ID {comment_id} succesvol bijgewerkt.")
         return jsonify({
@@ -864,8 +876,17 @@ def delete_comment_api(comment_id):
     comment_to_delete = Comment.query.get_or_404(comment_id)
     
     try:
+        # Antwoorden blijven bestaan, zonder ouder. Ook dat is een wijziging: het wijzigingslog,
+        # de geschiedenis en de live updates krijgen per antwoord een 'updated'-event
+        replies = list(comment_to_delete.replies)
+        for reply in replies:
+            reply.parent_id = None
+        _record_comment_event('deleted', comment_to_delete)
         # Verwijder het object uit de database sessie
         db.session.delete(comment_to_delete)
+        db.session.flush()
+        for reply in replies:
+            _record_comment_event('updated', reply)
         # Voer de verwijdering door in de database
         db.session.commit()
         
@@ -0,0 +1,249 @@
+"""
+Volledige-tekst-zoeken in commentaren (tekst en auteur).
+
+- SQLite: een FTS5-tabel `comment_fts` met `comment` als externe inhoud. Triggers op
+  `comment` houden hem bij bij elke insert, update en delete, ook bij bulk-inserts buiten
+  het ORM om; opnieuw opbouwen is alleen nodig als de tabel voor het eerst wordt aangemaakt.
+- PostgreSQL: een gegenereerde kolom `comment.search_vector` (tsvector, Nederlands) met een
+  GIN-index; de database houdt hem zelf actueel.
+- Andere databases (of SQLite zonder FTS5): LIKE op elk zoekwoord, zonder ranking.
+
+Zoeken in de namen van vragen gebeurt in het geheugen, zie `app.label_index`.
+"""
+import re
+import weakref
+
+from markupsafe import escape
+from sqlalchemy import inspect, text
+
+from app import db
+from app.label_index import tokenize
+
+# Markeringen rond treffers in snippets; worden na het escapen van de tekst vervangen door <mark>
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+# Aantal woorden in een snippet
+SNIPPET_WORDS = 16
+# SQLite: ranking van treffers (FTS5 `rank`): bm25 met de tekst zwaarder dan de auteur
+FTS5_RANK = 'bm25(1.0, 0.5)'
+
+_WORD = re.compile(r'\w+')
+
+# Zoekmethode per engine; bepaald bij de eerste zoekopdracht
+_search_modes = weakref.WeakKeyDictionary()
+
+_SQLITE_SCHEMA = [
+    "CREATE TRIGGER IF NOT EXISTS comment_fts_ai AFTER INSERT ON comment BEGIN "
+    "INSERT INTO comment_fts (rowid, comment_text, author_name) VALUES (new.id, new.comment_text, new.author_name); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS comment_fts_ad AFTER DELETE ON comment BEGIN "
+    "INSERT INTO comment_fts (comment_fts, rowid, comment_text, author_name) "
+    "VALUES ('delete', old.id, old.comment_text, old.author_name); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS comment_fts_au AFTER UPDATE OF comment_text, author_name ON comment BEGIN "
+    "INSERT INTO comment_fts (comment_fts, rowid, comment_text, author_name) "
+    "VALUES ('delete', old.id, old.comment_text, old.author_name); "
+    "INSERT INTO comment_fts (rowid, comment_text, author_name) VALUES (new.id, new.comment_text, new.author_name); "
+    "END",
+]
+
+
+def _sqlite_has_fts5(connection):
+    options = connection.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return 'ENABLE_FTS5' in options
+
+
+def ensure_comment_search_index(connection, logger=None):
+    """
+    Maakt de zoekindex aan als hij nog niet bestaat, en vult hem dan eenmalig. Idempotent.
+
+    Aan te roepen na `db.create_all()` (de index hangt aan de tabel `comment`).
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        if not _sqlite_has_fts5(connection):
+            if logger:
+                logger.warning("WARN: SQLite zonder FTS5; zoeken in commentaren valt terug op LIKE.")
+            return
+        if not inspect(connection).has_table('comment_fts'):
+            if logger:
+                logger.info("Zoekindex 'comment_fts' aanmaken en vullen...")
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE comment_fts USING fts5("
+                "comment_text, author_name, content='comment', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            connection.execute(text("INSERT INTO comment_fts (comment_fts) VALUES ('rebuild')"))
+        # Standaardranking voor `ORDER BY rank`; staat in de configuratie van de FTS5-tabel zelf
+        connection.execute(text("INSERT INTO comment_fts (comment_fts, rank) VALUES ('rank', :rank)"),
+                           {'rank': FTS5_RANK})
+        for statement in _SQLITE_SCHEMA:
+            connection.execute(text(statement))
+    elif dialect == 'postgresql':
+        connection.execute(text(
+            "ALTER TABLE comment ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('dutch', coalesce(comment_text, '') || ' ' || coalesce(author_name, ''))) STORED"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_comment_search_vector ON comment USING GIN (search_vector)"
+        ))
+
+
+def _search_mode():
+    engine = db.engine
+    mode = _search_modes.get(engine)
+    if mode is None:
+        if engine.dialect.name == 'postgresql':
+            mode = 'postgresql'
+        elif engine.dialect.name == 'sqlite' and inspect(engine).has_table('comment_fts'):
+            mode = 'fts5'
+        else:
+            mode = 'like'
+        _search_modes[engine] = mode
+    return mode
+
+
+def fts5_query(query):
+    """
+    Zet invoer van een gebruiker om naar een veilige FTS5-query.
+
+    Elk woord wordt een term tussen aanhalingstekens (geen FTS5-syntax van de gebruiker);
+    het laatste woord telt ook als begin van een woord, zodat zoeken tijdens het typen werkt.
+    Returns None als er geen woorden in staan.
+    """
+    words = _WORD.findall(query or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _highlight(snippet):
+    """Escapet de snippet en zet de markeringen om naar <mark>."""
+    return str(escape(snippet)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _snippet(comment_text, words):
+    """
+    Fragment van `SNIPPET_WORDS` woorden rond de eerste treffer, met de treffers gemarkeerd.
+
+    Vergelijkt zoals de index (hoofdletters en accenten tellen niet, woorden als begin van een
+    woord), maar alleen voor de paar commentaren op de pagina.
+    """
+    terms = tokenize(' '.join(words))
+    spans = [(match.start(), match.end(), any(token.startswith(term) for token in tokenize(match.group()) for term in terms))
+             for match in _WORD.finditer(comment_text)]
+    first = next((index for index, span in enumerate(spans) if span[2]), 0)
+    start = max(0, first - SNIPPET_WORDS // 4)
+    window = spans[start:start + SNIPPET_WORDS]
+    if not window:
+        return comment_text
+    parts = ['…' if start else '']
+    position = window[0][0]
+    for word_start, word_end, is_match in window:
+        parts.append(comment_text[position:word_start])
+        word = comment_text[word_start:word_end]
+        parts.append(f"{_MARK_START}{word}{_MARK_END}" if is_match else word)
+        position = word_end
+    if start + SNIPPET_WORDS < len(spans):
+        parts.append(comment_text[position:window[-1][1]] + '…')
+    else:
+        parts.append(comment_text[position:])
+    return ''.join(parts)
+
+
+def search_comments(query, root_path=None, limit=20, offset=0):
+    """
+    Zoekt commentaren op tekst en auteur, best passend eerst.
+
+    Args:
+        query (str): Zoekwoorden, zoals ingetypt.
+        root_path (str, optioneel): Alleen commentaren binnen deze template (eerste padsegment).
+        limit (int): Aantal resultaten per pagina.
+        offset (int): Aantal over te slaan resultaten.
+    Returns:
+        tuple[list[dict], bool]: De resultaten (met `snippet` als HTML met <mark>), en of er meer zijn.
+    """
+    words = _WORD.findall(query or '')
+    if not words:
+        return [], False
+    params = {'limit': limit + 1, 'offset': offset}
+    path_condition = ''
+    if root_path:
+        path_condition = "AND p.path >= :path_from AND p.path < :path_to"
+        params.update(path_from=f"{root_path}/", path_to=f"{root_path}0")
+
+    mode = _search_mode()
+    if mode == 'fts5':
+        # Ranken gebeurt in FTS5 over alle treffers (`rank` is bm25 met gewichten, zie
+        # ensure_comment_search_index); het ID als tweede sleutel houdt de pagina's stabiel.
+        # Zonder template joinen alleen de commentaren op de pagina; met template filtert de
+        # join op pad vóór het ranken, zodat alleen treffers binnen de template een score krijgen.
+        params.update(query=fts5_query(query))
+        if root_path:
+            sql = f"""
+                SELECT c.id, p.path, c.author_name, c.created_at, c.parent_id, c.comment_text, -comment_fts.rank AS score
+                FROM comment_fts
+                JOIN comment c ON c.id = comment_fts.rowid
+                JOIN comment_path p ON p.id = c.path_id
+                WHERE comment_fts MATCH :query {path_condition}
+                ORDER BY comment_fts.rank, c.id
+                LIMIT :limit OFFSET :offset
+            """
+        else:
+            sql = """
+                SELECT c.id, p.path, c.author_name, c.created_at, c.parent_id, c.comment_text, -ranked.rank AS score
+                FROM (
+                    SELECT rowid AS id, rank FROM comment_fts
+                    WHERE comment_fts MATCH :query
+                    ORDER BY rank, rowid
+                    LIMIT :limit OFFSET :offset
+                ) AS ranked
+                JOIN comment c ON c.id = ranked.id
+                JOIN comment_path p ON p.id = c.path_id
+                ORDER BY ranked.rank, c.id
+            """
+    elif mode == 'postgresql':
+        params.update(query=query, options=f"StartSel={_MARK_START}, StopSel={_MARK_END}, "
+                                           f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}")
+        sql = f"""
+            SELECT c.id, p.path, c.author_name, c.created_at, c.parent_id,
+                   ts_headline('dutch', c.comment_text, q.query, :options) AS snippet,
+                   ts_rank(c.search_vector, q.query) AS score
+            FROM comment c
+            JOIN comment_path p ON p.id = c.path_id,
+                 websearch_to_tsquery('dutch', :query) AS q(query)
+            WHERE c.search_vector @@ q.query {path_condition}
+            ORDER BY score DESC, c.id
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        conditions = []
+        for index, word in enumerate(words):
+            params[f'word{index}'] = f"%{word}%"
+            conditions.append(f"(c.comment_text LIKE :word{index} OR c.author_name LIKE :word{index})")
+        sql = f"""
+            SELECT c.id, p.path, c.author_name, c.created_at, c.parent_id, c.comment_text, 0 AS score
+            FROM comment c
+            JOIN comment_path p ON p.id = c.path_id
+            WHERE {' AND '.join(conditions)} {path_condition}
+            ORDER BY c.created_at DESC, c.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    rows = db.session.execute(text(sql), params).all()
+    results = []
+    for comment_id, element_path, author_name, created_at, parent_id, snippet, score in rows[:limit]:
+        if mode != 'postgresql':
+            snippet = _snippet(snippet or '', words)
+        if isinstance(created_at, str): # Ruwe SQL: SQLite geeft de tekst uit de kolom terug
+            created_at = created_at.replace(' ', 'T')
+        elif created_at is not None:
+            created_at = created_at.isoformat()
+        results.append({
+            'comment_id': comment_id, 'element_path': element_path,
+            'author_name': author_name, 'parent_id': parent_id,
+            'created_at': created_at + 'Z' if created_at else None,
+            'snippet': _highlight(snippet or ''),
+            'score': round(float(score), 6)
+        })
+    return results, len(rows) > limit
@@ -0,0 +1,73 @@
+import marshal
+import os
+import sys
+import tempfile
+
+# Ophogen bij elke wijziging in de transformatie of de inhoud van het artefact;
+# oude artefacten worden dan genegeerd en opnieuw gecompileerd.
+ARTIFACT_FORMAT = 4
+
+# marshal is alleen stabiel binnen dezelfde Python-versie
+_PYTHON_TAG = f"{sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def artifact_path(template_filepath):
+    """Pad van het gecompileerde artefact naast het bron-JSON-bestand."""
+    base, _ = os.path.splitext(template_filepath)
+    return f"{base}.compiled-v{ARTIFACT_FORMAT}.marshal"
+
+
+def load_artifact(path, content_hash):
+    """
+    Laadt een gecompileerd artefact als het bij de huidige bron hoort.
+
+    Args:
+        path (str): Pad van het artefact.
+        content_hash (str): sha256 van het huidige bron-JSON-bestand.
+    Returns:
+        dict | None: De artefactinhoud, of None als het ontbreekt, verouderd of onleesbaar is.
+    """
+    try:
+        with open(path, 'rb') as f:
+            artifact = marshal.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(artifact, dict) or \
+       artifact.get('format') != ARTIFACT_FORMAT or \
+       artifact.get('python') != _PYTHON_TAG or \
+       artifact.get('source_sha256') != content_hash:
+        return None
+    return artifact
+
+
+def write_artifact(path, content_hash, questionnaire, leaf_map, path_index, languages=None):
+    """
+    Schrijft vragenlijst, leaf map, padindex en talen van één templateversie atomair
+    (tijdelijk bestand + rename), zodat andere workers nooit een half geschreven bestand
+    lezen. De gecomprimeerde web template zit er niet in: die wordt pas gebouwd als iemand
+    hem opvraagt.
+    """
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'python': _PYTHON_TAG,
+        'source_sha256': content_hash,
+        'questionnaire': questionnaire,
+        'leaf_map': leaf_map,
+        'path_index': path_index.to_data(),
+        'languages': list(languages or []),
+    }
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.compiled-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(artifact, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
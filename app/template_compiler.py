@@ -0,0 +1,1065 @@
+"""
+Compiler van openEHR web templates naar de vragenlijst-structuur van de UI.
+
+De uitvoer is gelijk aan die van de oorspronkelijke recursieve implementatie in
+`routes.py` (vastgelegd in `tests/data/ACP-DUTCH.questionnaire.json`), maar de boom
+wordt doorlopen met een expliciete stack in plaats van recursie, zodat ook zeer diepe of
+grote templates geen recursielimiet raken. Verder:
+
+- typetabellen (`CONTAINER_TYPES`, de waarde-types) zijn eenmalig berekende frozensets
+  en dicts, in plaats van set-unies per kind;
+- `rmType.upper()` wordt per unieke waarde één keer berekend;
+- semantische paden en AQL-paden worden geïnterneerd: de vragenlijst, de leaf map en het
+  gecompileerde artefact delen dan dezelfde string-objecten;
+- de cyclische garbage collector staat tijdens de transformatie uit (`_gc_paused`): de
+  uitvoer heeft geen cycli, en zonder die pauze groeide de tijd meer dan lineair;
+- andere talen dan de standaardtaal (`localize_questionnaire`) worden afgeleid van de
+  vragenlijst in de standaardtaal en delen daarmee alles wat niet vertaald hoeft te worden.
+
+Alleen `_create_value_structure` is nog recursief; die volgt de opties van één ELEMENT
+(keuze → optie → interval-grens) en is dus niet dieper dan een paar niveaus.
+"""
+import gc
+import logging
+import re
+import sys
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Definities van sectie- en containertypes
+ORIGINAL_SECTION_TYPES = frozenset({"SECTION"})
+NUMBERABLE_CONTAINER_TYPES = frozenset({
+    "EVALUATION", "ADMIN_ENTRY", "OBSERVATION",
+    "INSTRUCTION", "ACTION", "GENERIC_ENTRY", "CLUSTER"
+})
+# Types die als (genummerde) container in de UI verschijnen
+CONTAINER_TYPES = ORIGINAL_SECTION_TYPES | NUMBERABLE_CONTAINER_TYPES | frozenset({'EVENT_CONTEXT'})
+
+# Contextvelden die de UI zelf invult en die niet als vraag getoond worden
+STRUCTURAL_METADATA_NAMES = frozenset({
+    'language', 'encoding', 'subject', 'category',
+    'territory', 'composer', 'health_care_facility', 'location'
+})
+
+# Effectief datatype (rmType of inputs[0].type) -> soort waarde-structuur
+_VALUE_KINDS = {}
+for _kind, _data_types in (
+    ('text', ('TEXT', 'STRING', 'DV_TEXT')),
+    ('coded_text', ('CODED_TEXT', 'DV_CODED_TEXT')),
+    ('boolean', ('BOOLEAN', 'DV_BOOLEAN')),
+    ('count', ('INTEGER', 'COUNT', 'DV_COUNT')),
+    ('quantity', ('DECIMAL', 'REAL', 'DOUBLE', 'DV_QUANTITY', 'QUANTITY')),
+    ('date_time', ('DATETIME', 'DV_DATE_TIME')),
+    ('date', ('DATE', 'DV_DATE')),
+    ('time', ('TIME', 'DV_TIME')),
+    ('identifier', ('IDENTIFIER', 'DV_IDENTIFIER')),
+    ('uri', ('URI', 'DV_URI')),
+    ('duration', ('DV_DURATION',)),
+    ('proportion', ('DV_PROPORTION',)),
+):
+    for _data_type in _data_types:
+        _VALUE_KINDS[_data_type] = _kind
+del _kind, _data_types, _data_type
+
+# Voorkeursvolgorde van talen als de template zelf geen talen noemt
+DEFAULT_LANGUAGES = ('nl', 'en')
+
+_INTERVAL_INNER_TYPE = re.compile(r"DV_INTERVAL<([A-Z_]+)>")
+
+_upper_cache = {}
+
+
+def _upper(value):
+    # rmType-waarden komen uit een kleine set; .upper() dus per unieke waarde maar één keer
+    upper_value = _upper_cache.get(value)
+    if upper_value is None:
+        upper_value = _upper_cache[value] = value.upper()
+    return upper_value
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Zet de cyclische garbage collector uit tijdens een transformatie.
+
+    Een vragenlijst bestaat uit honderdduizenden nieuwe dicts en lijsten zonder cycli; de
+    collector liep er steeds opnieuw doorheen, waardoor de tijd meer dan lineair groeide met
+    de grootte van de template (zie `benchmarks.run`, scenario transform).
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _join_path(parent_path, segment):
+    """Voegt een ID-segment aan een semantisch pad toe (zonder segment blijft het pad gelijk)."""
+    if not segment:
+        return parent_path
+    return _intern(f"{parent_path}/{segment}") if parent_path else _intern(segment)
+
+
+def get_node_name(node_json, lang_codes=DEFAULT_LANGUAGES, language=None):
+    """
+    Weergavenaam van een node: `localizedName`, anders `localizedNames` in de volgorde van
+    `lang_codes`, anders `name`/`label`/`id`. Met `language` gaat de vertaling in die taal voor.
+    """
+    if not isinstance(node_json, dict): return "Ongeldige Node Structuur"
+    if language:
+        localized_name = (node_json.get('localizedNames') or {}).get(language)
+        if isinstance(localized_name, str) and localized_name.strip():
+            return localized_name
+    localized_name = node_json.get('localizedName')
+    if isinstance(localized_name, str) and localized_name.strip():
+        return localized_name
+    localized_names_dict = node_json.get('localizedNames', {})
+    if isinstance(localized_names_dict, dict):
+        for lang_code in lang_codes:
+            localized_name = localized_names_dict.get(lang_code)
+            if isinstance(localized_name, str) and localized_name.strip():
+                return localized_name
+    for key in ('name', 'label', 'id'):
+        value = node_json.get(key)
+        if isinstance(value, str) and value.strip():
+            return value
+    return "Naamloos Veld"
+
+
+def _code_label(option_item_json, lang_codes=DEFAULT_LANGUAGES, language=None):
+    """Label van een voorgedefinieerde code (DV_CODED_TEXT); met `language` uit `localizedLabels`."""
+    if language:
+        label = (option_item_json.get('localizedLabels') or {}).get(language)
+        if type(label) is str and label.strip():
+            return label
+    label = option_item_json.get('label')
+    # Codes hebben meestal alleen label/localizedLabels; die gaan direct, de rest via get_node_name
+    if type(label) is not str or not label.strip() or 'localizedName' in option_item_json or \
+       'localizedNames' in option_item_json or 'name' in option_item_json:
+        label = get_node_name(option_item_json, lang_codes, language)
+    return label
+
+
+def _interval_bounds(input_def_list, input_def, inner_type_str):
+    """De ingebouwde nodes voor de onder- en bovengrens van een DV_INTERVAL."""
+    lower_input_def, upper_input_def = {}, {}
+    if isinstance(input_def_list, list):
+        for sub_input in input_def_list:
+            if sub_input.get("suffix") == "lower": lower_input_def = sub_input
+            elif sub_input.get("suffix") == "upper": upper_input_def = sub_input
+    if not lower_input_def and input_def: lower_input_def = input_def
+    if not upper_input_def and input_def: upper_input_def = input_def
+    return ({"rmType": inner_type_str, "inputs": [lower_input_def] if lower_input_def else []},
+            {"rmType": inner_type_str, "inputs": [upper_input_def] if upper_input_def else []})
+
+
+def _create_value_structure(node_json, lang_codes=DEFAULT_LANGUAGES, parent_semantic_path_for_options="",
+                            language=None):
+    """
+    Creëert de waarde-structuur voor een gegeven node, inclusief het doorgeven van semantische paden.
+
+    Args:
+        node_json (dict): De JSON-definitie van de huidige node.
+        lang_codes (tuple): Voorkeurstaalcodes.
+        parent_semantic_path_for_options (str): Het semantische pad van de bovenliggende node,
+                                                 gebruikt om paden voor geneste opties te vormen.
+        language (str | None): Taal waarvan de vertalingen voorgaan (zie `get_node_name`).
+    Returns:
+        dict: De geconstrueerde waarde-structuur.
+    """
+    if not isinstance(node_json, dict):
+        return {"_type": "DV_TEXT", "value": f"[Onbekend Type: {node_json.get('rmType','GEEN RM TYPE')}]"}
+
+    node_rm_type = _upper(node_json.get('rmType', ''))
+    input_def_list = node_json.get('inputs', [])
+    input_def = input_def_list[0] if isinstance(input_def_list, list) and input_def_list else {}
+
+    effective_data_type = node_rm_type if node_rm_type.startswith("DV_") else _upper(input_def.get('type', ''))
+
+    # ELEMENT zonder DV_-type met kinderen: een keuze tussen RM-types (of CLUSTERs)
+    if node_rm_type == 'ELEMENT' and not effective_data_type.startswith("DV_"):
+        node_children = node_json.get('children', [])
+        if node_children and all(isinstance(child, dict) for child in node_children):
+            choice_options_list = []
+            for option_json in node_children:
+                option_semantic_path = _join_path(parent_semantic_path_for_options, option_json.get('id'))
+                choice_options_list.append({
+                    "_type": option_json.get('rmType'),
+                    "name": {"value": get_node_name(option_json, lang_codes, language)},
+                    "archetype_node_id": option_json.get('nodeId') or option_json.get('id'),
+                    "aqlPath": _intern(option_json.get('aqlPath', '')),
+                    "semantic_path": option_semantic_path,
+                    "min": option_json.get('min'),
+                    "max": option_json.get('max'),
+                    "value": _create_value_structure(option_json, lang_codes, option_semantic_path, language),
+                    "is_leaf": True
+                })
+            return {"_type": "CHOICE", "original_rm_type": node_rm_type, "options": choice_options_list, "value": None}
+        # Geen DV_-type en geen opties: simpel tekstveld
+        effective_data_type = "DV_TEXT"
+
+    kind = _VALUE_KINDS.get(effective_data_type)
+    if kind == 'text':
+        return {"_type": "DV_TEXT", "value": ""}
+    if kind == 'coded_text':
+        # De voorgedefinieerde codes; commentaar hoort bij het DV_CODED_TEXT-element zelf
+        options_for_coded_text = []
+        for option_item_json in input_def.get('list', []):
+            if type(option_item_json) is not dict: continue
+            label = option_item_json.get('label')
+            # Snelle weg voor de gewone code (alleen label/value); de rest via _code_label
+            if language or type(label) is not str or not label.strip() or \
+               'localizedName' in option_item_json or 'localizedNames' in option_item_json or 'name' in option_item_json:
+                label = _code_label(option_item_json, lang_codes, language)
+            options_for_coded_text.append({"label": label, "value": option_item_json.get('value')})
+        return {
+            "_type": "DV_CODED_TEXT", "value": "",
+            "defining_code": {"code_string": "", "terminology_id": {"value": input_def.get('terminology', '')}},
+            "options": options_for_coded_text
+        }
+    if kind == 'boolean':
+        return {"_type": "DV_BOOLEAN", "value": None}
+    if kind == 'count':
+        return {"_type": "DV_COUNT", "magnitude": None}
+    if kind == 'quantity':
+        units = input_def.get('units', '')
+        validation = input_def.get('validation', {})
+        if not units and validation and isinstance(validation.get('range'), dict):
+            units = validation['range'].get('units', '')
+        return {"_type": "DV_QUANTITY", "magnitude": None, "units": units}
+    if kind == 'date_time':
+        return {"_type": "DV_DATE_TIME", "value": None}
+    if kind == 'date':
+        return {"_type": "DV_DATE", "value": None}
+    if kind == 'time':
+        return {"_type": "DV_TIME", "value": None}
+    if kind == 'identifier':
+        return {"_type": "DV_IDENTIFIER", "id_value": "", "type": "", "issuer": "", "assigner": ""}
+    if kind == 'uri':
+        return {"_type": "DV_URI", "value": ""}
+    if kind is None and effective_data_type.startswith("DV_INTERVAL"):
+        match = _INTERVAL_INNER_TYPE.search(effective_data_type)
+        inner_type_str = match.group(1) if match else "DV_TEXT"
+        lower_inner_node_json, upper_inner_node_json = _interval_bounds(input_def_list, input_def, inner_type_str)
+        return {
+            "_type": "DV_INTERVAL",
+            "lower": _create_value_structure(lower_inner_node_json, lang_codes,
+                                             _join_path(parent_semantic_path_for_options, "lower"), language),
+            "upper": _create_value_structure(upper_inner_node_json, lang_codes,
+                                             _join_path(parent_semantic_path_for_options, "upper"), language),
+            "lower_included": input_def.get("lower_included", True),
+            "upper_included": input_def.get("upper_included", True)
+        }
+    if kind == 'duration':
+        return {
+            "_type": "DV_DURATION", "months": None, "weeks": None, "days": None,
+            "hours": None, "minutes": None, "seconds": None
+        }
+    if kind == 'proportion':
+        prop_type = 0
+        if input_def.get("list") and isinstance(input_def["list"], list) and len(input_def["list"]) > 0:
+            try: prop_type = int(input_def["list"][0].get("value", 0))
+            except ValueError: pass
+        return {"_type": "DV_PROPORTION", "numerator": None, "denominator": None, "type": prop_type}
+
+    logger.warning(f"WARN: Onbehandeld effective_data_type '{effective_data_type}' voor node '{node_json.get('id', 'unknown id')}' (rmType: {node_rm_type}). Gebruik default structuur.")
+    return {"_type": "DV_TEXT", "value": f"[Onbekend Type: {node_json.get('rmType','GEEN RM TYPE')}]"}
+
+
+def _is_leaf_element(node_json, node_rm_type):
+    if node_rm_type.startswith('DV_'):
+        return node_rm_type != 'DV_INTERVAL'
+    if node_rm_type == 'ELEMENT':
+        # Een ELEMENT is een vraag, tenzij er containers (secties, clusters, ...) onder hangen
+        children_nodes = node_json.get('children', [])
+        return not children_nodes or not any(
+            _upper(child.get('rmType', '')) in CONTAINER_TYPES for child in children_nodes if isinstance(child, dict)
+        )
+    return False
+
+
+# Soorten frames op de stack
+_CONTAINER = 0
+_FALLBACK = 1
+
+
+class _Frame:
+    """Een node waarvan de kinderen nog verwerkt worden (vervangt een recursieve aanroep)."""
+    __slots__ = ('kind', 'node_json', 'children', 'index', 'results', 'parent_aql_path', 'number', 'level',
+                 'semantic_path', 'node_data', 'numbering_counter', 'child_level', 'child_number')
+
+    def __init__(self, kind, node_json, children, parent_aql_path, number, level, semantic_path, node_data=None):
+        self.kind = kind
+        self.node_json = node_json
+        self.children = children
+        self.index = 0
+        self.results = []
+        self.parent_aql_path = parent_aql_path
+        self.number = number
+        self.level = level
+        self.semantic_path = semantic_path
+        self.node_data = node_data # Alleen containers: de nog niet afgemaakte node
+        self.numbering_counter = 0
+        self.child_level = level + 1 if level != -1 else 0
+        self.child_number = ""
+
+
+class SubtreeMemo:
+    """
+    De containers van één transformatie: per semantisch pad de ruwe node, de context waarin
+    hij verwerkt is en het resultaat.
+
+    Geef bij de transformatie van een nieuwe versie de memo van de vorige mee (`previous`):
+    een container waarvan de ruwe deelboom (`==`) en de context gelijk zijn gebleven, wordt
+    dan overgenomen in plaats van opnieuw getransformeerd. Alleen gewijzigde deelbomen en
+    de containers erboven worden opnieuw opgebouwd.
+    """
+    __slots__ = ('entries', 'previous', 'reused', 'built', '_reused_paths')
+
+    def __init__(self, previous=None):
+        self.entries = {}
+        self.previous = previous.entries if previous is not None else {}
+        self.reused = 0
+        self.built = 0
+        self._reused_paths = set()
+
+    def lookup(self, frame, language):
+        entry = self.previous.get(frame.semantic_path)
+        if entry is None:
+            return None
+        node_json, context, result = entry
+        if context != (frame.parent_aql_path, frame.number, frame.level, language) or node_json != frame.node_json:
+            return None
+        self.reused += 1
+        self.entries[frame.semantic_path] = entry
+        self._reused_paths.add(frame.semantic_path)
+        return result
+
+    def record(self, frame, language, result):
+        self.built += 1
+        if frame.semantic_path in self.entries:
+            # Twee containers op hetzelfde pad (zonder eigen id): geen van beide hergebruiken
+            self.entries[frame.semantic_path] = None
+        else:
+            self.entries[frame.semantic_path] = (frame.node_json, (frame.parent_aql_path, frame.number, frame.level,
+                                                                   language), result)
+
+    def release(self):
+        """
+        Na de transformatie: neemt de containers binnen overgenomen deelbomen over (die zijn
+        niet opnieuw doorlopen) en vergeet de vorige versie, zodat die opgeruimd kan worden.
+        """
+        if self._reused_paths:
+            for path, entry in self.previous.items():
+                if path in self.entries:
+                    continue
+                prefix = path
+                while '/' in prefix:
+                    prefix = prefix.rsplit('/', 1)[0]
+                    if prefix in self._reused_paths:
+                        self.entries[path] = entry
+                        break
+        self.previous = {}
+        self._reused_paths = set()
+
+
+def _fallback_frame(node_json, parent_aql_path, number, level, semantic_path):
+    # Andere typen nodes met kinderen: de kinderen komen op het niveau van de node zelf
+    children = node_json.get('children')
+    if isinstance(children, list):
+        return _Frame(_FALLBACK, node_json, children, parent_aql_path, number, level, semantic_path)
+    return None
+
+
+def _enter_node(node_json, lang_codes, parent_aql_path, number, level, parent_semantic_path, language=None):
+    """
+    Verwerkt een node voor zover dat zonder de kinderen kan.
+
+    Returns:
+        tuple: (resultaat, frame). Is frame niet None, dan moeten eerst de kinderen verwerkt
+               worden en volgt het resultaat uit `_finish_frame`.
+    """
+    if not isinstance(node_json, dict): return None, None
+
+    get = node_json.get # Per node een tiental lookups: de gebonden methode scheelt merkbaar
+    node_rm_type = _upper(get('rmType', ''))
+    aql_path = get('aqlPath', '')
+    if type(aql_path) is str:
+        aql_path = sys.intern(aql_path)
+    original_id_from_json = get('id')
+    full_semantic_path = _join_path(parent_semantic_path, original_id_from_json)
+
+    if get('inContext') is True:
+        relative_aql_path = aql_path.replace(parent_aql_path, '', 1).lstrip('/') if parent_aql_path else aql_path.lstrip('/')
+        if relative_aql_path in STRUCTURAL_METADATA_NAMES:
+            return None, None
+
+    node_name = get('localizedName')
+    if language or type(node_name) is not str or not node_name.strip():
+        node_name = get_node_name(node_json, lang_codes, language)
+    display_id = get('nodeId') or original_id_from_json or 'uid_' + str(hash(aql_path))[-6:]
+
+    if _is_leaf_element(node_json, node_rm_type) and (aql_path or full_semantic_path):
+        leaf_data = {
+            "_type": node_rm_type,
+            "name": {"value": node_name},
+            "archetype_node_id": display_id,
+            "original_json_id": original_id_from_json,
+            "aqlPath": aql_path,
+            "element_path_for_comments": aql_path,
+            "semantic_path": full_semantic_path,
+            "min": get('min'),
+            "max": get('max'),
+            "value": _create_value_structure(node_json, lang_codes, full_semantic_path, language),
+            "is_leaf": True
+        }
+        if level >= 0:
+            leaf_data['level'] = level
+        return leaf_data, None
+
+    if node_rm_type in CONTAINER_TYPES:
+        node_data = {
+            "_type": node_rm_type,
+            "name": {"value": node_name},
+            "archetype_node_id": display_id,
+            "original_json_id": original_id_from_json,
+            "min": get('min'),
+            "max": get('max'),
+            "aqlPath": aql_path,
+            "semantic_path": full_semantic_path,
+            "children": None,
+            "is_leaf": False
+        }
+        children = get('children', [])
+        return None, _Frame(_CONTAINER, node_json, children if isinstance(children, list) else [],
+                            parent_aql_path, number, level, full_semantic_path, node_data)
+
+    return None, _fallback_frame(node_json, parent_aql_path, number, level, full_semantic_path)
+
+
+def _finish_frame(frame):
+    """Resultaat van een frame waarvan alle kinderen verwerkt zijn: (resultaat, vervolg-frame)."""
+    if frame.kind == _CONTAINER:
+        node_data = frame.node_data
+        if node_data["aqlPath"] or frame.semantic_path: # Containers moeten een of ander pad hebben
+            node_data["children"] = frame.results
+            if frame.level != -1:
+                node_data['level'] = frame.level
+            if frame.number:
+                node_data['section_number'] = frame.number
+            return node_data, None
+        if frame.results: # Anonieme root-achtige container zonder eigen pad
+            return frame.results, None
+        # Zonder pad en zonder resultaat: de kinderen nog eens als gewone (fallback) node verwerken
+        return None, _fallback_frame(frame.node_json, frame.parent_aql_path, frame.number, frame.level,
+                                     frame.semantic_path)
+    return (frame.results or None), None
+
+
+def _accept_child_result(frame, processed_child):
+    if not processed_child:
+        return
+    if frame.kind == _CONTAINER:
+        child_level = frame.child_level
+        if isinstance(processed_child, list):
+            for sub_child in processed_child:
+                if isinstance(sub_child, dict) and 'level' not in sub_child:
+                    sub_child['level'] = child_level
+                frame.results.append(sub_child)
+        elif isinstance(processed_child, dict):
+            if 'level' not in processed_child: processed_child['level'] = child_level
+            if frame.child_number and 'section_number' not in processed_child and \
+               processed_child.get('_type') in CONTAINER_TYPES:
+                processed_child['section_number'] = frame.child_number
+            frame.results.append(processed_child)
+    elif isinstance(processed_child, list):
+        frame.results.extend(p for p in processed_child if p)
+    else:
+        frame.results.append(processed_child)
+
+
+def process_node_for_ui(node_json, lang_codes=DEFAULT_LANGUAGES, parent_aql_path="",
+                        current_node_number_str="", current_node_level=-1, parent_semantic_path="", language=None,
+                        memo=None):
+    """
+    Zet één node (en alles eronder) om naar de UI-structuur.
+
+    Met `memo` (een `SubtreeMemo`) worden ongewijzigde containers uit de vorige versie
+    overgenomen en de nieuwe vastgelegd.
+
+    Returns:
+        dict | list | None: Een vraag of container, een lijst nodes (voor nodes zonder eigen
+                            plek in de boom), of None als er niets te tonen is.
+    """
+    result, frame = _enter_node(node_json, lang_codes, parent_aql_path, current_node_number_str,
+                                current_node_level, parent_semantic_path, language)
+    if frame is None:
+        return result
+    if memo is not None and frame.kind == _CONTAINER:
+        reused = memo.lookup(frame, language)
+        if reused is not None:
+            return reused
+    stack = [frame]
+    while True:
+        frame = stack[-1]
+        children = frame.children
+        if frame.index < len(children):
+            child_json = children[frame.index]
+            frame.index += 1
+            if frame.kind == _CONTAINER:
+                if not isinstance(child_json, dict): continue
+                frame.child_number = ""
+                if frame.number and _upper(child_json.get('rmType', '')) in CONTAINER_TYPES:
+                    frame.numbering_counter += 1
+                    frame.child_number = f"{frame.number}.{frame.numbering_counter}"
+                result, child_frame = _enter_node(child_json, lang_codes, frame.node_data["aqlPath"],
+                                                  frame.child_number, frame.child_level, frame.semantic_path,
+                                                  language)
+            else:
+                # Nummering niet voortzetten, level niet verhogen
+                result, child_frame = _enter_node(child_json, lang_codes, frame.parent_aql_path,
+                                                  frame.number, frame.level, frame.semantic_path, language)
+            if child_frame is not None and memo is not None and child_frame.kind == _CONTAINER:
+                result = memo.lookup(child_frame, language)
+                if result is not None:
+                    child_frame = None
+            if child_frame is not None:
+                stack.append(child_frame)
+            else:
+                _accept_child_result(frame, result)
+            continue
+
+        stack.pop()
+        result, next_frame = _finish_frame(frame)
+        if memo is not None and frame.kind == _CONTAINER and isinstance(result, dict):
+            memo.record(frame, language, result)
+        if next_frame is not None:
+            stack.append(next_frame)
+        elif not stack:
+            return result
+        else:
+            _accept_child_result(stack[-1], result)
+
+
+def _preferred_languages(web_template_data, language=None):
+    """Volgorde waarin vertalingen gezocht worden: `language`, dan nl, de standaardtaal en de rest."""
+    default_lang = web_template_data.get('defaultLanguage', 'nl')
+    available_langs = web_template_data.get('languages') or DEFAULT_LANGUAGES
+    pref_langs = []
+    if language: pref_langs.append(language)
+    if 'nl' in available_langs and 'nl' not in pref_langs: pref_langs.append('nl')
+    if default_lang not in pref_langs and default_lang in available_langs: pref_langs.append(default_lang)
+    for lang in available_langs:
+        if lang not in pref_langs: pref_langs.append(lang)
+    return tuple(pref_langs) or DEFAULT_LANGUAGES
+
+
+def available_languages(web_template_data):
+    """De talen van een template (`languages`), met de standaardtaal vooraan."""
+    if not isinstance(web_template_data, dict):
+        return []
+    languages = [lang for lang in web_template_data.get('languages') or [] if isinstance(lang, str)]
+    default_lang = web_template_data.get('defaultLanguage')
+    if default_lang in languages:
+        languages.remove(default_lang)
+        languages.insert(0, default_lang)
+    return languages
+
+
+def _main_section_name(node_json, lang_codes, language=None):
+    hoofdstuk_naam = get_node_name(node_json, lang_codes, language)
+    if _upper(node_json.get('rmType', '')) == 'EVENT_CONTEXT' and hoofdstuk_naam in ["Event Context", "Naamloos Veld", "context"]:
+        hoofdstuk_naam = "Context"
+    return hoofdstuk_naam
+
+
+def is_main_section(node_json):
+    """Of een top-level node van de compositie een genummerde hoofdsectie wordt (SECTION of de context)."""
+    rm_type = _upper(node_json.get('rmType', ''))
+    return rm_type in ORIGINAL_SECTION_TYPES or (rm_type == 'EVENT_CONTEXT' and node_json.get('id') == 'context')
+
+
+def composition_root_path(web_template_data):
+    """
+    Eerste segment van alle semantische paden van een web template: het `id` van de compositie,
+    of het `templateId` als dat ontbreekt. None zonder geldige `tree`.
+    """
+    if not web_template_data or not isinstance(web_template_data.get('tree'), dict):
+        return None
+    return _intern(web_template_data['tree'].get('id', web_template_data.get('templateId', 'default_template')))
+
+
+def transform_web_template_to_questionnaire(web_template_data, language=None, memo=None):
+    """
+    Zet een web template om naar de vragenlijst die de UI en de exports gebruiken.
+
+    Semantische paden beginnen met het `id` van de compositie (de root van `tree`), of met
+    het `templateId` als die ontbreekt; daaronder volgt per node het eigen `id`.
+
+    Args:
+        web_template_data (dict): De ruwe web template.
+        language (str | None): Taal van de namen en labels; zonder taal `localizedName` (de
+            standaardtaal van de template). Zie ook `localize_questionnaire`.
+        memo (SubtreeMemo | None): Legt de containers vast en neemt ongewijzigde containers
+            over uit de vorige versie (`SubtreeMemo(previous=...)`).
+    Returns:
+        dict: COMPOSITION met `content`: hoofdsecties (genummerd) en overige top-level nodes.
+    """
+    if not web_template_data or not isinstance(web_template_data.get('tree'), dict):
+        return {"_type": "COMPOSITION", "name": {"value": "Fout: Template 'tree' ongeldig"}, "version": "", "content": []}
+    with _gc_paused():
+        return _transform(web_template_data, language, memo)
+
+
+def _transform(web_template_data, language, memo):
+    pref_langs = _preferred_languages(web_template_data, language)
+    root_tree = web_template_data['tree']
+    composition_name = get_node_name(root_tree, pref_langs, language)
+    composition_version = web_template_data.get('version', web_template_data.get('semVer', ''))
+    composition_archetype_id = root_tree.get('nodeId', root_tree.get('id', 'root_id_onbekend'))
+    composition_semantic_path = composition_root_path(web_template_data)
+
+    content_list_for_flask = []
+    top_level_section_counter = 0
+    if isinstance(root_tree.get('children'), list):
+        for idx, top_level_json_node in enumerate(root_tree['children']): # SECTIONS, EVALUATIONS etc.
+            if not isinstance(top_level_json_node, dict): continue
+
+            top_level_rm_type = _upper(top_level_json_node.get('rmType', ''))
+            if not is_main_section(top_level_json_node):
+                initial_level_for_other_types = 0 if top_level_rm_type in NUMBERABLE_CONTAINER_TYPES else -1
+                processed_node = process_node_for_ui(
+                    top_level_json_node, pref_langs, parent_aql_path=root_tree.get('aqlPath', ''),
+                    current_node_number_str="", current_node_level=initial_level_for_other_types,
+                    parent_semantic_path=composition_semantic_path, language=language, memo=memo
+                )
+                if isinstance(processed_node, dict):
+                    if 'level' not in processed_node and initial_level_for_other_types != -1:
+                        processed_node['level'] = initial_level_for_other_types
+                    content_list_for_flask.append(processed_node)
+                elif processed_node:
+                    content_list_for_flask.extend(p for p in processed_node if p)
+                continue
+
+            top_level_section_counter += 1
+            current_section_number_str = str(top_level_section_counter)
+            hoofdstuk_naam = _main_section_name(top_level_json_node, pref_langs, language)
+            top_level_aql_path = _intern(top_level_json_node.get('aqlPath'))
+            if not top_level_aql_path:
+                node_id_for_aql = top_level_json_node.get('nodeId') or top_level_json_node.get('id', f'generated_section_id_{idx}')
+                top_level_aql_path = f"/content[openEHR-EHR-SECTION.adhoc.v1 and name/value='{node_id_for_aql}']"
+                logger.warning(f"WARN: Hoofdsectie '{hoofdstuk_naam}' heeft geen aqlPath. Fallback: {top_level_aql_path}")
+            section_semantic_path = _join_path(composition_semantic_path, top_level_json_node.get('id'))
+
+            processed_children_list = []
+            if isinstance(top_level_json_node.get('children'), list):
+                child_numbering_counter = 0
+                for child_json in top_level_json_node['children']:
+                    if not isinstance(child_json, dict): continue
+                    child_full_number_str = ""
+                    if _upper(child_json.get('rmType', '')) in CONTAINER_TYPES:
+                        child_numbering_counter += 1
+                        child_full_number_str = f"{current_section_number_str}.{child_numbering_counter}"
+                    processed_child = process_node_for_ui(
+                        child_json, pref_langs, parent_aql_path=top_level_aql_path,
+                        current_node_number_str=child_full_number_str, current_node_level=1,
+                        parent_semantic_path=section_semantic_path, language=language, memo=memo
+                    )
+                    if isinstance(processed_child, list):
+                        processed_children_list.extend(p for p in processed_child if p)
+                    elif processed_child:
+                        processed_children_list.append(processed_child)
+
+            content_list_for_flask.append({
+                "_type": top_level_rm_type, "name": {"value": hoofdstuk_naam},
+                "archetype_node_id": top_level_json_node.get('nodeId') or top_level_json_node.get('id'),
+                "aqlPath": top_level_aql_path,
+                "semantic_path": section_semantic_path,
+                "min": top_level_json_node.get('min'),
+                "max": top_level_json_node.get('max'), "children": processed_children_list,
+                "is_leaf": False, "level": 0,
+                "section_number": current_section_number_str
+            })
+
+    if memo is not None:
+        memo.release()
+    return {
+        "_type": "COMPOSITION", "name": {"value": composition_name},
+        "version": composition_version, "archetype_node_id": composition_archetype_id,
+        "semantic_path": composition_semantic_path,
+        "content": content_list_for_flask
+    }
+
+
+def split_sections(web_template_data, questionnaire):
+    """
+    Verdeelt de web template per hoofdsectie, zodat de browser één sectie tegelijk kan laden.
+
+    Elke sectie krijgt een eigen web template: dezelfde metadata en root, met als enige
+    kinderen van `tree` de node van die sectie. Paden in het formulier blijven daardoor gelijk
+    aan die in de volledige template. Top-level nodes die geen hoofdsectie zijn (category,
+    composer, ...) komen samen in een laatste sectie 'Overig'.
+
+    Args:
+        web_template_data (dict): De ruwe web template.
+        questionnaire (dict): De vragenlijst van dezelfde versie (voor nummers, namen en vragen).
+    Returns:
+        list[dict]: Per sectie `number`, `name`, `semantic_path`, `questions` (aantal
+        vragen met een eigen commentaarpad) en `web_template`.
+    """
+    root_tree = (web_template_data or {}).get('tree')
+    if not isinstance(root_tree, dict) or not isinstance(root_tree.get('children'), list):
+        return []
+    numbered = [item for item in questionnaire.get('content', []) if item.get('section_number')]
+    others = [item for item in questionnaire.get('content', []) if not item.get('section_number')]
+
+    def section(nodes, number, name, semantic_path, items):
+        questions = {row['comment_path'] for row in flatten_leaf_nodes(items, {}).values()}
+        return {
+            "number": number, "name": name, "semantic_path": semantic_path, "questions": len(questions),
+            "web_template": {**web_template_data, "tree": {**root_tree, "children": nodes}}
+        }
+
+    sections = []
+    other_nodes = []
+    for node_json in root_tree['children']:
+        if not isinstance(node_json, dict):
+            continue
+        if is_main_section(node_json) and len(sections) < len(numbered):
+            item = numbered[len(sections)]
+            sections.append(section([node_json], item['section_number'], item['name']['value'],
+                                    item.get('semantic_path'), [item]))
+        else:
+            other_nodes.append(node_json)
+    if other_nodes:
+        other_section = section(other_nodes, None, "Overig", None, others)
+        if other_section['questions']: # Alleen structurele velden (taal, auteur): niets te reviewen
+            sections.append(other_section)
+    return sections
+
+
+def _raw_nodes(root_tree, root_path):
+    """Nodes van de ruwe boom op AQL-pad en op semantisch pad (de eerste in documentvolgorde)."""
+    by_aql_path, by_semantic_path = {}, {}
+    stack = [(root_tree, root_path)]
+    while stack:
+        node_json, semantic_path = stack.pop()
+        aql_path = node_json.get('aqlPath')
+        if aql_path and aql_path not in by_aql_path:
+            by_aql_path[aql_path] = node_json
+        if semantic_path and semantic_path not in by_semantic_path:
+            by_semantic_path[semantic_path] = node_json
+        children = node_json.get('children')
+        if isinstance(children, list):
+            stack.extend((child_json, _join_path(semantic_path, child_json.get('id')))
+                         for child_json in reversed(children) if isinstance(child_json, dict))
+    return by_aql_path, by_semantic_path
+
+
+def _localized_value(value, node_json, lang_codes, language):
+    """De waarde-structuur met labels in `language`; ongewijzigde delen zijn dezelfde objecten."""
+    if not isinstance(value, dict) or not isinstance(node_json, dict):
+        return value
+    value_type = value.get('_type')
+    if value_type == 'CHOICE':
+        options = value.get('options') or []
+        localized = [_localized_question(option, option_json, lang_codes, language)
+                     for option, option_json in zip(options, node_json.get('children') or [])]
+        if all(new is old for new, old in zip(localized, options)):
+            return value
+        return {**value, 'options': localized + options[len(localized):]}
+    input_def_list = node_json.get('inputs', [])
+    input_def = input_def_list[0] if isinstance(input_def_list, list) and input_def_list else {}
+    if value_type == 'DV_CODED_TEXT':
+        options = value.get('options') or []
+        items = [item for item in input_def.get('list', []) if isinstance(item, dict)]
+        localized = []
+        for option, item in zip(options, items):
+            label = _code_label(item, lang_codes, language)
+            localized.append(option if label == option.get('label') else {**option, 'label': label})
+        if all(new is old for new, old in zip(localized, options)):
+            return value
+        return {**value, 'options': localized + options[len(localized):]}
+    if value_type == 'DV_INTERVAL':
+        node_rm_type = _upper(node_json.get('rmType', ''))
+        match = _INTERVAL_INNER_TYPE.search(node_rm_type if node_rm_type.startswith("DV_") else _upper(input_def.get('type', '')))
+        lower_json, upper_json = _interval_bounds(input_def_list, input_def, match.group(1) if match else "DV_TEXT")
+        lower = _localized_value(value.get('lower'), lower_json, lang_codes, language)
+        upper = _localized_value(value.get('upper'), upper_json, lang_codes, language)
+        if lower is value.get('lower') and upper is value.get('upper'):
+            return value
+        return {**value, 'lower': lower, 'upper': upper}
+    return value
+
+
+def _localized_question(node, node_json, lang_codes, language):
+    """Een vraag (of keuze-optie) met naam en labels in `language`, of `node` zelf als er niets verandert."""
+    if not isinstance(node, dict) or not isinstance(node_json, dict):
+        return node
+    name = node.get('name') or {}
+    new_name = get_node_name(node_json, lang_codes, language)
+    value = _localized_value(node.get('value'), node_json, lang_codes, language)
+    if new_name == name.get('value') and value is node.get('value'):
+        return node
+    return {**node, 'name': name if new_name == name.get('value') else {"value": new_name}, 'value': value}
+
+
+def localize_questionnaire(web_template_data, questionnaire, language):
+    """
+    De vragenlijst van `transform_web_template_to_questionnaire(web_template_data, language)`,
+    afgeleid van de vragenlijst in de standaardtaal in plaats van opnieuw getransformeerd.
+
+    Alleen namen en labels hangen van de taal af. Vragen waarvan niets vertaald is, en alle
+    paden, types en waarde-structuren zonder labels, zijn dezelfde objecten als in
+    `questionnaire`; alleen containers (voor hun eigen lijst kinderen) en vertaalde vragen
+    worden gekopieerd.
+    """
+    if not web_template_data or not isinstance(web_template_data.get('tree'), dict) or not language:
+        return questionnaire
+    pref_langs = _preferred_languages(web_template_data, language)
+    root_tree = web_template_data['tree']
+    by_aql_path, by_semantic_path = _raw_nodes(root_tree, questionnaire.get('semantic_path'))
+
+    def node_json_for(node):
+        return by_aql_path.get(node.get('aqlPath')) or by_semantic_path.get(node.get('semantic_path'))
+
+    content = []
+    stack = [(questionnaire.get('content', []), content, True)]
+    while stack:
+        items, target, top_level = stack.pop()
+        for item in items:
+            if not isinstance(item, dict) or item.get('is_leaf') or not isinstance(item.get('children'), list):
+                target.append(_localized_question(item, node_json_for(item) if isinstance(item, dict) else None,
+                                                  pref_langs, language))
+                continue
+            node_json = node_json_for(item)
+            name = item.get('name') or {}
+            if node_json is not None:
+                new_name = _main_section_name(node_json, pref_langs, language) if top_level and item.get('section_number') \
+                    else get_node_name(node_json, pref_langs, language)
+                if new_name != name.get('value'):
+                    name = {"value": new_name}
+            localized_item = {**item, 'name': name, 'children': []}
+            target.append(localized_item)
+            stack.append((item['children'], localized_item['children'], False))
+
+    name = questionnaire.get('name') or {}
+    composition_name = get_node_name(root_tree, pref_langs, language)
+    return {**questionnaire, 'name': name if composition_name == name.get('value') else {"value": composition_name},
+            'content': content}
+
+
+def _localized_input(input_json, language):
+    items = input_json.get('list') if isinstance(input_json, dict) else None
+    if not isinstance(items, list):
+        return input_json
+    localized_items = []
+    for item in items:
+        label = (item.get('localizedLabels') or {}).get(language) if isinstance(item, dict) else None
+        localized_items.append({**item, 'label': label} if isinstance(label, str) and label.strip() else item)
+    if all(new is old for new, old in zip(localized_items, items)):
+        return input_json
+    return {**input_json, 'list': localized_items}
+
+
+def localize_web_template(web_template_data, language):
+    """
+    Kopie van een web template voor de browser waarin `localizedName` en de labels van de codes
+    in `language` staan (waar een vertaling is), en `defaultLanguage` die taal is.
+
+    Nodes worden ondiep gekopieerd; alles wat niet vertaald wordt (annotaties, validatie,
+    beschrijvingen) delen de kopie en het origineel.
+    """
+    root_tree = (web_template_data or {}).get('tree')
+    if not isinstance(root_tree, dict) or not language:
+        return web_template_data
+
+    def localized_node(node_json):
+        node = dict(node_json)
+        name = (node_json.get('localizedNames') or {}).get(language)
+        if isinstance(name, str) and name.strip():
+            node['localizedName'] = name
+        inputs = node_json.get('inputs')
+        if isinstance(inputs, list):
+            node['inputs'] = [_localized_input(input_json, language) for input_json in inputs]
+        return node
+
+    tree = localized_node(root_tree)
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        children = node.get('children')
+        if isinstance(children, list):
+            node['children'] = [localized_node(child) if isinstance(child, dict) else child for child in children]
+            stack.extend(child for child in node['children'] if isinstance(child, dict))
+    return {**web_template_data, "defaultLanguage": language, "tree": tree}
+
+
+def localize_sections(sections, questionnaire):
+    """
+    De secties van `split_sections` met de namen uit `questionnaire` (een andere taal).
+
+    `web_template` blijft die van de standaardtaal; zie `localize_web_template`.
+    """
+    names = iter([item['name']['value'] for item in questionnaire.get('content', []) if item.get('section_number')])
+    return [{**section, "name": next(names, section['name'])} if section['number'] else section
+            for section in sections]
+
+
+def _choice_option_rows(node, element_name, element_node_id_for_csv, current_node_semantic_path, options):
+    """Rijen voor de leaf map van een keuze-element: één per optie, met het pad van de optie als dat er is."""
+    for i, opt in enumerate(options):
+        if not isinstance(opt, dict): continue
+        comment_path_for_option_row = opt.get('semantic_path') or current_node_semantic_path
+        # Naamgeving voor CSV: elementnaam, voor latere opties aangevuld met optie-ID of -type
+        option_value_id_for_name = opt.get('archetype_node_id', '')
+        if i == 0:
+            csv_name_for_option = element_name
+        elif option_value_id_for_name and option_value_id_for_name.lower() != 'value':
+            csv_name_for_option = f"{element_name} ({option_value_id_for_name})"
+        else:
+            csv_name_for_option = f"{element_name} (als {opt.get('value',{}).get('_type',f'Optie{i+1}')})"
+        dict_key_for_map = comment_path_for_option_row or \
+            f"{current_node_semantic_path or node.get('aqlPath')}#CHOICE_OPT_{i}_{option_value_id_for_name or i}"
+        yield dict_key_for_map, {
+            'csv_name': csv_name_for_option,
+            'csv_node_id': element_node_id_for_csv, # Node ID van het parent element
+            'comment_path': comment_path_for_option_row
+        }
+
+
+def flatten_leaf_nodes(node, leaf_nodes_dict):
+    """
+    Vult `leaf_nodes_dict` met alle vragen onder `node` (dict of lijst), in documentvolgorde.
+
+    De sleutel is het semantische pad van de vraag (of van de keuze-optie); de waarde bevat
+    `csv_name`, `csv_node_id` en `comment_path`.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        current_node_semantic_path = node.get('semantic_path')
+        is_leaf = node.get('is_leaf')
+
+        if is_leaf and current_node_semantic_path:
+            element_name = node.get('name', {}).get('value', 'Naamloos')
+            element_node_id_for_csv = node.get('archetype_node_id', 'Geen ID')
+            value = node.get('value')
+            options = value.get('options', []) if value and isinstance(value, dict) and value.get('_type') == 'CHOICE' else None
+            if options:
+                for dict_key_for_map, row in _choice_option_rows(node, element_name, element_node_id_for_csv,
+                                                                 current_node_semantic_path, options):
+                    leaf_nodes_dict[dict_key_for_map] = row
+            else: # Regulier blad-element, of een keuze zonder opties
+                leaf_nodes_dict[current_node_semantic_path] = {
+                    'csv_name': element_name,
+                    'csv_node_id': element_node_id_for_csv,
+                    'comment_path': current_node_semantic_path
+                }
+
+        children = node.get('children')
+        if not is_leaf and isinstance(children, list):
+            stack.extend(reversed(children))
+    return leaf_nodes_dict
+
+
+def build_path_index(web_template_data, questionnaire):
+    """
+    Bouwt de gegevens voor een `PathIndex`: alle nodes per semantisch pad en AQL-pad → semantisch pad.
+
+    Alle nodes met een `id` uit de ruwe template worden opgenomen (ook contextvelden die de
+    vragenlijst overslaat, zodat elk pad van het formulier bekend is). Vanuit de vragenlijst
+    komen daar de weergavenaam, het sectienummer, het niveau en `is_leaf` bij, plus eventuele
+    paden die alleen daar bestaan.
+
+    Returns:
+        tuple[dict, dict]: (nodes, aql_to_semantic). `nodes` is gesorteerd in documentvolgorde.
+    """
+    nodes = {}
+    aql_to_semantic = {}
+    if not web_template_data or not isinstance(web_template_data.get('tree'), dict):
+        return nodes, aql_to_semantic
+    pref_langs = _preferred_languages(web_template_data)
+    root_tree = web_template_data['tree']
+    root_path = _intern(root_tree.get('id', web_template_data.get('templateId', 'default_template')))
+
+    # Ruwe boom, iteratief en in documentvolgorde: (node, eigen pad, pad van de ouder-node)
+    stack = [(root_tree, root_path, None)]
+    while stack:
+        node_json, semantic_path, parent_path = stack.pop()
+        aql_path = _intern(node_json.get('aqlPath', ''))
+        if semantic_path and semantic_path not in nodes:
+            nodes[semantic_path] = {
+                'name': get_node_name(node_json, pref_langs),
+                'rm_type': _upper(node_json.get('rmType', '')),
+                'aql_path': aql_path,
+                'archetype_node_id': node_json.get('nodeId') or node_json.get('id'),
+                'parent': parent_path,
+                'min': node_json.get('min'),
+                'max': node_json.get('max'),
+                'section_number': None,
+                'level': None,
+                'is_leaf': False,
+                'in_questionnaire': False,
+            }
+        if aql_path and aql_path not in aql_to_semantic:
+            aql_to_semantic[aql_path] = semantic_path
+        children = node_json.get('children')
+        if isinstance(children, list):
+            for child_json in reversed(children):
+                if isinstance(child_json, dict):
+                    child_path = _join_path(semantic_path, child_json.get('id'))
+                    # Een node zonder id deelt het pad van zijn ouder; zijn kinderen hangen onder dezelfde ouder
+                    stack.append((child_json, child_path, semantic_path if child_path != semantic_path else parent_path))
+
+    # Vragenlijst: weergave-eigenschappen, plus paden die alleen daar bestaan
+    stack = [(questionnaire.get('content', []), root_path)]
+    while stack:
+        node, parent_path = stack.pop()
+        if isinstance(node, list):
+            stack.extend((item, parent_path) for item in reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        semantic_path = node.get('semantic_path')
+        entry = nodes.get(semantic_path) if semantic_path else None
+        if semantic_path and entry is None:
+            entry = nodes[semantic_path] = {
+                'name': (node.get('name') or {}).get('value'),
+                'rm_type': node.get('_type'),
+                'aql_path': node.get('aqlPath', ''),
+                'archetype_node_id': node.get('archetype_node_id'),
+                'parent': parent_path,
+                'min': node.get('min'),
+                'max': node.get('max'),
+                'section_number': None,
+                'level': None,
+                'is_leaf': False,
+                'in_questionnaire': False,
+            }
+        if entry is not None and not entry['in_questionnaire']:
+            entry['name'] = (node.get('name') or {}).get('value', entry['name'])
+            entry['section_number'] = node.get('section_number')
+            entry['level'] = node.get('level')
+            entry['is_leaf'] = bool(node.get('is_leaf'))
+            entry['in_questionnaire'] = True
+        child_parent = semantic_path or parent_path
+        value = node.get('value')
+        if isinstance(value, dict) and value.get('_type') == 'CHOICE':
+            stack.extend((option, child_parent) for option in reversed(value.get('options') or []))
+        children = node.get('children')
+        if isinstance(children, list):
+            stack.extend((child, child_parent) for child in reversed(children))
+    return nodes, aql_to_semantic
@@ -0,0 +1,147 @@
+"""
+Structurele vergelijking van twee versies van een web template, node voor node.
+
+Nodes worden gekoppeld op identiteit, niet alleen op semantisch pad. Per node van de nieuwe
+versie (in documentvolgorde, dus de ouder altijd eerst) is de oude tegenhanger de eerste
+ongekoppelde van:
+
+1. het kind met hetzelfde `id` onder de tegenhanger van de ouder;
+2. de node met hetzelfde `aqlPath`;
+3. de node met hetzelfde semantische pad;
+4. het enige kind met dezelfde `nodeId` en hetzelfde rmType onder de tegenhanger van de
+   ouder (een nieuw `id`, bv. na het hernoemen van een element in de template-editor);
+5. de enige node in de hele template met dezelfde archetype-`nodeId` (`openEHR-...`) en
+   hetzelfde rmType (een archetype dat naar een andere sectie is verplaatst).
+
+Wat overblijft is toegevoegd of verwijderd. Een gekoppelde node met een ander semantisch pad
+is verplaatst (andere ouder), hernoemd (ander `id`, zelfde ouder), of volgt alleen een
+verplaatste of hernoemde voorouder. `path_map` bevat voor al deze nodes oud → nieuw pad: de
+migratie voor commentaren (zie `app.comment_migration`).
+"""
+from collections import defaultdict
+
+from app.template_compiler import build_path_index
+
+
+def _own_id(path, parent_path):
+    return path[len(parent_path) + 1:] if parent_path else path
+
+
+def _is_archetype_id(node_id):
+    return isinstance(node_id, str) and node_id.startswith('openEHR-')
+
+
+def _subtree_sizes(nodes):
+    """Aantal nodes per deelboom (de node zelf meegeteld), uit de `parent`-verwijzingen."""
+    sizes = dict.fromkeys(nodes, 1)
+    for path in reversed(list(nodes)):
+        parent = nodes[path]['parent']
+        if parent in sizes and parent != path:
+            sizes[parent] += sizes[path]
+    return sizes
+
+
+def _version(web_template_data):
+    return web_template_data.get('version', web_template_data.get('semVer', '')) if web_template_data else ''
+
+
+def match_nodes(old_nodes, old_aql_to_semantic, new_nodes):
+    """
+    Koppelt de nodes van twee `build_path_index`-resultaten (zie de moduledocumentatie).
+
+    Returns:
+        dict: Nieuw semantisch pad → oud semantisch pad, voor alle gekoppelde nodes.
+    """
+    match = {}
+    matched_old = set()
+    old_children = defaultdict(list)
+    old_by_archetype = defaultdict(list)
+    for path, node in old_nodes.items():
+        old_children[node['parent']].append(path)
+        if _is_archetype_id(node['archetype_node_id']):
+            old_by_archetype[(node['archetype_node_id'], node['rm_type'])].append(path)
+
+    def unique(candidates, node):
+        candidates = [path for path in candidates if path not in matched_old and
+                      old_nodes[path]['archetype_node_id'] == node['archetype_node_id'] and
+                      old_nodes[path]['rm_type'] == node['rm_type']]
+        return candidates[0] if len(candidates) == 1 else None
+
+    for path, node in new_nodes.items():
+        parent = node['parent']
+        if parent is None:
+            # De root (de compositie) is altijd dezelfde, ook met een ander id
+            old_root = next((old_path for old_path, old_node in old_nodes.items() if old_node['parent'] is None), None)
+            candidates = [old_root]
+        else:
+            old_parent = match.get(parent)
+            candidates = []
+            if old_parent is not None:
+                candidates.append(f"{old_parent}/{_own_id(path, parent)}")
+            candidates.append(old_aql_to_semantic.get(node['aql_path']) if node['aql_path'] else None)
+            candidates.append(path)
+            if old_parent is not None:
+                candidates.append(unique(old_children.get(old_parent, ()), node))
+            if _is_archetype_id(node['archetype_node_id']):
+                candidates.append(unique(old_by_archetype.get((node['archetype_node_id'], node['rm_type']), ()), node))
+        for candidate in candidates:
+            if candidate is not None and candidate in old_nodes and candidate not in matched_old:
+                match[path] = candidate
+                matched_old.add(candidate)
+                break
+    return match
+
+
+def diff_web_templates(old_web_template, new_web_template):
+    """
+    Verschillen tussen twee versies van een web template.
+
+    Returns:
+        dict: `added` en `removed` (alleen de bovenste node van elke toegevoegde of verwijderde
+        deelboom, met het aantal nodes), `moved` en `renamed` (oud en nieuw pad en naam; een
+        nieuwe weergavenaam op dezelfde plek telt ook als hernoemd), `path_map` (oud → nieuw
+        pad voor elke node waarvan het pad verandert), `unchanged` (aantal gekoppelde nodes met
+        hetzelfde pad) en de versies.
+    """
+    old_nodes, old_aql_to_semantic = build_path_index(old_web_template, {})
+    new_nodes, _ = build_path_index(new_web_template, {})
+    match = match_nodes(old_nodes, old_aql_to_semantic, new_nodes)
+    matched_old = set(match.values())
+
+    added, moved, renamed = [], [], []
+    path_map = {}
+    unchanged = 0
+    new_sizes = None
+    for path, node in new_nodes.items():
+        old_path = match.get(path)
+        parent = node['parent']
+        if old_path is None:
+            if parent is None or parent in match:
+                new_sizes = new_sizes or _subtree_sizes(new_nodes)
+                added.append({'path': path, 'name': node['name'], 'rm_type': node['rm_type'], 'nodes': new_sizes[path]})
+            continue
+        old_node = old_nodes[old_path]
+        if old_path == path:
+            unchanged += 1
+        else:
+            path_map[old_path] = path
+        same_parent = parent is None or match.get(parent) == old_node['parent']
+        if not same_parent:
+            moved.append({'old_path': old_path, 'new_path': path, 'name': node['name']})
+        elif _own_id(old_path, old_node['parent']) != _own_id(path, parent) or old_node['name'] != node['name']:
+            renamed.append({'old_path': old_path, 'new_path': path, 'old_name': old_node['name'], 'new_name': node['name']})
+
+    removed = []
+    old_sizes = None
+    for old_path, old_node in old_nodes.items():
+        if old_path not in matched_old and (old_node['parent'] is None or old_node['parent'] in matched_old):
+            old_sizes = old_sizes or _subtree_sizes(old_nodes)
+            removed.append({'path': old_path, 'name': old_node['name'], 'rm_type': old_node['rm_type'],
+                            'nodes': old_sizes[old_path]})
+
+    return {
+        'old_version': _version(old_web_template), 'new_version': _version(new_web_template),
+        'added': added, 'removed': removed, 'moved': moved, 'renamed': renamed,
+        'path_map': path_map, 'unchanged': unchanged,
+    }
+
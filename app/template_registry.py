@@ -0,0 +1,822 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.metrics import add_server_timing
+from app.label_index import LabelIndex
+from app.path_index import PathIndex, normalize_path
+from app.template_artifact import artifact_path, load_artifact, write_artifact
+from app.template_compiler import (
+    SubtreeMemo, available_languages, composition_root_path, flatten_leaf_nodes, localize_questionnaire, localize_sections,
+    localize_web_template, split_sections, transform_web_template_to_questionnaire
+)
+from app.template_diff import diff_web_templates
+from app.web_template_asset import WebTemplateAsset
+
+
+class LRUCache:
+    """
+    Kleine thread-safe LRU-cache met hit/miss/eviction-tellers.
+
+    Args:
+        maxsize (int): Maximaal aantal entries; de minst recent gebruikte entry wordt verwijderd.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = max(1, int(maxsize))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key):
+        # Zoals get(), maar zonder de tellers of de LRU-volgorde aan te passen
+        with self._lock:
+            return self._data.get(key)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions
+            }
+
+
+def _file_signature(filepath):
+    """(mtime_ns, size) van een bestand, of None als het niet bestaat. Kost één stat(), geen read."""
+    try:
+        stat_result = os.stat(filepath)
+    except OSError:
+        return None
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
+class LanguageVariant:
+    """
+    Vragenlijst en secties van een snapshot in een andere taal dan de standaardtaal.
+
+    Afgeleid van de vragenlijst en secties in de standaardtaal (`localize_questionnaire`,
+    `localize_sections`) en deelt daarmee alles wat niet vertaald wordt. De sectie-assets
+    worden, net als die van de standaardtaal, pas bij eerste opvraag gebouwd.
+    """
+    __slots__ = ('language', 'questionnaire', 'sections', 'section_assets')
+
+    def __init__(self, language, questionnaire, sections):
+        self.language = language
+        self.questionnaire = questionnaire
+        self.sections = sections
+        self.section_assets = {}
+
+
+class TemplateSnapshot:
+    """
+    Eén ingeladen versie van een template plus de daarvan afgeleide vormen.
+
+    Een snapshot verandert niet meer nadat hij in de cache staat (op `signature` en
+    `checked_at` na); een nieuwe templateversie krijgt een nieuwe snapshot die in één
+    keer de oude vervangt. De vragenlijst, de platte lijst van vragen (`leaf_map`) en de
+    browser-assets (volledig en per sectie) worden pas bij eerste gebruik afgeleid. Komen
+    vragenlijst en leaf map uit een gecompileerd artefact, dan wordt ook de ruwe JSON pas
+    geparset als iemand hem nodig heeft.
+    Andere talen dan de standaardtaal staan, ook pas na eerste gebruik, in `language_variants`.
+    """
+
+    def __init__(self, template_id, web_template, signature, content_hash, error=None, raw_bytes=None):
+        self.template_id = template_id
+        self._web_template = web_template
+        self._raw_bytes = raw_bytes
+        self.signature = signature
+        self.content_hash = content_hash
+        self.error = error
+        self.checked_at = time.monotonic()
+        self.lock = threading.RLock()
+        self.questionnaire = None
+        self.leaf_map = None
+        self.path_index = None
+        self.label_index = None
+        self.asset = None
+        self.sections = None
+        self.section_assets = {} # index -> WebTemplateAsset, per sectie pas bij eerste opvraag
+        self.languages = None # Standaardtaal vooraan
+        self.language_variants = {} # taal -> LanguageVariant, per taal pas bij eerste opvraag
+        self.subtree_memo = None # Containers van de transformatie, voor een incrementele reload
+        self.changes = None # Verschil met de vorige versie (zie `template_diff`), na een reload
+        self.from_artifact = False
+
+    @property
+    def web_template(self):
+        if self._web_template is None:
+            with self.lock:
+                if self._web_template is None:
+                    # Alleen bij snapshots uit een artefact; de bron is toen al eens succesvol geparset
+                    self._web_template = json.loads(self._raw_bytes.decode('utf-8')) if self._raw_bytes else {}
+                    self._raw_bytes = None
+        return self._web_template
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+class TemplateRegistry:
+    """
+    Register van alle openEHR web templates in `TEMPLATE_DIR`.
+
+    Templates worden pas geladen en getransformeerd als iemand ze opvraagt. Per template
+    staat één `TemplateSnapshot` (ruwe data, vragenlijst, browser-asset) in een LRU-cache
+    van `TEMPLATE_CACHE_SIZE` entries, zodat het geheugengebruik niet meegroeit met het
+    aantal bestanden in de map.
+
+    Wijzigingen op schijf worden opgepikt zonder herstart: hoogstens eens per
+    `TEMPLATE_RELOAD_INTERVAL` seconden doet een lezer een stat() op het bestand. Bij een
+    andere mtime/size wordt de template op de achtergrond opnieuw geladen (één reload
+    tegelijk per template); lezers krijgen de oude snapshot tot de nieuwe klaar is. Blijkt
+    de inhoud (sha256) gelijk, dan blijft de oude snapshot gewoon staan.
+
+    Template-ID's zijn de bestandsnamen zonder `.json`; de index in de gesorteerde lijst
+    is ook bruikbaar (`/formulier/0`).
+    """
+
+    def __init__(self, app=None):
+        self.template_dir = None
+        self.default_template_id = None
+        self.reload_interval = 2.0
+        self.reload_jitter = 0.5
+        self.use_artifacts = True
+        self.migrate_comments = False
+        self._write_artifacts_inline = False
+        self._template_ids = None
+        self._scan_lock = threading.Lock()
+        self._load_locks = {}
+        self._load_locks_lock = threading.Lock()
+        self._reloading = set()
+        self._snapshots = None
+        self._root_paths = {}
+        self._templates_by_root = {}
+        self._root_paths_lock = threading.Lock()
+        self._root_paths_checked_at = float('-inf')
+        self._counters = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.template_dir = app.config['TEMPLATE_DIR']
+        self.default_template_id = app.config.get('DEFAULT_TEMPLATE_ID')
+        self.reload_interval = app.config.get('TEMPLATE_RELOAD_INTERVAL', 2.0)
+        self.reload_jitter = app.config.get('TEMPLATE_RELOAD_JITTER', 0.5)
+        self.use_artifacts = app.config.get('TEMPLATE_ARTIFACTS', True)
+        self.migrate_comments = app.config.get('TEMPLATE_MIGRATE_COMMENTS', False)
+        self._snapshots = LRUCache(app.config.get('TEMPLATE_CACHE_SIZE', 8))
+        self._template_ids = None
+        self._reloading = set()
+        self._root_paths = {}
+        self._templates_by_root = {}
+        self._root_paths_checked_at = float('-inf')
+        self._counters = {
+            "questionnaire_builds": 0, "asset_builds": 0, "section_asset_builds": 0, "language_variant_builds": 0,
+            "artifact_loads": 0, "artifact_writes": 0,
+            "reloads": 0, "reload_failures": 0, "unchanged_reloads": 0,
+            "subtrees_reused": 0, "subtrees_rebuilt": 0, "comments_migrated": 0,
+            "last_reload_seconds": None, "reload_seconds_total": 0.0
+        }
+        app.extensions['template_registry'] = self
+
+    # --- Ontdekken van templates ---
+
+    def _scan(self):
+        try:
+            names = os.listdir(self.template_dir)
+        except OSError as e:
+            current_app.logger.error(f"FOUT: Template map '{self.template_dir}' niet leesbaar: {e}")
+            names = []
+        return sorted(name[:-len('.json')] for name in names
+                      if name.endswith('.json') and not name.startswith('.'))
+
+    def template_ids(self):
+        if self._template_ids is None:
+            with self._scan_lock:
+                if self._template_ids is None:
+                    self._template_ids = self._scan()
+        return self._template_ids
+
+    def rescan(self):
+        with self._scan_lock:
+            self._template_ids = self._scan()
+        return self._template_ids
+
+    def resolve(self, template_ref=None):
+        """
+        Vertaalt een template-referentie (None, index of ID) naar een bekend template-ID.
+
+        Returns:
+            str | None: Het template-ID, of None als de referentie onbekend is.
+        """
+        template_ids = self.template_ids()
+        if template_ref is None or template_ref == '':
+            if self.default_template_id in template_ids:
+                return self.default_template_id
+            return template_ids[0] if template_ids else None
+        template_ref = str(template_ref)
+        if template_ref.isdigit():
+            index = int(template_ref)
+            return template_ids[index] if index < len(template_ids) else None
+        if template_ref not in template_ids:
+            # Mogelijk is het bestand na de laatste scan toegevoegd
+            template_ids = self.rescan()
+        return template_ref if template_ref in template_ids else None
+
+    def filepath(self, template_id):
+        return os.path.join(self.template_dir, f"{template_id}.json")
+
+    def artifact_path(self, template_id):
+        return artifact_path(self.filepath(template_id))
+
+    # --- Laden van snapshots ---
+
+    def _load_snapshot(self, template_id, previous=None, use_artifact=True):
+        """
+        Leest en parset het templatebestand.
+
+        Als `previous` dezelfde content-hash heeft, wordt die snapshot hergebruikt (alleen
+        de signature wordt bijgewerkt) en slaan we de JSON-parse over. Hoort er een
+        gecompileerd artefact bij deze content-hash, dan komen vragenlijst, leaf map,
+        padindex en talen daaruit en wordt er niets getransformeerd. Een mislukte load levert een
+        snapshot met lege data op; die wordt bij de volgende bestandswijziging opnieuw
+        geprobeerd.
+        """
+        filepath = self.filepath(template_id)
+        signature = _file_signature(filepath)
+        try:
+            with open(filepath, 'rb') as f:
+                raw_bytes = f.read()
+        except FileNotFoundError:
+            current_app.logger.error(f"FOUT: Web Template niet gevonden: {filepath}")
+            return TemplateSnapshot(template_id, {}, signature, None, error="Bestand niet gevonden")
+        except Exception as e:
+            current_app.logger.error(f"FOUT: Onverwachte error bij laden {filepath}: {e}", exc_info=True)
+            return TemplateSnapshot(template_id, {}, signature, None, error=str(e))
+
+        content_hash = hashlib.sha256(raw_bytes).hexdigest()
+        if previous is not None and previous.content_hash == content_hash:
+            previous.signature = signature
+            return previous
+
+        if use_artifact and self.use_artifacts:
+            artifact = load_artifact(self.artifact_path(template_id), content_hash)
+            if artifact is not None:
+                snapshot = TemplateSnapshot(template_id, None, signature, content_hash, raw_bytes=raw_bytes)
+                snapshot.questionnaire = artifact['questionnaire']
+                snapshot.leaf_map = artifact['leaf_map']
+                snapshot.path_index = PathIndex.from_data(artifact['path_index'])
+                snapshot.languages = artifact['languages']
+                snapshot.from_artifact = True
+                self._counters["artifact_loads"] += 1
+                current_app.logger.info(f"Web Template '{template_id}' geladen uit gecompileerd artefact.")
+                return snapshot
+
+        current_app.logger.info(f"Web Template '{template_id}' laden vanaf: {filepath}")
+        try:
+            web_template_data = json.loads(raw_bytes.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            current_app.logger.error(f"FOUT: JSON parse error in {filepath}: {e}")
+            return TemplateSnapshot(template_id, {}, signature, content_hash, error=f"JSON parse error: {e}")
+        if not isinstance(web_template_data, dict):
+            current_app.logger.error(f"FOUT: {filepath} bevat geen JSON-object.")
+            return TemplateSnapshot(template_id, {}, signature, content_hash, error="Geen JSON-object")
+        return TemplateSnapshot(template_id, web_template_data, signature, content_hash)
+
+    def _load_lock(self, template_id):
+        with self._load_locks_lock:
+            return self._load_locks.setdefault(template_id, threading.Lock())
+
+    def get_snapshot(self, template_id):
+        """
+        Geeft de actuele snapshot van een template, en laadt hem bij de eerste aanvraag.
+
+        Gelijktijdige eerste aanvragen binnen een proces laden de template maar één keer.
+        """
+        snapshot = self._snapshots.get(template_id)
+        if snapshot is None:
+            with self._load_lock(template_id):
+                snapshot = self._snapshots.peek(template_id)
+                if snapshot is None:
+                    started = time.perf_counter()
+                    snapshot = self._load_snapshot(template_id)
+                    self._snapshots.put(template_id, snapshot)
+                    self._remember_root_path(snapshot)
+                    add_server_timing('tpl', time.perf_counter() - started)
+            return snapshot
+        self._check_for_changes(snapshot)
+        return snapshot
+
+    # --- Wijzigingsdetectie en hot reload ---
+
+    def _check_for_changes(self, snapshot):
+        now = time.monotonic()
+        if now - snapshot.checked_at < self.reload_interval:
+            return
+        snapshot.checked_at = now
+        if _file_signature(self.filepath(snapshot.template_id)) == snapshot.signature:
+            return
+        with self._load_locks_lock:
+            if snapshot.template_id in self._reloading:
+                return
+            self._reloading.add(snapshot.template_id)
+        app = current_app._get_current_object()
+        threading.Thread(
+            target=self._reload_in_background, args=(app, snapshot.template_id, snapshot),
+            name=f"template-reload-{snapshot.template_id}", daemon=True
+        ).start()
+
+    def _reload_in_background(self, app, template_id, old_snapshot):
+        with app.app_context():
+            try:
+                # Spreid reloads van verschillende workers die dezelfde wijziging tegelijk zien
+                if self.reload_jitter:
+                    time.sleep(random.uniform(0, self.reload_jitter))
+                self.reload(template_id, old_snapshot)
+            except Exception as e:
+                self._counters["reload_failures"] += 1
+                app.logger.error(f"FOUT: Herladen van template '{template_id}' mislukt: {e}", exc_info=True)
+            finally:
+                with self._load_locks_lock:
+                    self._reloading.discard(template_id)
+
+    def reload(self, template_id, old_snapshot=None):
+        """
+        Laadt een template opnieuw en vervangt de snapshot pas als alles klaar is.
+
+        Afgeleide vormen die de oude snapshot al had (vragenlijst, asset) worden vooraf
+        opnieuw opgebouwd, zodat lezers na de wissel niet alsnog hoeven te wachten. Was de oude
+        vragenlijst getransformeerd (niet uit een artefact), dan worden alleen de gewijzigde
+        deelbomen opnieuw getransformeerd (`SubtreeMemo`). Daarna volgt `_report_changes`.
+        """
+        started = time.perf_counter()
+        new_snapshot = self._load_snapshot(template_id, previous=old_snapshot)
+        if new_snapshot is old_snapshot:
+            self._counters["unchanged_reloads"] += 1
+            self._remember_root_path(old_snapshot)
+            return old_snapshot
+        if new_snapshot.failed and old_snapshot is not None and not old_snapshot.failed:
+            # Houd de werkende versie vast; de signature voorkomt eindeloos opnieuw proberen
+            old_snapshot.signature = new_snapshot.signature
+            self._counters["reload_failures"] += 1
+            current_app.logger.error(f"FOUT: Nieuwe versie van '{template_id}' is ongeldig ({new_snapshot.error}); "
+                                     f"vorige versie blijft actief.")
+            return old_snapshot
+        if old_snapshot is not None:
+            if old_snapshot.questionnaire is not None:
+                self._ensure_questionnaire(new_snapshot, old_snapshot.subtree_memo)
+            if old_snapshot.path_index is not None:
+                self._ensure_path_index(new_snapshot)
+            if old_snapshot.label_index is not None:
+                self._ensure_label_index(new_snapshot)
+            if old_snapshot.asset is not None:
+                self._ensure_asset(new_snapshot)
+            for index in list(old_snapshot.section_assets):
+                self._ensure_section_asset(new_snapshot, index)
+            for language, variant in list(old_snapshot.language_variants.items()):
+                if self._ensure_language_variant(new_snapshot, language) is not None:
+                    for index in list(variant.section_assets):
+                        self._ensure_section_asset(new_snapshot, index, language)
+        self._snapshots.put(template_id, new_snapshot)
+        self._remember_root_path(new_snapshot)
+        self._counters["reloads"] += 1
+        self._counters["last_reload_seconds"] = round(time.perf_counter() - started, 4)
+        self._counters["reload_seconds_total"] += self._counters["last_reload_seconds"]
+        current_app.logger.info(f"Template '{template_id}' herladen in {self._counters['last_reload_seconds']}s.")
+        if old_snapshot is not None and not old_snapshot.failed and not new_snapshot.failed:
+            try:
+                self._report_changes(template_id, old_snapshot, new_snapshot)
+            except Exception as e:
+                current_app.logger.error(f"FOUT: Vergelijken van de versies van '{template_id}' mislukt: {e}", exc_info=True)
+        return new_snapshot
+
+    def _report_changes(self, template_id, old_snapshot, new_snapshot):
+        """
+        Vergelijkt de nieuwe versie met de vorige (`template_diff`) en zoekt commentaren op
+        paden die verplaatst of hernoemd zijn. Met `TEMPLATE_MIGRATE_COMMENTS` gaan die direct
+        mee naar het nieuwe pad; anders staat het voorstel in het log (zie `flask template-diff`).
+        """
+        from app.comment_migration import apply_path_migrations, plan_path_migrations
+
+        diff = new_snapshot.changes = diff_web_templates(old_snapshot.web_template, new_snapshot.web_template)
+        current_app.logger.info(
+            f"Template '{template_id}' {diff['old_version']} -> {diff['new_version']}: {len(diff['added'])} toegevoegd, "
+            f"{len(diff['removed'])} verwijderd, {len(diff['moved'])} verplaatst, {len(diff['renamed'])} hernoemd.")
+        if not diff['path_map']:
+            return
+        old_root_path = old_snapshot.questionnaire.get('semantic_path') if old_snapshot.questionnaire else None
+        plan = plan_path_migrations(template_id, diff, old_root_path)
+        comments = sum(migration['comments'] for migration in plan['migrations'])
+        if not comments:
+            return
+        if self.migrate_comments:
+            result = apply_path_migrations(template_id, plan['migrations'])
+            self._counters["comments_migrated"] += result['comments']
+            current_app.logger.info(f"Template '{template_id}': {result['comments']} commentaren verplaatst "
+                                    f"naar het nieuwe pad ({result['paths']} paden).")
+        else:
+            current_app.logger.warning(
+                f"WARN: Template '{template_id}': {comments} commentaren staan op {len(plan['migrations'])} "
+                f"verplaatste of hernoemde paden; `flask template-diff` of TEMPLATE_MIGRATE_COMMENTS zet ze om.")
+
+    # --- Afgeleide vormen ---
+
+    def _ensure_questionnaire(self, snapshot, previous_memo=None):
+        if snapshot.questionnaire is None:
+            built = False
+            with snapshot.lock:
+                if snapshot.questionnaire is None:
+                    snapshot.questionnaire = self._build_questionnaire(snapshot, previous_memo)
+                    built = True
+            if built and self.use_artifacts and not snapshot.failed:
+                # Eerste transformatie van deze versie: leg hem vast voor volgende workers/herstarts,
+                # maar niet binnen de request die erop wacht
+                if self._write_artifacts_inline:
+                    self._write_artifact(snapshot)
+                else:
+                    self._write_artifact_in_background(snapshot)
+        return snapshot.questionnaire
+
+    def _ensure_leaf_map(self, snapshot):
+        if snapshot.leaf_map is None:
+            questionnaire = self._ensure_questionnaire(snapshot)
+            with snapshot.lock:
+                if snapshot.leaf_map is None:
+                    snapshot.leaf_map = self._build_leaf_map(questionnaire)
+        return snapshot.leaf_map
+
+    def _ensure_path_index(self, snapshot):
+        if snapshot.path_index is None:
+            questionnaire = self._ensure_questionnaire(snapshot)
+            with snapshot.lock:
+                if snapshot.path_index is None:
+                    # Een mislukte snapshot heeft een lege template en dus een lege index
+                    snapshot.path_index = PathIndex.build(snapshot.web_template, questionnaire)
+        return snapshot.path_index
+
+    def _ensure_label_index(self, snapshot):
+        if snapshot.label_index is None:
+            path_index = self._ensure_path_index(snapshot)
+            with snapshot.lock:
+                if snapshot.label_index is None:
+                    snapshot.label_index = LabelIndex(path_index)
+        return snapshot.label_index
+
+    def _ensure_asset(self, snapshot):
+        if snapshot.asset is None:
+            with snapshot.lock:
+                if snapshot.asset is None:
+                    snapshot.asset = self._build_asset(snapshot)
+        return snapshot.asset
+
+    def _ensure_sections(self, snapshot):
+        if snapshot.sections is None:
+            questionnaire = self._ensure_questionnaire(snapshot)
+            with snapshot.lock:
+                if snapshot.sections is None:
+                    snapshot.sections = split_sections(snapshot.web_template, questionnaire) if not snapshot.failed else []
+        return snapshot.sections
+
+    def _ensure_section_asset(self, snapshot, index, language=None):
+        variant = self._ensure_language_variant(snapshot, language)
+        sections = self._ensure_sections(snapshot)
+        if not 0 <= index < len(sections):
+            return None
+        section_assets = variant.section_assets if variant is not None else snapshot.section_assets
+        asset = section_assets.get(index)
+        if asset is None:
+            with snapshot.lock:
+                asset = section_assets.get(index)
+                if asset is None:
+                    self._counters["section_asset_builds"] += 1
+                    started = time.perf_counter()
+                    web_template = sections[index]['web_template']
+                    if variant is not None:
+                        web_template = localize_web_template(web_template, variant.language)
+                    asset = section_assets[index] = WebTemplateAsset(web_template)
+                    add_server_timing('tpl', time.perf_counter() - started)
+        return asset
+
+    def _ensure_languages(self, snapshot):
+        if snapshot.languages is None:
+            with snapshot.lock:
+                if snapshot.languages is None:
+                    snapshot.languages = available_languages(snapshot.web_template) if not snapshot.failed else []
+        return snapshot.languages
+
+    def _ensure_language_variant(self, snapshot, language):
+        """
+        De `LanguageVariant` voor `language`, of None voor de standaardtaal en voor talen die
+        de template niet heeft (dan geldt de vragenlijst in de standaardtaal).
+        """
+        if not language or language not in self._ensure_languages(snapshot)[1:]:
+            return None
+        variant = snapshot.language_variants.get(language)
+        if variant is None:
+            questionnaire = self._ensure_questionnaire(snapshot)
+            sections = self._ensure_sections(snapshot)
+            with snapshot.lock:
+                variant = snapshot.language_variants.get(language)
+                if variant is None:
+                    self._counters["language_variant_builds"] += 1
+                    started = time.perf_counter()
+                    localized = localize_questionnaire(snapshot.web_template, questionnaire, language)
+                    variant = snapshot.language_variants[language] = LanguageVariant(
+                        language, localized, localize_sections(sections, localized))
+                    add_server_timing('tpl', time.perf_counter() - started)
+                    current_app.logger.info(f"Vragenlijst '{snapshot.template_id}' in taal '{language}' opgebouwd.")
+        return variant
+
+    def _build_questionnaire(self, snapshot, previous_memo=None):
+        if snapshot.failed:
+            return {
+                "_type": "COMPOSITION", "name": {"value": "FOUT: Template kon niet geladen of verwerkt worden."},
+                "version": "", "content": []
+            }
+        current_app.logger.info(f"Getransformeerde vragenlijst '{snapshot.template_id}' opbouwen...")
+        self._counters["questionnaire_builds"] += 1
+        started = time.perf_counter()
+        memo = SubtreeMemo(previous_memo)
+        questionnaire = transform_web_template_to_questionnaire(snapshot.web_template, memo=memo)
+        snapshot.subtree_memo = memo
+        add_server_timing('tpl', time.perf_counter() - started)
+        if previous_memo is not None:
+            self._counters["subtrees_reused"] += memo.reused
+            self._counters["subtrees_rebuilt"] += memo.built
+            current_app.logger.info(f"Vragenlijst '{snapshot.template_id}' incrementeel opgebouwd: {memo.reused} "
+                                    f"ongewijzigde deelbomen overgenomen, {memo.built} containers opnieuw.")
+        if not questionnaire.get("content"):
+            current_app.logger.warning(f"Getransformeerde vragenlijst '{snapshot.template_id}' heeft lege 'content'.")
+        return questionnaire
+
+    def _build_leaf_map(self, questionnaire):
+        return flatten_leaf_nodes(questionnaire.get('content', []), {})
+
+    def _write_artifact(self, snapshot):
+        path = self.artifact_path(snapshot.template_id)
+        try:
+            write_artifact(path, snapshot.content_hash, self._ensure_questionnaire(snapshot),
+                           self._ensure_leaf_map(snapshot), self._ensure_path_index(snapshot),
+                           self._ensure_languages(snapshot))
+        except OSError as e:
+            # Bv. een read-only deployment: dan blijft het bij transformeren per worker
+            current_app.logger.warning(f"WARN: Kon artefact '{path}' niet schrijven: {e}")
+            return None
+        self._counters["artifact_writes"] += 1
+        current_app.logger.info(f"Gecompileerd artefact voor '{snapshot.template_id}' geschreven: {path}")
+        return path
+
+    def _write_artifact_in_background(self, snapshot):
+        app = current_app._get_current_object()
+        threading.Thread(
+            target=self._write_artifact_with_app, args=(app, snapshot),
+            name=f"template-artifact-{snapshot.template_id}", daemon=True
+        ).start()
+
+    def _write_artifact_with_app(self, app, snapshot):
+        with app.app_context():
+            try:
+                self._write_artifact(snapshot)
+            except Exception as e:
+                app.logger.error(f"FOUT: Artefact voor '{snapshot.template_id}' schrijven mislukt: {e}", exc_info=True)
+
+    def compile(self, template_id):
+        """
+        Transformeert een template volledig en schrijft het artefact, ongeacht een bestaand artefact.
+
+        Returns:
+            str | None: Pad van het geschreven artefact, of None als de template niet laadt.
+        """
+        snapshot = self._load_snapshot(template_id, use_artifact=False)
+        if snapshot.failed:
+            return None
+        snapshot.questionnaire = self._build_questionnaire(snapshot)
+        path = self._write_artifact(snapshot)
+        self._snapshots.put(template_id, snapshot)
+        self._remember_root_path(snapshot)
+        return path
+
+    def _build_asset(self, snapshot):
+        if snapshot.failed:
+            return False # Sentinel: niet opnieuw proberen voor deze (mislukte) snapshot
+        self._counters["asset_builds"] += 1
+        started = time.perf_counter()
+        asset = WebTemplateAsset(snapshot.web_template)
+        add_server_timing('tpl', time.perf_counter() - started)
+        current_app.logger.info(f"Web template asset '{snapshot.template_id}' gebouwd (versie {asset.version}, "
+                                f"varianten: {', '.join(asset.variants)}).")
+        return asset
+
+    def preload(self, template_ids=None):
+        """
+        Laadt templates en bouwt alle afgeleide vormen vooraf, in plaats van bij eerste gebruik.
+
+        Bedoeld voor de gunicorn-master (`preload_app`): wat hier gebouwd wordt, delen alle
+        workers na de fork copy-on-write, in plaats van dat elke worker zijn eigen kopie bouwt.
+        Artefacten worden hier direct geschreven, niet in een thread (die de fork niet overleeft).
+        Zonder `template_ids` alle templates, tot `TEMPLATE_CACHE_SIZE`.
+
+        Returns:
+            list[str]: De geladen template-ID's (zonder de templates die niet laadden).
+        """
+        template_ids = list(template_ids or self.template_ids()[:self._snapshots.maxsize])
+        loaded = []
+        self._write_artifacts_inline = True
+        try:
+            for template_id in template_ids:
+                snapshot = self.get_snapshot(template_id)
+                if snapshot.failed:
+                    continue
+                snapshot.web_template # Ook de ruwe JSON, als de snapshot uit een artefact komt
+                self._ensure_leaf_map(snapshot)
+                self._ensure_path_index(snapshot)
+                self._ensure_label_index(snapshot)
+                self._ensure_asset(snapshot)
+                for index in range(len(self._ensure_sections(snapshot))):
+                    self._ensure_section_asset(snapshot, index)
+                loaded.append(template_id)
+        finally:
+            self._write_artifacts_inline = False
+        return loaded
+
+    def get_web_template(self, template_id):
+        return self.get_snapshot(template_id).web_template
+
+    def get_questionnaire(self, template_id, language=None):
+        """
+        De vragenlijst, in `language` als de template die taal heeft en anders in de standaardtaal.
+
+        Paden, leaf map, exports en zoekindex zijn er maar één keer, in de standaardtaal; een
+        andere taal verandert alleen namen en labels.
+        """
+        snapshot = self.get_snapshot(template_id)
+        variant = self._ensure_language_variant(snapshot, language)
+        return variant.questionnaire if variant is not None else self._ensure_questionnaire(snapshot)
+
+    def languages(self, template_id):
+        """De talen van een template; de eerste is de standaardtaal (die van `get_questionnaire()`)."""
+        return self._ensure_languages(self.get_snapshot(template_id))
+
+    def get_leaf_map(self, template_id):
+        """Platte, geordende map van vragen (zie `template_compiler.flatten_leaf_nodes`)."""
+        return self._ensure_leaf_map(self.get_snapshot(template_id))
+
+    def get_asset(self, template_id):
+        return self._ensure_asset(self.get_snapshot(template_id)) or None
+
+    def get_sections(self, template_id, language=None):
+        """Hoofdsecties van de huidige versie (zie `template_compiler.split_sections`), met namen in `language`."""
+        snapshot = self.get_snapshot(template_id)
+        variant = self._ensure_language_variant(snapshot, language)
+        return variant.sections if variant is not None else self._ensure_sections(snapshot)
+
+    def sections_version(self, template_id):
+        """
+        Versie voor de URL's van de sectie-assets: de content-hash van het templatebestand.
+
+        Bekend zonder een sectie-asset te bouwen, zodat de inhoudsopgave direct naar
+        onveranderlijke URL's kan verwijzen; elke sectie wordt pas gebouwd als iemand hem opvraagt.
+        """
+        return (self.get_snapshot(template_id).content_hash or '')[:20]
+
+    def get_section_asset(self, template_id, index, language=None):
+        """Browser-asset met de web template van één sectie (in `language`), of None bij een onbekende index."""
+        return self._ensure_section_asset(self.get_snapshot(template_id), index, language)
+
+    def get_path_index(self, template_id):
+        """`PathIndex` van de huidige versie: opzoeken van nodes op semantisch pad of AQL-pad."""
+        return self._ensure_path_index(self.get_snapshot(template_id))
+
+    def get_label_index(self, template_id):
+        """`LabelIndex` van de huidige versie: zoeken in de namen van vragen en secties."""
+        return self._ensure_label_index(self.get_snapshot(template_id))
+
+    # --- Rootpaden ---
+    # Per template het eerste segment van zijn semantische paden, per templateversie één keer
+    # bepaald (uit het artefact of de ruwe JSON, zonder te transformeren) en bij een reload
+    # bijgewerkt. Blijft bewaard als de snapshot uit de LRU-cache valt.
+
+    def _remember_root_path(self, snapshot):
+        if snapshot.questionnaire is not None:
+            root_path = snapshot.questionnaire.get('semantic_path')
+        else:
+            root_path = composition_root_path(snapshot.web_template) if not snapshot.failed else None
+        root_path = root_path or snapshot.template_id
+        with self._root_paths_lock:
+            previous = self._root_paths.get(snapshot.template_id)
+            if previous is not None:
+                self._templates_by_root.get(previous[1], set()).discard(snapshot.template_id)
+            self._root_paths[snapshot.template_id] = (snapshot.signature, root_path)
+            self._templates_by_root.setdefault(root_path, set()).add(snapshot.template_id)
+        return root_path
+
+    def _refresh_root_paths(self):
+        """
+        Bepaalt het rootpad van templates die nog niet (of in een oudere versie) bekend zijn,
+        hoogstens eens per `TEMPLATE_RELOAD_INTERVAL`. Templates die niet in de cache staan,
+        worden daarvoor wel geladen maar niet in de cache gezet.
+        """
+        now = time.monotonic()
+        if now - self._root_paths_checked_at < self.reload_interval:
+            return
+        self._root_paths_checked_at = now
+        for template_id in self.rescan():
+            signature = _file_signature(self.filepath(template_id))
+            entry = self._root_paths.get(template_id)
+            if entry is None or entry[0] != signature:
+                snapshot = self._snapshots.peek(template_id)
+                if snapshot is None or snapshot.signature != signature:
+                    snapshot = self._load_snapshot(template_id)
+                self._remember_root_path(snapshot)
+
+    def template_for_path(self, element_path):
+        """
+        ID van de template waar een semantisch pad bij hoort, of None.
+
+        Kijkt alleen naar het eerste padsegment (het ID van de compositie), in de map van
+        rootpaden; alleen een onbekend rootpad laat templates laden die nog niet bekend zijn.
+        Hebben meer templates hetzelfde rootpad, dan de eerste in de gesorteerde lijst.
+        """
+        root_segment = normalize_path((element_path or '').split('/', 1)[0])
+        if not self._templates_by_root.get(root_segment):
+            self._refresh_root_paths()
+        template_ids = self.template_ids()
+        matches = [template_id for template_id in self._templates_by_root.get(root_segment, ()) if template_id in template_ids]
+        return min(matches) if matches else None
+
+    def resolve_path(self, element_path, template_id=None):
+        """
+        Vertaalt een pad uit de UI (semantisch, Medblocks-pad of AQL-pad) naar het semantische
+        pad in de `PathIndex`, zoals het import doet.
+
+        Zonder `template_id` bepaalt het eerste padsegment de template. Een AQL-pad heeft geen
+        rootsegment; dat wordt opgezocht in de templates die al geladen zijn en in de
+        standaardtemplate (in die volgorde van template-ID's), zonder andere templates te laden.
+
+        Returns:
+            tuple[str | None, str | None]: (template-ID, semantisch pad), of (None, None).
+        """
+        if template_id is not None:
+            candidates = [template_id]
+        else:
+            candidates = [self.template_for_path(element_path)]
+            if candidates[0] is None and (element_path or '').startswith('/'):
+                default_template_id = self.resolve()
+                candidates = [candidate for candidate in self.template_ids()
+                              if candidate == default_template_id or self._snapshots.peek(candidate) is not None]
+        for candidate in candidates:
+            if candidate is None:
+                continue
+            semantic_path = self.get_path_index(candidate).resolve(element_path)
+            if semantic_path is not None:
+                return candidate, semantic_path
+        return None, None
+
+    def root_path(self, template_id):
+        """Eerste segment van alle semantische paden van deze template (het ID van de compositie)."""
+        snapshot = self.get_snapshot(template_id)
+        entry = self._root_paths.get(template_id)
+        if entry is not None and entry[0] == snapshot.signature:
+            return entry[1]
+        return self._remember_root_path(snapshot)
+
+    def stats(self):
+        return {
+            "templates": len(self.template_ids()),
+            "snapshots": self._snapshots.stats(),
+            **self._counters
+        }
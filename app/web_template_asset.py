@@ -0,0 +1,56 @@
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli # Optioneel: zonder brotli leveren we alleen gzip/identity
+except ImportError:
+    brotli = None
+
+# Volgorde van voorkeur als de client meerdere encodings accepteert
+PREFERRED_ENCODINGS = ('br', 'gzip')
+# Boven deze grootte (bytes) lichter comprimeren: brotli 11 haalt ongeveer 1 MB/s (een web
+# template van 40 MB kost zo'n 40 seconden), brotli 9 is tientallen keren sneller en ~13% groter
+MAX_COMPRESSION_BYTES = 256 * 1024
+
+
+class WebTemplateAsset:
+    """
+    Eenmalig geserialiseerde web template, klaar om als statisch bestand te serveren.
+
+    De JSON wordt één keer compact geserialiseerd en voorgecomprimeerd (gzip en, indien
+    beschikbaar, brotli; maximaal tot `MAX_COMPRESSION_BYTES`, daarboven lichter). De
+    content-hash dient als versie in de URL en als ETag.
+
+    Args:
+        web_template_data (dict): De ruwe web template zoals geladen uit het JSON-bestand.
+    """
+
+    def __init__(self, web_template_data):
+        identity = json.dumps(web_template_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.version = hashlib.sha256(identity).hexdigest()[:20]
+        large = len(identity) > MAX_COMPRESSION_BYTES
+        self.variants = {'identity': identity, 'gzip': gzip.compress(identity, compresslevel=6 if large else 9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(identity, quality=9 if large else 11)
+
+    def etag_for(self, encoding):
+        # Elke representatie (encoding) krijgt een eigen sterke ETag
+        return self.version if encoding == 'identity' else f"{self.version}-{encoding}"
+
+    def all_etags(self):
+        return [self.etag_for(encoding) for encoding in self.variants]
+
+    def select_encoding(self, accept_encodings):
+        """
+        Kies de beste beschikbare variant op basis van de Accept-Encoding header.
+
+        Args:
+            accept_encodings (werkzeug.datastructures.Accept): `request.accept_encodings`.
+        Returns:
+            str: 'br', 'gzip' of 'identity'.
+        """
+        for encoding in PREFERRED_ENCODINGS:
+            if encoding in self.variants and accept_encodings.quality(encoding) > 0:
+                return encoding
+        return 'identity'
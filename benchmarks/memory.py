@@ -0,0 +1,181 @@
+"""
+Geheugen per worker met en zonder preload: het unieke geheugen (USS) van elke worker nadat
+hij dezelfde pagina's en API's heeft bediend.
+
+Gebruik (vanuit de root van de repository, alleen Linux):
+
+    python -m benchmarks.memory                         # ACP-DUTCH, 4 workers
+    python -m benchmarks.memory --nodes 200000          # synthetische template van ~200k nodes
+    python -m benchmarks.memory --gunicorn-pid 12345    # workers van een draaiende gunicorn-master
+
+De eerste twee vormen bootsen het prefork-model van gunicorn na in een apart proces per
+modus: zonder preload maakt elke worker na de fork zelf de app (en laadt zijn templates),
+met preload maakt de master de app met `TEMPLATE_PRELOAD` (templates vooraf gebouwd,
+`gc.freeze()`) en forkt daarna. USS = Private_Clean + Private_Dirty uit
+/proc/<pid>/smaps_rollup: wat de worker niet met andere processen deelt. PSS verdeelt het
+gedeelde geheugen over de processen die het delen.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_of(pid):
+    """RSS, PSS, USS en gedeeld geheugen (MB) van een proces, uit /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+
+    def mb(kb):
+        return round(kb / 1024, 1)
+
+    return {
+        'rss_mb': mb(fields.get('Rss', 0)), 'pss_mb': mb(fields.get('Pss', 0)),
+        'uss_mb': mb(fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)),
+        'shared_mb': mb(fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)),
+    }
+
+
+def _summary(per_worker):
+    def mean(key):
+        return round(sum(worker[key] for worker in per_worker) / len(per_worker), 1) if per_worker else None
+
+    return {'workers': per_worker, 'uss_mb_mean': mean('uss_mb'), 'pss_mb_mean': mean('pss_mb'),
+            'rss_mb_mean': mean('rss_mb'), 'uss_mb_total': round(sum(worker['uss_mb'] for worker in per_worker), 1)}
+
+
+def _make_app(work_dir, template_dir, template_id, preload):
+    sys.path.insert(0, ROOT_DIR)
+    from config import Config
+    from app import create_app
+
+    class MemoryConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(work_dir, 'memory.db')
+        TEMPLATE_DIR = template_dir
+        DEFAULT_TEMPLATE_ID = template_id
+        TEMPLATE_ARTIFACTS = False
+        TEMPLATE_PRELOAD = preload
+        EXPORT_DIR = os.path.join(work_dir, 'exports')
+        RESPONSE_CACHE_PATH = os.path.join(work_dir, 'response-cache.db')
+        METRICS_ENABLED = False
+
+    return create_app(MemoryConfig)
+
+
+def _serve_requests(app, template_id):
+    """De requests van een reviewer: formulier, alle secties, zoeken, vragenlijst-API's, dekking."""
+    client = app.test_client()
+    with app.app_context():
+        from app import template_registry
+        version = template_registry.sections_version(template_id)
+        section_count = len(template_registry.get_sections(template_id))
+    urls = [f'/formulier/{template_id}', f'/api/templates/{template_id}/sections',
+            f'/api/templates/{template_id}/nodes', f'/api/search?q=zorg&template_id={template_id}',
+            f'/dekking/{template_id}', f'/export/comments/{template_id}']
+    urls += [f'/formulier/{template_id}/secties/{index}/{version}.json' for index in range(section_count)]
+    for _ in range(2):
+        for url in urls:
+            response = client.get(url, headers={'Accept-Encoding': 'br, gzip'})
+            assert response.status_code == 200, (url, response.status_code)
+            b''.join(response.response)
+
+
+def _child_main(preload, workers, nodes):
+    work_dir = tempfile.mkdtemp(prefix='benchmark-memory-')
+    try:
+        if nodes:
+            from benchmarks.synthetic import generate_template, write_template
+            template_dir, template_id = os.path.join(work_dir, 'templates'), 'synthetisch'
+            os.makedirs(template_dir)
+            write_template(generate_template(nodes), template_dir, template_id)
+        else:
+            template_dir, template_id = os.path.join(ROOT_DIR, 'app', 'templates_openehr'), 'ACP-DUTCH'
+        if preload:
+            app = _make_app(work_dir, template_dir, template_id, True)
+        else:
+            # Zoals gunicorn zonder preload: de master importeert de app niet eens. Het schema
+            # wordt eenmalig in een wegwerpproces aangemaakt, niet door de workers tegelijk
+            app = None
+            pid = os.fork()
+            if pid == 0:
+                _make_app(work_dir, template_dir, template_id, False)
+                os._exit(0)
+            os.waitpid(pid, 0)
+
+        pids, ready_fds = [], []
+        for _ in range(workers):
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                worker_app = app or _make_app(work_dir, template_dir, template_id, False)
+                _serve_requests(worker_app, template_id)
+                os.write(write_fd, b'1')
+                while True:
+                    time.sleep(60)
+            os.close(write_fd)
+            pids.append(pid)
+            ready_fds.append(read_fd)
+        for read_fd in ready_fds:
+            os.read(read_fd, 1)
+        time.sleep(0.5)
+        result = {'preload': preload, 'template_id': template_id, 'master': memory_of(os.getpid()),
+                  **_summary([memory_of(pid) for pid in pids])}
+        for pid in pids:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        print(json.dumps(result))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _gunicorn_report(master_pid):
+    children = []
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        children = [int(pid) for pid in f.read().split()]
+    return {'master_pid': master_pid, 'master': memory_of(master_pid), **_summary([memory_of(pid) for pid in children])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help="Aantal workers (standaard 4)")
+    parser.add_argument('--nodes', type=int, default=0, help="Synthetische template van zoveel nodes (standaard ACP-DUTCH)")
+    parser.add_argument('--gunicorn-pid', type=int, help="Meet de workers van een draaiende gunicorn-master")
+    parser.add_argument('--child', choices=['lazy', 'preload'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return _child_main(args.child == 'preload', args.workers, args.nodes)
+    if args.gunicorn_pid:
+        print(json.dumps(_gunicorn_report(args.gunicorn_pid), indent=2))
+        return
+
+    report = {'workers': args.workers, 'nodes': args.nodes or None}
+    for mode in ('lazy', 'preload'):
+        print(f"{mode}...", file=sys.stderr, flush=True)
+        command = [sys.executable, '-m', 'benchmarks.memory', '--child', mode,
+                   '--workers', str(args.workers), '--nodes', str(args.nodes)]
+        completed = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stderr)
+            raise SystemExit(1)
+        report[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+    lazy, preload = report['lazy']['uss_mb_mean'], report['preload']['uss_mb_mean']
+    report['uss_saved_per_worker_mb'] = round(lazy - preload, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
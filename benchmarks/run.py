@@ -0,0 +1,313 @@
+"""
+Benchmarks voor het laden/transformeren van templates, de commentaar-API en de exports.
+
+Gebruik (vanuit de root van de repository):
+
+    python -m benchmarks.run                          # standaard-matrix, resultaten naar benchmarks/results.json
+    python -m benchmarks.run --quick                  # kleine matrix voor een snelle controle
+    python -m benchmarks.run --nodes 10000 50000 --comments 0 100000 --output na.json
+    python -m benchmarks.run --compare voor.json na.json
+
+Elk scenario draait in een eigen subproces, zodat de piek-RSS per scenario klopt en caches
+niet doorlekken. Per meting worden wandkloktijd, aantal SQL-queries en de piek-RSS van het
+proces tot dan toe vastgelegd. Het resultaatbestand is gesorteerde JSON, dus goed te diffen
+tussen commits.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_NODES = [10000, 50000, 200000]
+DEFAULT_COMMENTS = [0, 10000, 100000, 1000000]
+QUICK_NODES = [10000]
+QUICK_COMMENTS = [0, 10000]
+
+# Herhalingen voor metingen van losse requests (mediaan wordt gerapporteerd)
+REQUEST_REPEATS = 50
+# Herhalingen van de transformatie: één meting van ~1 s wisselt te veel om versies te vergelijken
+TRANSFORM_REPEATS = 5
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KB op Linux, in bytes op macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class QueryCounter:
+    """Telt SQL-statements op een engine via de `before_cursor_execute`-event."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+class Recorder:
+    def __init__(self, query_counter=None):
+        self.query_counter = query_counter
+        self.metrics = {}
+
+    def measure(self, name, func, repeats=1, collect=False):
+        """
+        Voert `func` `repeats` keer uit; legt de mediaan (en min/max) van de tijd vast.
+
+        Met `collect` telt een volledige garbage collection na `func` mee: anders komt die voor
+        rekening van de volgende meting (bv. na een transformatie met de collector uit).
+        """
+        queries_before = self.query_counter.count if self.query_counter else 0
+        timings = []
+        result = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = func()
+            if collect:
+                gc.collect()
+            timings.append(time.perf_counter() - started)
+        metric = {
+            'wall_s': round(statistics.median(timings), 6),
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+        if repeats > 1:
+            metric.update(repeats=repeats, min_s=round(min(timings), 6), max_s=round(max(timings), 6))
+        if self.query_counter:
+            metric['queries'] = round((self.query_counter.count - queries_before) / repeats, 2)
+        self.metrics[name] = metric
+        return result
+
+
+def _make_app(work_dir, template_dir, artifacts):
+    sys.path.insert(0, ROOT_DIR)
+    from config import Config
+    from app import create_app
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(work_dir, 'benchmark.db')
+        TEMPLATE_DIR = template_dir
+        TEMPLATE_ARTIFACTS = artifacts
+        EXPORT_DIR = os.path.join(work_dir, 'exports')
+        RESPONSE_CACHE_PATH = os.path.join(work_dir, 'response-cache.db')
+
+    return create_app(BenchmarkConfig)
+
+
+def scenario_transform(nodes, work_dir):
+    """Laden, transformeren, leaf map, padindex, asset en artefact van een synthetische template."""
+    from benchmarks.synthetic import count_nodes, generate_template, write_template
+
+    template_dir = os.path.join(work_dir, 'templates')
+    os.makedirs(template_dir)
+    template = generate_template(nodes)
+    template_id = 'synthetisch'
+    template_path = write_template(template, template_dir, template_id)
+    info = {'nodes': count_nodes(template['tree']), 'template_bytes': os.path.getsize(template_path)}
+    del template
+
+    app = _make_app(work_dir, template_dir, artifacts=True)
+    recorder = Recorder()
+    with app.app_context():
+        from app import template_registry
+        from app.template_compiler import transform_web_template_to_questionnaire
+
+        snapshot = recorder.measure('load_parse', lambda: template_registry._load_snapshot(template_id, use_artifact=False))
+        web_template = snapshot.web_template
+        questionnaire = recorder.measure('transform', lambda: transform_web_template_to_questionnaire(web_template),
+                                         repeats=TRANSFORM_REPEATS, collect=True)
+        info['questions'] = len(recorder.measure('leaf_map', lambda: template_registry._build_leaf_map(questionnaire)))
+        snapshot.questionnaire = questionnaire
+        recorder.measure('path_index', lambda: template_registry._ensure_path_index(snapshot))
+        recorder.measure('asset', lambda: template_registry._ensure_asset(snapshot))
+        recorder.measure('artifact_write', lambda: template_registry._write_artifact(snapshot))
+        info['artifact_bytes'] = os.path.getsize(template_registry.artifact_path(template_id))
+        recorder.measure('artifact_load', lambda: template_registry._load_snapshot(template_id))
+        recorder.measure('cold_start_from_artifact', lambda: (
+            template_registry._snapshots.clear(), template_registry.get_questionnaire(template_id)))
+    return info, recorder.metrics
+
+
+def scenario_comments(comments, work_dir):
+    """Schrijven en lezen van commentaren en de volledige exports, bij een gegeven tabelgrootte."""
+    from benchmarks.synthetic import seed_comments
+    from app.pagination import encode_cursor
+
+    template_dir = os.path.join(ROOT_DIR, 'app', 'templates_openehr')
+    app = _make_app(work_dir, template_dir, artifacts=False)
+    client = app.test_client()
+    with app.app_context():
+        from app import db, template_registry
+        template_id = template_registry.resolve()
+        leaf_map = template_registry.get_leaf_map(template_id)
+        paths = sorted({question['comment_path'] for question in leaf_map.values() if question.get('comment_path')})
+        recorder = Recorder(QueryCounter(db.engine))
+        seeded = recorder.measure('seed', lambda: seed_comments(db, paths, comments))
+        info = {'comments': seeded, 'paths': len(paths), 'template_id': template_id,
+                'db_bytes': os.path.getsize(os.path.join(work_dir, 'benchmark.db'))}
+
+    hot_path = paths[len(paths) // 2]
+    counter = 0
+
+    def add_comment():
+        nonlocal counter
+        counter += 1
+        response = client.post('/api/comments/add', data={
+            'element_path': hot_path, 'comment_text': f'benchmark {counter}',
+            'author_name': 'benchmark', 'template_id': template_id})
+        assert response.status_code == 201, response.get_data(as_text=True)
+
+    def get(url, expected_status=200, **kwargs):
+        def request():
+            response = client.get(url, **kwargs)
+            assert response.status_code == expected_status, (url, response.status_code)
+            return response
+        return request
+
+    def consume(url):
+        def request():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            return sum(len(chunk) for chunk in response.response)
+        return request
+
+    recorder.measure('write_single', add_comment, repeats=REQUEST_REPEATS)
+    recorder.measure('read_single_path', get(f'/api/comments/get/{hot_path}'), repeats=REQUEST_REPEATS)
+    # Zonder treffer in de gedeelde response-cache (het pad telkens ongeldig gemaakt)
+    from app import response_cache
+    read_path = get(f'/api/comments/get/{hot_path}')
+    recorder.measure('read_single_path_miss', lambda: (response_cache.invalidate([hot_path]), read_path()),
+                     repeats=REQUEST_REPEATS)
+    recorder.measure('read_single_path_threaded', get(f'/api/comments/get/{hot_path}?threaded=1'), repeats=REQUEST_REPEATS)
+    repeats = max(3, REQUEST_REPEATS // (1 + comments // 10000))
+    bulk = recorder.measure('read_bulk_template', get(f'/api/templates/{template_id}/comments'), repeats=repeats)
+    recorder.measure('read_bulk_revalidate', get(f'/api/templates/{template_id}/comments', 304,
+                                                 headers={'If-None-Match': bulk.headers['ETag']}),
+                     repeats=REQUEST_REPEATS)
+    recorder.measure('read_counts', get(f'/api/templates/{template_id}/comments/counts'), repeats=REQUEST_REPEATS)
+    # Keyset-paginering: een pagina halverwege de tabel moet even snel zijn als de eerste
+    first_page = recorder.measure('list_first_page', get(f'/api/comments?template_id={template_id}'), repeats=REQUEST_REPEATS)
+    with app.app_context():
+        from app.models import Comment
+        middle = db.session.execute(db.select(Comment.created_at, Comment.id).order_by(Comment.created_at, Comment.id)
+                                    .offset(seeded // 2).limit(1)).one_or_none()
+    middle_cursor = encode_cursor(*middle) if middle else first_page.json['next_cursor']
+    recorder.measure('list_deep_page', get(f'/api/comments?template_id={template_id}&cursor={middle_cursor}'),
+                     repeats=REQUEST_REPEATS)
+    section = hot_path.rsplit('/', 1)[0]
+    recorder.measure('list_section_deep_page', get(f'/api/comments?section={section}&cursor={middle_cursor}'),
+                     repeats=REQUEST_REPEATS)
+    recorder.measure('list_author_deep_page', get(f'/api/comments?author=beoordelaar%201&cursor={middle_cursor}'),
+                     repeats=REQUEST_REPEATS)
+    info['export_csv_bytes'] = recorder.measure('export_csv', consume(f'/export/comments/{template_id}'))
+    info['export_jsonl_bytes'] = recorder.measure('export_jsonl', consume(f'/export/comments/{template_id}/jsonl'))
+    return info, recorder.metrics
+
+
+SCENARIOS = {'transform': scenario_transform, 'comments': scenario_comments}
+
+
+def _run_child(scenario, size):
+    """Draait één scenario in een subproces en geeft het resultaat terug."""
+    command = [sys.executable, '-m', 'benchmarks.run', '--child', scenario, str(size)]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        return {'scenario': scenario, 'size': size, 'error': completed.stderr.strip().splitlines()[-1:]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['total_wall_s'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _child_main(scenario, size):
+    work_dir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        info, metrics = SCENARIOS[scenario](size, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(json.dumps({'scenario': scenario, 'size': size, 'info': info, 'metrics': metrics,
+                      'peak_rss_mb': _peak_rss_mb()}))
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(before_path, after_path):
+    """Print per meting de tijd voor/na en de verhouding."""
+    with open(before_path) as f:
+        before = {(r['scenario'], r['size']): r for r in json.load(f)['results']}
+    with open(after_path) as f:
+        after = {(r['scenario'], r['size']): r for r in json.load(f)['results']}
+    print(f"{'scenario':<11}{'grootte':>9}  {'meting':<28}{'voor (s)':>11}{'na (s)':>11}{'factor':>8}")
+    for key in sorted(set(before) & set(after)):
+        before_metrics = before[key].get('metrics', {})
+        for name, metric in after[key].get('metrics', {}).items():
+            if name not in before_metrics:
+                continue
+            old, new = before_metrics[name]['wall_s'], metric['wall_s']
+            ratio = f"{old / new:.2f}x" if new else '-'
+            print(f"{key[0]:<11}{key[1]:>9}  {name:<28}{old:>11.4f}{new:>11.4f}{ratio:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nodes', type=int, nargs='*', help=f"Templategroottes (standaard {DEFAULT_NODES})")
+    parser.add_argument('--comments', type=int, nargs='*', help=f"Aantallen commentaren (standaard {DEFAULT_COMMENTS})")
+    parser.add_argument('--quick', action='store_true', help="Kleine matrix voor een snelle controle")
+    parser.add_argument('--output', default=os.path.join(ROOT_DIR, 'benchmarks', 'results.json'))
+    parser.add_argument('--compare', nargs=2, metavar=('VOOR', 'NA'), help="Vergelijk twee resultaatbestanden")
+    parser.add_argument('--child', nargs=2, metavar=('SCENARIO', 'GROOTTE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return _child_main(args.child[0], int(args.child[1]))
+    if args.compare:
+        return _compare(*args.compare)
+
+    nodes = args.nodes if args.nodes is not None else (QUICK_NODES if args.quick else DEFAULT_NODES)
+    comments = args.comments if args.comments is not None else (QUICK_COMMENTS if args.quick else DEFAULT_COMMENTS)
+    results = []
+    for scenario, sizes in (('transform', nodes), ('comments', comments)):
+        for size in sizes:
+            print(f"{scenario} {size}...", file=sys.stderr, flush=True)
+            results.append(_run_child(scenario, size))
+
+    output = {
+        'meta': {
+            'git_revision': _git_revision(),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Resultaten geschreven naar {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
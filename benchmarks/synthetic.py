@@ -0,0 +1,134 @@
+"""
+Generatoren voor synthetische benchmarkdata.
+
+- `generate_template`: schaalt een bestaande web template (standaard ACP-DUTCH) op naar
+  een gewenst aantal nodes door de top-level secties te kopiëren met unieke ID's en AQL-paden.
+- `seed_comments`: vult de commentaartabellen met een gegeven aantal rijen, verdeeld over
+  de paden van een template, via bulk-inserts.
+
+Beide zijn deterministisch voor een gegeven `seed`.
+"""
+import copy
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+BASE_TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'app', 'templates_openehr', 'ACP-DUTCH.json')
+
+# Rijen per bulk-insert bij het vullen van de commentaartabel
+SEED_BATCH_ROWS = 20000
+
+_WORDS = ("zorg", "wens", "behandeling", "naaste", "voorkeur", "gesprek", "afspraak", "arts",
+          "palliatief", "beleid", "reanimatie", "opname", "thuis", "pijn", "comfort", "familie")
+
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        count += 1
+        stack.extend(child for child in current.get('children') or [] if isinstance(child, dict))
+    return count
+
+
+def _relabel_subtree(node, suffix, old_aql_prefix, new_aql_prefix):
+    """Geeft de root van een gekopieerde deelboom een uniek ID en verschuift de AQL-paden eronder."""
+    node['id'] = f"{node.get('id', 'sectie')}_{suffix}"
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        aql_path = current.get('aqlPath')
+        if isinstance(aql_path, str) and aql_path.startswith(old_aql_prefix):
+            current['aqlPath'] = new_aql_prefix + aql_path[len(old_aql_prefix):]
+        stack.extend(child for child in current.get('children') or [] if isinstance(child, dict))
+
+
+def generate_template(target_nodes, base_path=BASE_TEMPLATE, seed=0):
+    """
+    Maakt een web template van ongeveer `target_nodes` nodes met de structuur van de basistemplate.
+
+    De originele top-level nodes blijven staan; daarna worden kopieën toegevoegd (elke kopie
+    met een eigen ID-suffix, dus unieke semantische paden) tot het doel bereikt is.
+
+    Returns:
+        dict: De web template (zelfde vorm als het JSON-bestand).
+    """
+    with open(base_path, encoding='utf-8') as f:
+        template = json.load(f)
+    rng = random.Random(seed)
+    tree = template['tree']
+    originals = [child for child in tree.get('children', []) if isinstance(child, dict)]
+    # Alleen secties met een AQL-pad en kinderen zijn zinvol om te kopiëren
+    copyable = [child for child in originals if child.get('aqlPath') and child.get('children')]
+    sizes = [count_nodes(child) for child in copyable]
+    total = count_nodes(tree)
+    copy_number = 0
+    while total < target_nodes and copyable:
+        index = rng.randrange(len(copyable))
+        section = copy.deepcopy(copyable[index])
+        copy_number += 1
+        old_prefix = section['aqlPath']
+        new_prefix = old_prefix[:-1] + f" {copy_number}]" if old_prefix.endswith(']') else f"{old_prefix}_{copy_number}"
+        _relabel_subtree(section, copy_number, old_prefix, new_prefix)
+        tree['children'].append(section)
+        total += sizes[index]
+    template['templateId'] = f"{template.get('templateId', 'template')}-synthetic-{target_nodes}"
+    return template
+
+
+def write_template(template, template_dir, template_id):
+    path = os.path.join(template_dir, f"{template_id}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(template, f, ensure_ascii=False)
+    return path
+
+
+def seed_comments(db, comment_paths, row_count, seed=0, batch_rows=SEED_BATCH_ROWS):
+    """
+    Voegt `row_count` commentaren toe, willekeurig verdeeld over `comment_paths`.
+
+    Ongeveer een op de tien commentaren is een antwoord op een eerder commentaar.
+    Schrijft via Core bulk-inserts (executemany), niet via ORM-objecten.
+
+    Returns:
+        int: Het aantal ingevoegde rijen.
+    """
+    from app.models import Comment, CommentPath
+
+    rng = random.Random(seed)
+    comment_paths = sorted(set(comment_paths))
+    existing = dict(db.session.execute(db.select(CommentPath.path, CommentPath.id)).all())
+    missing = [{'path': path} for path in comment_paths if path not in existing]
+    if missing:
+        db.session.execute(db.insert(CommentPath), missing)
+        existing = dict(db.session.execute(db.select(CommentPath.path, CommentPath.id)).all())
+    path_ids = [existing[path] for path in comment_paths]
+
+    first_id = (db.session.execute(db.select(db.func.max(Comment.id))).scalar() or 0) + 1
+    started_at = datetime(2024, 1, 1)
+    path_id_per_comment = [] # Antwoorden staan op hetzelfde pad als hun parent
+    inserted = 0
+    while inserted < row_count:
+        batch = []
+        for offset in range(min(batch_rows, row_count - inserted)):
+            comment_id = first_id + inserted + offset
+            created_at = started_at + timedelta(seconds=comment_id * 7)
+            parent_id = rng.randrange(first_id, comment_id) if comment_id > first_id and rng.random() < 0.1 else None
+            path_id = path_id_per_comment[parent_id - first_id] if parent_id else rng.choice(path_ids)
+            path_id_per_comment.append(path_id)
+            batch.append({
+                'id': comment_id,
+                'path_id': path_id,
+                'comment_text': " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 30))),
+                'author_name': f"beoordelaar {rng.randint(1, 50)}",
+                'created_at': created_at,
+                'updated_at': created_at,
+                'parent_id': parent_id,
+            })
+        db.session.execute(db.insert(Comment), batch)
+        db.session.commit()
+        inserted += len(batch)
+    return inserted
@@ -0,0 +1,158 @@
+"""
+Stresstest met gelijktijdige schrijvers: meerdere processen (zoals gunicorn-workers) plaatsen
+tegelijk commentaar via `/api/comments/add`, eventueel naast processen die de lijst lezen.
+
+Gebruik (vanuit de root van de repository):
+
+    python -m benchmarks.writers                                  # SQLite, 8 schrijvers, 10 seconden
+    python -m benchmarks.writers --no-tuning                      # ter vergelijking: standaardinstellingen
+    python -m benchmarks.writers --writers 16 --readers 4 --seconds 30
+    python -m benchmarks.writers --database-url postgresql+psycopg://review@localhost/review_bench
+
+Per rol worden doorvoer (requests/s), p50/p95/p99-latency en het aantal mislukte requests
+gerapporteerd (bij SQLite zijn dat vrijwel altijd `database is locked`-fouten). Zonder
+`--database-url` draait de test op een nieuwe SQLite-database in een tijdelijke map; een
+PostgreSQL-database moet al bestaan (de tabellen worden aangemaakt, commentaren blijven staan).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _make_app(database_url, tuning, work_dir):
+    sys.path.insert(0, ROOT_DIR)
+    from config import Config
+    from app import create_app
+
+    class WritersConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = database_url
+        DATABASE_TUNING = tuning
+        EXPORT_DIR = os.path.join(work_dir, 'exports')
+        RESPONSE_CACHE_PATH = os.path.join(work_dir, 'response-cache.db')
+        METRICS_ENABLED = False
+
+    app = create_app(WritersConfig)
+    # Fouten als 500 teruggeven (zoals in productie) in plaats van ze door te gooien
+    app.testing = False
+    return app
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _worker(role, number, options, ready, results):
+    """Eén proces: tot de deadline requests doen en de latencies (en fouten) terugmelden."""
+    app = _make_app(options['database_url'], options['tuning'], options['work_dir'])
+    client = app.test_client()
+    paths = options['paths']
+    template_id = options['template_id']
+    latencies, errors, counter = [], {}, 0
+    # Pas beginnen als alle processen opgestart zijn
+    ready.wait()
+    deadline = time.time() + options['seconds']
+    while time.time() < deadline:
+        counter += 1
+        started = time.perf_counter()
+        if role == 'writer':
+            response = client.post('/api/comments/add', data={
+                'element_path': paths[(number * 7919 + counter) % len(paths)],
+                'comment_text': f'stresstest {number}-{counter}',
+                'author_name': f'schrijver {number}', 'template_id': template_id})
+            ok = response.status_code == 201
+        else:
+            response = client.get(f'/api/comments?template_id={template_id}&order=desc')
+            ok = response.status_code == 200
+        latencies.append(time.perf_counter() - started)
+        if not ok:
+            key = str(response.status_code)
+            errors[key] = errors.get(key, 0) + 1
+    results.put({'role': role, 'latencies': latencies, 'errors': errors})
+
+
+def _summary(reports, seconds):
+    latencies = sorted(latency for report in reports for latency in report['latencies'])
+    errors = {}
+    for report in reports:
+        for key, count in report['errors'].items():
+            errors[key] = errors.get(key, 0) + count
+    failed = sum(errors.values())
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'processes': len(reports), 'requests': len(latencies), 'failed': failed, 'errors': errors,
+        'ok_per_s': round((len(latencies) - failed) / seconds, 1),
+        'p50_ms': ms(_percentile(latencies, 0.50)), 'p95_ms': ms(_percentile(latencies, 0.95)),
+        'p99_ms': ms(_percentile(latencies, 0.99)), 'max_ms': ms(latencies[-1] if latencies else None),
+        'mean_ms': ms(statistics.fmean(latencies) if latencies else None),
+    }
+
+
+def run(writers, readers, seconds, database_url=None, tuning=True):
+    work_dir = tempfile.mkdtemp(prefix='benchmark-writers-')
+    try:
+        database_url = database_url or 'sqlite:///' + os.path.join(work_dir, 'writers.db')
+        # Eén keer in het hoofdproces: schema/migraties en de geldige paden
+        app = _make_app(database_url, tuning, work_dir)
+        with app.app_context():
+            from app import db, template_registry
+            template_id = template_registry.resolve()
+            leaf_map = template_registry.get_leaf_map(template_id)
+            paths = sorted({question['comment_path'] for question in leaf_map.values() if question.get('comment_path')})
+            journal_mode = db.session.execute(db.text("PRAGMA journal_mode")).scalar() \
+                if db.engine.dialect.name == 'sqlite' else None
+            db.engine.dispose()
+
+        options = {'database_url': database_url, 'tuning': tuning, 'work_dir': work_dir, 'seconds': seconds,
+                   'paths': paths, 'template_id': template_id}
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        roles = [('writer', number) for number in range(writers)] + [('reader', number) for number in range(readers)]
+        ready = context.Barrier(len(roles))
+        processes = [context.Process(target=_worker, args=(role, number, options, ready, results))
+                     for role, number in roles]
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        result = {
+            'backend': database_url.split(':', 1)[0], 'tuning': tuning, 'journal_mode': journal_mode,
+            'seconds': seconds, 'writers': _summary([r for r in reports if r['role'] == 'writer'], seconds),
+        }
+        if readers:
+            result['readers'] = _summary([r for r in reports if r['role'] == 'reader'], seconds)
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8, help="Aantal schrijvende processen (standaard 8)")
+    parser.add_argument('--readers', type=int, default=0, help="Aantal processen dat tegelijk de lijst leest")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Duur van de test (standaard 10)")
+    parser.add_argument('--database-url', help="Bijv. een PostgreSQL-database; standaard een tijdelijke SQLite-database")
+    parser.add_argument('--no-tuning', action='store_true', help="Standaardinstellingen van SQLAlchemy (DATABASE_TUNING = False)")
+    args = parser.parse_args(argv)
+    result = run(args.writers, args.readers, args.seconds, args.database_url, tuning=not args.no_tuning)
+    print(json.dumps(result, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,61 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Productie-instellingen voor de database (app/database.py); 0 = standaardinstellingen van SQLAlchemy.
+    # SQLite: WAL, hoe lang (seconden) een schrijver op de lock wacht, en de synchronous-modus.
+    # PostgreSQL: pool per worker. Met DATABASE_REPLICA_URL lezen lijsten, zoeken, dekking en
+    # exports van een replica
+    DATABASE_TUNING = os.environ.get('DATABASE_TUNING', '1') != '0'
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT') or 30.0)
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 5)
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 10)
+    DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT') or 30)
+    DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE') or 1800)
+    # Map met openEHR web templates (native JSON van Archetype Designer)
+    TEMPLATE_DIR = os.environ.get('TEMPLATE_DIR') or \
+        os.path.join(basedir, 'app', 'templates_openehr')
+    DEFAULT_TEMPLATE_ID = os.environ.get('DEFAULT_TEMPLATE_ID') or 'ACP-DUTCH'
+    # Aantal templates waarvan ruwe en getransformeerde vorm tegelijk in het geheugen blijven
+    TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE') or 8)
+    # Hoe vaak (seconden) een template-bestand op wijzigingen gecontroleerd wordt, en de
+    # maximale willekeurige vertraging waarmee workers een gewijzigde template herladen
+    TEMPLATE_RELOAD_INTERVAL = float(os.environ.get('TEMPLATE_RELOAD_INTERVAL') or 2.0)
+    TEMPLATE_RELOAD_JITTER = float(os.environ.get('TEMPLATE_RELOAD_JITTER') or 0.5)
+    # Alle templates bij het opstarten laden en transformeren en daarna gc.freeze(): voor gunicorn
+    # met preload_app, zodat de workers één kopie delen (gunicorn.conf.py zet dit aan)
+    TEMPLATE_PRELOAD = os.environ.get('TEMPLATE_PRELOAD', '0') != '0'
+    # Gecompileerde artefacten (vragenlijst + leaf map + padindex) naast de JSON lezen en schrijven;
+    # geschreven op de achtergrond na de eerste transformatie, of met `flask compile-templates`
+    TEMPLATE_ARTIFACTS = os.environ.get('TEMPLATE_ARTIFACTS', '1') != '0'
+    # Bij een nieuwe templateversie commentaren op verplaatste of hernoemde nodes direct naar het
+    # nieuwe pad zetten; standaard alleen een waarschuwing in het log (zie `flask template-diff`)
+    TEMPLATE_MIGRATE_COMMENTS = os.environ.get('TEMPLATE_MIGRATE_COMMENTS', '0') != '0'
+    # Achtergrond-exports: map voor resultaatbestanden, aantal threads per worker, en na hoeveel
+    # seconden zonder heartbeat een lopende job als afgebroken geldt (bv. na een herstart)
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(basedir, 'instance', 'exports')
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS') or 2)
+    EXPORT_JOB_STALE_SECONDS = float(os.environ.get('EXPORT_JOB_STALE_SECONDS') or 120)
+    # Live updates (SSE): hoe vaak elke worker nieuwe commentaar-events ophaalt, de heartbeat op
+    # open verbindingen en na hoeveel seconden de server een stream sluit (de browser verbindt dan
+    # opnieuw). De events zijn ook het wijzigingslog (/api/comments/changes, geschiedenis); met een
+    # RETENTION > 0 worden ze na zoveel seconden opgeruimd en moeten oudere cursors opnieuw beginnen
+    COMMENT_EVENTS_POLL_INTERVAL = float(os.environ.get('COMMENT_EVENTS_POLL_INTERVAL') or 1.0)
+    COMMENT_EVENTS_HEARTBEAT = float(os.environ.get('COMMENT_EVENTS_HEARTBEAT') or 15.0)
+    COMMENT_EVENTS_STREAM_SECONDS = float(os.environ.get('COMMENT_EVENTS_STREAM_SECONDS') or 300.0)
+    COMMENT_EVENTS_RETENTION = float(os.environ.get('COMMENT_EVENTS_RETENTION') or 0)
+    # Maximaal aantal open SSE-streams per worker (0 = onbeperkt). Met gthread bezet elke stream een
+    # thread: houd dit ruim onder `threads` in gunicorn.conf.py; met gevent mag het veel hoger
+    COMMENT_EVENTS_MAX_STREAMS = int(os.environ.get('COMMENT_EVENTS_MAX_STREAMS') or 4)
+    # Gedeelde cache van /api/comments/get/<pad> voor alle workers (SQLite-bestand, standaard per
+    # database één in instance/), begrensd op zoveel antwoorden (minst recent gebruikt eruit)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') != '0'
+    RESPONSE_CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES') or 20000)
+    # Metingen: /metrics-endpoint en Server-Timing-headers. Elke worker schrijft zijn tellers
+    # hoogstens eens per METRICS_FLUSH_INTERVAL seconden naar METRICS_DIR (gedeeld door alle workers)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(basedir, 'instance', 'metrics')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 2.0)
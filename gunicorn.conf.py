@@ -0,0 +1,24 @@
+"""
+Gunicorn-configuratie: `gunicorn` (zonder argumenten) vanuit de root van de repository.
+
+De app wordt in de master geladen (`preload_app`), inclusief alle templates (zie
+`TEMPLATE_PRELOAD` en `app._preload`); de workers delen die na de fork copy-on-write.
+Met `TEMPLATE_PRELOAD=0` laadt elke worker zelf de app en zijn templates, zoals voorheen.
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('TEMPLATE_PRELOAD', '1')
+
+wsgi_app = 'run:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(4, multiprocessing.cpu_count() * 2 + 1))
+# Threads: een open SSE-verbinding (live updates) bezet er één, vandaar de limiet
+# COMMENT_EVENTS_MAX_STREAMS per worker. Met GUNICORN_WORKER_CLASS=gevent (pakket gevent nodig)
+# kost een wachtende stream geen thread en kan die limiet omhoog
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 16)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 1000)
+preload_app = os.environ['TEMPLATE_PRELOAD'] != '0'
+timeout = 60
+accesslog = '-'
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from app import create_app
+from config import Config, basedir
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Maakt een app met testconfiguratie; keyword-argumenten overschrijven configuratiewaarden."""
+    def make(**overrides):
+        class TestConfig(Config):
+            SECRET_KEY = 'test'
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+            TEMPLATE_DIR = os.path.join(basedir, 'app', 'templates_openehr')
+            DEFAULT_TEMPLATE_ID = 'ACP-DUTCH'
+            TEMPLATE_ARTIFACTS = False
+            EXPORT_DIR = str(tmp_path / 'exports')
+            RESPONSE_CACHE_PATH = str(tmp_path / 'response-cache.db')
+            METRICS_DIR = str(tmp_path / 'metrics')
+
+        for key, value in overrides.items():
+            setattr(TestConfig, key, value)
+        return create_app(TestConfig)
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def question_paths(app):
+    """Semantische paden van vragen in ACP-DUTCH."""
+    from app import template_registry
+    return list(template_registry.get_leaf_map('ACP-DUTCH'))
+
+
+@pytest.fixture
+def add_comment(client):
+    """Plaatst een opmerking via de API en geeft de JSON van de opmerking terug."""
+    def add(element_path, comment_text='Graag verduidelijken', author_name='tester', **form):
+        response = client.post('/api/comments/add', data={
+            'element_path': element_path, 'comment_text': comment_text, 'author_name': author_name,
+            'template_id': 'ACP-DUTCH', **form
+        })
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['comment']
+    return add
@@ -0,0 +1,30 @@
+from benchmarks.synthetic import count_nodes, generate_template, seed_comments, write_template
+
+
+def test_generated_template_reaches_the_target_and_loads(make_app, tmp_path):
+    template = generate_template(5000)
+    node_count = count_nodes(template['tree'])
+    # Er wordt per hele sectie gekopieerd, dus het doel wordt met hooguit één sectie overschreden
+    assert 5000 <= node_count < 5000 * 1.2
+    assert template == generate_template(5000)
+    # Gekopieerde secties krijgen een eigen ID en AQL-pad
+    sections = template['tree']['children']
+    assert len({section['id'] for section in sections}) == len(sections)
+    assert len({section['aqlPath'] for section in sections}) == len(sections)
+
+    template_dir = tmp_path / 'templates'
+    template_dir.mkdir()
+    write_template(template, str(template_dir), 'SYNTHETIC')
+    app = make_app(TEMPLATE_DIR=str(template_dir))
+    with app.app_context():
+        from app import db, template_registry
+        from app.models import Comment
+
+        leaf_paths = list(template_registry.get_leaf_map('SYNTHETIC'))
+        # Elke kopie levert eigen semantische paden op
+        assert any(path.split('/')[1] == 'toestemming_1' for path in leaf_paths)
+        assert seed_comments(db, leaf_paths, 250, batch_rows=100) == 250
+        assert db.session.execute(db.select(db.func.count(Comment.id))).scalar() == 250
+        replies = db.session.execute(db.select(Comment).where(Comment.parent_id.is_not(None))).scalars().all()
+        assert replies
+        assert all(reply.path_id == db.session.get(Comment, reply.parent_id).path_id for reply in replies)
@@ -0,0 +1,68 @@
+import json
+
+
+def test_streams_above_the_per_worker_limit_get_503(app, client):
+    app.extensions['comment_events'].max_streams = 1
+    url = '/api/templates/ACP-DUTCH/comments/events'
+
+    first = client.get(url, buffered=False)
+    assert first.status_code == 200
+    assert next(first.response).startswith(b'retry: ')
+
+    rejected = client.get(url)
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After']
+    assert rejected.get_data(as_text=True).startswith('retry: ')
+
+    first.close()
+    assert app.extensions['comment_events'].connection_count() == 0
+    second = client.get(url, buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+
+def _read_events(response, count):
+    """Leest de eerste `count` events (zonder retry-regel en heartbeats) uit een open stream."""
+    events = []
+    for chunk in response.response:
+        text = chunk.decode('utf-8')
+        if text.startswith('id: '):
+            lines = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+            events.append((int(lines['id']), lines['event'], json.loads(lines['data'])))
+            if len(events) == count:
+                break
+    response.close()
+    return events
+
+
+def test_reconnect_replays_missed_events_or_resets(app, client, question_paths, add_comment):
+    from app import db
+    from app.models import CommentEvent
+
+    broker = app.extensions['comment_events']
+    broker.heartbeat_interval = 0.05
+    url = '/api/templates/ACP-DUTCH/comments/events'
+    first = add_comment(question_paths[0], comment_text='eerste')
+    second = add_comment(question_paths[1], comment_text='tweede')
+    assert client.put(f"/api/comments/update/{first['id']}", data={'comment_text': 'eerste, aangepast'}).status_code == 200
+    event_ids = db.session.execute(db.select(CommentEvent.id).order_by(CommentEvent.id)).scalars().all()
+    assert len(event_ids) == 3
+
+    # Na een herverbinding komen alleen de events na Last-Event-ID, in volgorde
+    replayed = _read_events(client.get(url, headers={'Last-Event-ID': str(event_ids[0])}, buffered=False), 2)
+    assert [event_id for event_id, _, _ in replayed] == event_ids[1:]
+    assert [(data['action'], data['comment_id']) for _, _, data in replayed] == \
+        [('created', second['id']), ('updated', first['id'])]
+    assert replayed[1][2]['comment']['comment_text'] == 'eerste, aangepast'
+    # ?since= werkt hetzelfde, voor de eerste verbinding na het laden van de commentaren
+    assert [event_id for event_id, _, _ in _read_events(client.get(url + f'?since={event_ids[1]}', buffered=False), 1)] \
+        == event_ids[2:]
+
+    # Zijn gemiste events al opgeruimd (de oudste eerst), dan volgt een reset naar het nieuwste event
+    db.session.execute(db.delete(CommentEvent).where(CommentEvent.id <= event_ids[1]))
+    db.session.commit()
+    [(event_id, event_type, data)] = _read_events(
+        client.get(url, headers={'Last-Event-ID': str(event_ids[0])}, buffered=False), 1)
+    assert event_type == 'reset'
+    assert event_id == data['event_id'] == event_ids[-1]
+    assert broker.connection_count() == 0
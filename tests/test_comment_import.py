@@ -0,0 +1,42 @@
+URL = '/api/templates/ACP-DUTCH/comments/import'
+
+
+def _comment_count():
+    from app import db
+    from app.models import Comment
+    return db.session.execute(db.select(db.func.count(Comment.id))).scalar()
+
+
+def test_reimport_is_idempotent_and_atomic_import_writes_nothing(app, client, question_paths):
+    rows = [
+        {'element_path': question_paths[0], 'comment_text': 'Eigen sleutel', 'client_key': 'review-1'},
+        {'element_path': question_paths[1], 'comment_text': 'Afgeleide sleutel', 'author_name': 'arts'},
+        {'element_path': question_paths[0], 'comment_text': 'Antwoord', 'parent_key': 'review-1'},
+    ]
+    first = client.post(URL, json=rows).get_json()
+    assert (first['created'], first['duplicates'], first['errors']) == (3, 0, 0)
+    assert first['results'][0]['client_key'] == 'review-1'
+    assert first['results'][1]['client_key'].startswith('auto:')
+    comment_ids = [result['comment_id'] for result in first['results']]
+    [thread] = client.get(f'/api/comments/get/{question_paths[0]}?threaded=1').get_json()
+    assert [reply['id'] for reply in thread['replies']] == [comment_ids[2]]
+
+    # Een tweede import van dezelfde rijen (bv. na een time-out) maakt niets dubbel aan
+    again = client.post(URL, json={'comments': rows}).get_json()
+    assert (again['created'], again['duplicates'], again['errors']) == (0, 3, 0)
+    assert [result['comment_id'] for result in again['results']] == comment_ids
+    assert _comment_count() == 3
+
+    new_rows = [{'element_path': question_paths[2], 'comment_text': 'Nieuw'},
+                {'element_path': 'bestaat/niet', 'comment_text': 'Fout pad'}]
+    dry_run = client.post(URL + '?dry_run=1', json=new_rows).get_json()
+    assert [result['status'] for result in dry_run['results']] == ['valid', 'error']
+    atomic = client.post(URL + '?atomic=1', json=new_rows).get_json()
+    assert [result['status'] for result in atomic['results']] == ['skipped', 'error']
+    assert _comment_count() == 3
+
+    # Zonder atomic gaat de geldige rij er wel in
+    partial = client.post(URL, json=new_rows).get_json()
+    assert [result['status'] for result in partial['results']] == ['created', 'error']
+    assert _comment_count() == 4
+    assert client.post(URL, data='geen json', content_type='application/json').status_code == 400
@@ -0,0 +1,93 @@
+from app import template_registry
+
+
+def test_bulk_and_counts_revalidate_with_etags(client, question_paths, add_comment):
+    first_path, second_path = question_paths[:2]
+    add_comment(first_path)
+    add_comment(first_path, 'Tweede opmerking')
+
+    response = client.get('/api/templates/ACP-DUTCH/comments')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == 2
+    assert [comment['comment_text'] for comment in body['comments'][first_path]] == \
+        ['Graag verduidelijken', 'Tweede opmerking']
+    counts = client.get('/api/templates/ACP-DUTCH/comments/counts')
+    assert counts.get_json()['counts'] == {first_path: 2}
+
+    for url, etag in (('/api/templates/ACP-DUTCH/comments', response.headers['ETag']),
+                      ('/api/templates/ACP-DUTCH/comments/counts', counts.headers['ETag'])):
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # Elke wijziging geeft een nieuwe ETag: toevoegen, bijwerken en verwijderen
+    etag = response.headers['ETag']
+    comment = add_comment(second_path)
+    response = client.get('/api/templates/ACP-DUTCH/comments', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.get_json()['total'] == 3
+    for change in (lambda: client.put(f"/api/comments/update/{comment['id']}", data={'comment_text': 'Aangepast'}),
+                   lambda: client.delete(f"/api/comments/delete/{comment['id']}")):
+        etag = response.headers['ETag']
+        assert change().status_code == 200
+        response = client.get('/api/templates/ACP-DUTCH/comments', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+    assert client.get('/api/templates/ACP-DUTCH/comments/counts').get_json()['counts'] == {first_path: 2}
+
+
+def test_added_comment_is_stored_under_its_semantic_path(client):
+    path_index = template_registry.get_path_index('ACP-DUTCH')
+    semantic_path = next(path for path in path_index.nodes if path.endswith('/relationship'))
+    aql_path = path_index.nodes[semantic_path]['aql_path']
+    medblocks_path = f'{semantic_path}:0'
+
+    for element_path, form in ((medblocks_path, {'template_id': 'ACP-DUTCH'}), (aql_path, {}),
+                               (aql_path, {'template_id': 'ACP-DUTCH'})):
+        response = client.post('/api/comments/add', data={'element_path': element_path, 'comment_text': 'Klopt dit?',
+                                                          'author_name': 'tester', **form})
+        assert response.status_code == 201
+        assert response.get_json()['comment']['element_path'] == semantic_path
+
+    response = client.post('/api/comments/add', data={'element_path': 'bestaat/niet', 'comment_text': 'x'})
+    assert response.status_code == 400
+    assert client.get('/api/templates/ACP-DUTCH/comments/counts').get_json()['counts'] == {semantic_path: 3}
+
+
+def _sync(client, since, limit):
+    """Haalt alle wijzigingen na `since` op in batches; geeft (wijzigingen, cursor) terug."""
+    changes = []
+    while True:
+        body = client.get(f'/api/comments/changes?since={since}&limit={limit}').get_json()
+        changes.extend(body['changes'])
+        since = body['cursor']
+        if not body['has_more']:
+            return changes, since
+
+
+def test_changes_feed_reports_updates_and_tombstones(client, question_paths, add_comment):
+    parent = add_comment(question_paths[0], 'Vraag')
+    reply = add_comment(question_paths[0], 'Antwoord', parent_id=parent['id'])
+    other = add_comment(question_paths[1], 'Los')
+    changes, cursor = _sync(client, 0, limit=2)
+    assert [change['comment_id'] for change in changes] == [parent['id'], reply['id'], other['id']]
+    assert not any(change.get('deleted') for change in changes)
+
+    assert client.put(f"/api/comments/update/{other['id']}", data={'comment_text': 'Eerst'}).status_code == 200
+    assert client.put(f"/api/comments/update/{other['id']}", data={'comment_text': 'Daarna'}).status_code == 200
+    assert client.delete(f"/api/comments/delete/{parent['id']}").status_code == 200
+    changes, next_cursor = _sync(client, cursor, limit=500)
+    assert next_cursor > cursor
+    # Per commentaar alleen de laatste stand; het antwoord verloor zijn ouder
+    by_id = {change['comment_id']: change for change in changes}
+    assert len(changes) == len(by_id) == 3
+    assert by_id[parent['id']]['deleted'] is True and 'comment' not in by_id[parent['id']]
+    assert by_id[reply['id']]['comment']['parent_id'] is None
+    assert by_id[other['id']]['comment']['comment_text'] == 'Daarna'
+    assert _sync(client, next_cursor, limit=500) == ([], next_cursor)
+
+    history = client.get(f"/api/comments/{other['id']}/history").get_json()['revisions']
+    assert [(revision['action'], revision['comment']['comment_text']) for revision in history] == \
+        [('created', 'Los'), ('updated', 'Eerst'), ('updated', 'Daarna')]
+    history = client.get(f"/api/comments/{parent['id']}/history").get_json()['revisions']
+    assert [(revision['action'], revision['comment']) for revision in history][-1] == ('deleted', None)
+    assert [revision['action'] for revision in client.get(f"/api/comments/{reply['id']}/history").get_json()['revisions']] \
+        == ['created', 'updated']
+    assert client.get('/api/comments/999999/history').status_code == 404
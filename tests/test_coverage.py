@@ -0,0 +1,55 @@
+from app import db
+from app.models import Comment, CommentCoverage
+
+
+def _coverage(client):
+    body = client.get('/api/templates/ACP-DUTCH/coverage').get_json()
+    return body['totals'], {question['element_path']: question for question in body['questions']}
+
+
+def _recount():
+    """Dezelfde aggregaten rechtstreeks uit de commentaartabel."""
+    counts = {}
+    for comment in Comment.query.all():
+        key = (comment.path_id, comment.author_name)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _aggregate():
+    return {(row.path_id, row.author_name): row.comment_count for row in CommentCoverage.query.all()}
+
+
+def test_coverage_follows_every_kind_of_change(client, question_paths, add_comment):
+    first_path, second_path = question_paths[:2]
+    first = add_comment(first_path, author_name='arts')
+    add_comment(first_path, author_name='arts', parent_id=first['id'])
+    other = add_comment(second_path, author_name='verpleegkundige')
+    totals, questions = _coverage(client)
+    assert (totals['commented'], totals['comments'], totals['authors']) == (2, 3, 2)
+    assert (questions[first_path]['comments'], questions[first_path]['authors']) == (2, 1)
+    assert totals['uncommented'] == totals['questions'] - 2
+
+    # Andere auteur, en een verplaatsing naar een ander pad (zoals een padmigratie doet)
+    comment = db.session.get(Comment, first['id'])
+    comment.author_name = 'huisarts'
+    db.session.get(Comment, other['id']).element_path = first_path
+    db.session.commit()
+    assert _aggregate() == _recount()
+    totals, questions = _coverage(client)
+    assert (questions[first_path]['comments'], questions[first_path]['authors']) == (3, 3)
+    assert questions[second_path]['comments'] == 0
+    assert totals['commented'] == 1
+
+    # Verwijderen, ook buiten het ORM om, en een import
+    assert client.delete(f"/api/comments/delete/{first['id']}").status_code == 200
+    db.session.execute(db.delete(Comment).where(Comment.id == other['id']))
+    db.session.commit()
+    assert client.post('/api/templates/ACP-DUTCH/comments/import',
+                       json=[{'element_path': second_path, 'comment_text': 'Geïmporteerd', 'author_name': 'arts'}]
+                       ).get_json()['created'] == 1
+    assert _aggregate() == _recount()
+    totals, questions = _coverage(client)
+    assert (questions[first_path]['comments'], questions[first_path]['authors']) == (1, 1)
+    assert (questions[second_path]['comments'], questions[second_path]['authors']) == (1, 1)
+    assert (totals['commented'], totals['comments'], totals['authors']) == (2, 2, 1)
@@ -0,0 +1,43 @@
+import shutil
+
+from sqlalchemy import text
+
+from app import db
+
+
+def _pragmas():
+    connection = db.session.connection()
+    return {name: connection.execute(text(f'PRAGMA {name}')).scalar()
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store')}
+
+
+def test_sqlite_connections_are_tuned_unless_disabled(make_app, tmp_path):
+    app = make_app(SQLITE_BUSY_TIMEOUT=12.5)
+    with app.app_context():
+        assert _pragmas() == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 12500, 'temp_store': 2}
+        assert db.session.connection().connection.dbapi_connection.isolation_level == 'IMMEDIATE'
+        assert 'primary' in app.extensions['database'].pool_status()
+
+    untuned = make_app(DATABASE_TUNING=False, SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'untuned.db'))
+    with untuned.app_context():
+        pragmas = _pragmas()
+        assert pragmas['journal_mode'] == 'delete'
+        assert pragmas['synchronous'] == 2
+
+
+def test_read_only_views_read_from_the_replica(app, make_app, tmp_path, question_paths):
+    # Een replica met de stand van vóór het nieuwe commentaar
+    replica_path = tmp_path / 'replica.db'
+    db.session.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+    db.session.commit()
+    shutil.copy(tmp_path / 'test.db', replica_path)
+
+    app = make_app(DATABASE_REPLICA_URL='sqlite:///' + str(replica_path))
+    with app.app_context():
+        client = app.test_client()
+        response = client.post('/api/comments/add', data={
+            'element_path': question_paths[0], 'comment_text': 'Alleen op de primaire', 'template_id': 'ACP-DUTCH'})
+        assert response.status_code == 201
+        # Lezen via een gewone view gaat naar de primaire, via een @read_only-view naar de replica
+        assert len(client.get(f'/api/comments/get/{question_paths[0]}').get_json()) == 1
+        assert client.get('/api/comments').get_json()['comments'] == []
@@ -0,0 +1,44 @@
+import os
+import time
+
+from app import db
+
+
+def _wait_until_done(client, job):
+    deadline = time.monotonic() + 30
+    while job['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+        # De requests delen de sessie (en leestransactie) van de app-context van de test
+        db.session.rollback()
+        job = client.get(job['status_url']).get_json()['job']
+    return job
+
+
+def test_export_job_result_is_reused_until_comments_change(client, question_paths, add_comment):
+    add_comment(question_paths[0], 'Eerste opmerking')
+    response = client.post('/api/exports', json={'template_id': 'ACP-DUTCH', 'format': 'jsonl'})
+    assert response.status_code == 202
+    assert response.headers['Location'] == response.get_json()['job']['status_url']
+    job = _wait_until_done(client, response.get_json()['job'])
+    assert job['status'] == 'done' and job['progress'] == 100
+    download = client.get(job['download_url'])
+    assert download.status_code == 200
+    assert download.get_data(as_text=True).count('\n') == 1
+
+    # Zelfde template en commentaarstand: hetzelfde resultaat, direct klaar
+    response = client.post('/api/exports', json={'template_id': 'ACP-DUTCH', 'format': 'jsonl'})
+    assert response.status_code == 200
+    assert response.get_json()['job']['id'] == job['id']
+
+    add_comment(question_paths[1], 'Tweede opmerking')
+    response = client.post('/api/exports', json={'template_id': 'ACP-DUTCH', 'format': 'jsonl'})
+    assert response.status_code == 202
+    new_job = _wait_until_done(client, response.get_json()['job'])
+    assert new_job['id'] != job['id']
+    assert client.get(new_job['download_url']).get_data(as_text=True).count('\n') == 2
+    # Het vorige resultaat is achterhaald en opgeruimd
+    old_job = client.get(job['status_url']).get_json()['job']
+    assert old_job['status'] == 'expired'
+    assert client.get(job['download_url']).status_code == 410
+    assert len(os.listdir(client.application.config['EXPORT_DIR'])) == 1
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app import exporters, template_registry
+
+
+def test_csv_export_streams_one_row_per_question(client, monkeypatch, question_paths, add_comment):
+    monkeypatch.setattr(exporters, 'EXPORT_CHUNK_QUESTIONS', 7)
+    add_comment(question_paths[0], 'Eerste regel\nTweede regel')
+    add_comment(question_paths[0], 'Nog een')
+    add_comment(question_paths[20], 'Verderop in de lijst')
+
+    response = client.get('/export/comments/ACP-DUTCH')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    chunks = list(response.response)
+    assert len(chunks) > 2 # Kop plus meerdere blokken vragen
+
+    rows = list(csv.reader(io.StringIO(b''.join(chunk if isinstance(chunk, bytes) else chunk.encode()
+                                                for chunk in chunks).decode('utf-8'))))
+    assert rows[0] == ['Vraag Naam', 'Node ID', 'Commentaar']
+    assert len(rows) - 1 == len(question_paths)
+    comments = [row[2] for row in rows[1:]]
+    assert comments[0] == 'Eerste regel Tweede regel; Nog een'
+    assert comments[20] == 'Verderop in de lijst'
+    assert sum(1 for comment in comments if comment) == 2
+
+
+def test_per_comment_formats_contain_the_same_rows(app, client, question_paths, add_comment):
+    openpyxl = pytest.importorskip('openpyxl')
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    parent = add_comment(question_paths[0], 'Vraag is onduidelijk', author_name='anna')
+    add_comment(question_paths[0], 'Eens', author_name='bram', parent_id=parent['id'])
+    add_comment(question_paths[3], 'Ontbreekt een optie', author_name='anna')
+
+    response = client.get('/export/comments/ACP-DUTCH/jsonl')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(row['element_path'], row['author_name'], row['parent_id']) for row in rows] == [
+        (question_paths[0], 'anna', None), (question_paths[0], 'bram', parent['id']), (question_paths[3], 'anna', None)
+    ]
+    assert set(rows[0]) == set(exporters.COMMENT_ROW_FIELDS)
+    assert rows[0]['template_id'] == 'ACP-DUTCH' and rows[0]['aql_path'].startswith('/')
+
+    leaf_map = template_registry.get_leaf_map('ACP-DUTCH')
+    xlsx = io.BytesIO()
+    exporters.get_exporter('xlsx').write('ACP-DUTCH', leaf_map, xlsx)
+    worksheet = openpyxl.load_workbook(xlsx, read_only=True)['Commentaren']
+    xlsx_rows = list(worksheet.iter_rows(values_only=True))
+    assert list(xlsx_rows[0]) == exporters.COMMENT_ROW_FIELDS
+    assert [row[xlsx_rows[0].index('comment_id')] for row in xlsx_rows[1:]] == [row['comment_id'] for row in rows]
+
+    parquet = io.BytesIO()
+    exporters.get_exporter('parquet').write('ACP-DUTCH', leaf_map, parquet)
+    parquet.seek(0)
+    assert pyarrow_parquet.read_table(parquet).to_pylist() == rows
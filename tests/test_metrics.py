@@ -0,0 +1,81 @@
+import json
+import os
+import re
+import subprocess
+
+from app import db, template_registry
+from app.models import Comment
+
+
+def _metric(client, name, endpoint):
+    body = client.get('/metrics').get_data(as_text=True)
+    match = re.search(rf'^{name}{{endpoint="{re.escape(endpoint)}"}} (\S+)$', body, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def _server_timing_queries(response):
+    return int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response.headers['Server-Timing']).group(1))
+
+
+def test_streamed_export_queries_are_counted(client):
+    paths = [question['comment_path'] for question in template_registry.get_leaf_map('ACP-DUTCH').values()]
+    db.session.add_all(Comment(element_path=path, comment_text='opmerking', author_name='tester') for path in paths[:50])
+    db.session.commit()
+
+    response = client.get('/export/comments/ACP-DUTCH')
+    assert response.is_streamed
+    in_request = _server_timing_queries(response)
+    assert b'opmerking' in response.get_data()
+    response.close()
+
+    # De header telt alleen de queries vóór het streamen; /metrics ook die tijdens het streamen
+    assert _metric(client, 'db_statements_total', 'main.export_comments_csv') > in_request
+    assert _metric(client, 'db_statement_duration_seconds_total', 'main.export_comments_csv') > 0
+
+
+def test_regular_request_counts_queries_once(client):
+    # De extensie is één object per proces: eerdere tests kunnen dit endpoint al geteld hebben
+    before = _metric(client, 'db_statements_total', 'main.get_comments_api')
+    response = client.get('/api/comments/get/individueel_zorgplan_palliatieve_zorg/context/start_time')
+    assert response.status_code == 200
+    assert _metric(client, 'db_statements_total', 'main.get_comments_api') - before == _server_timing_queries(response)
+
+
+def _dead_pid():
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def _write_worker_file(metrics_dir, ppid, pid, endpoint, count):
+    with open(os.path.join(metrics_dir, f'metrics-{ppid}-{pid}.json'), 'w') as f:
+        json.dump({'pid': pid, 'updated_at': 0, 'gauges': [], 'histograms': [],
+                   'counters': [['db_statements_total', [['endpoint', endpoint]], count]]}, f)
+
+
+def test_dead_workers_are_folded_into_retired_totals(app, client):
+    metrics_dir = app.extensions['metrics'].metrics_dir
+    os.makedirs(metrics_dir, exist_ok=True)
+    for count in (3, 4):
+        _write_worker_file(metrics_dir, os.getppid(), _dead_pid(), 'main.gestopt', count)
+
+    assert _metric(client, 'db_statements_total', 'main.gestopt') == 7
+    names = os.listdir(metrics_dir)
+    assert f'metrics-{os.getppid()}-retired.json' in names
+    assert not [name for name in names if name.endswith('.json') and name.split('-')[2][:-5].isdigit()
+                and int(name.split('-')[2][:-5]) != os.getpid()]
+    # Opnieuw scrapen telt de gestopte workers niet dubbel
+    assert _metric(client, 'db_statements_total', 'main.gestopt') == 7
+    _write_worker_file(metrics_dir, os.getppid(), _dead_pid(), 'main.gestopt', 5)
+    assert _metric(client, 'db_statements_total', 'main.gestopt') == 12
+
+
+def test_files_of_a_previous_master_are_removed(app, client):
+    metrics_dir = app.extensions['metrics'].metrics_dir
+    os.makedirs(metrics_dir, exist_ok=True)
+    old_master = _dead_pid()
+    _write_worker_file(metrics_dir, old_master, 12345, 'main.vorige_master', 9)
+    app.extensions['metrics']._stale_files_removed = False
+
+    assert _metric(client, 'db_statements_total', 'main.vorige_master') == 0
+    assert not [name for name in os.listdir(metrics_dir) if name.startswith(f'metrics-{old_master}-')]
@@ -0,0 +1,56 @@
+import shutil
+import sqlite3
+
+from sqlalchemy import inspect, text
+
+from app import db
+from app.migrations import LATEST_VERSION
+from app.models import Comment, CommentPath
+from config import basedir
+
+
+def _populated_baseline_copy(tmp_path, question_path):
+    """Kopie van de meegeleverde `app.db` (het oorspronkelijke schema), gevuld met commentaren."""
+    path = tmp_path / 'baseline.db'
+    shutil.copy(f'{basedir}/app.db', path)
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        "INSERT INTO comment (id, element_path, comment_text, author_name, created_at, parent_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, question_path, 'Eerste opmerking', 'anna', '2024-01-01 10:00:00', None),
+         (2, question_path, 'Antwoord op de eerste', 'bram', '2024-01-01 10:00:00', 1),
+         (3, 'ander_template/vraag', 'Wilsverklaring ontbreekt', 'anna', '2024-01-02 09:30:00', None)]
+    )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_populated_baseline_database_is_migrated(make_app, tmp_path):
+    question_path = 'individueel_zorgplan_palliatieve_zorg/context/wettelijk_vertegenwoordiger_contactpersoon/relationship'
+    database_path = _populated_baseline_copy(tmp_path, question_path)
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{database_path}')
+    client = app.test_client()
+    with app.app_context():
+        assert db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() == LATEST_VERSION
+        assert 'element_path' not in {column['name'] for column in inspect(db.engine).get_columns('comment')}
+        # Paden geïnterneerd, threads en tijden behouden
+        assert db.session.query(CommentPath).count() == 2
+        reply = db.session.get(Comment, 2)
+        assert reply.element_path == question_path and reply.parent_id == 1
+        assert str(db.session.execute(text("SELECT created_at FROM comment WHERE id = 1")).scalar()) \
+            == '2024-01-01 10:00:00.000000'
+
+    comments = client.get(f'/api/comments/get/{question_path}?threaded=1').get_json()
+    assert [comment['comment_text'] for comment in comments] == ['Eerste opmerking']
+    assert [reply['comment_text'] for reply in comments[0]['replies']] == ['Antwoord op de eerste']
+    # Afgeleide tabellen gevuld: wijzigingslog, dekking en zoekindex
+    changes = client.get('/api/comments/changes?since=0').get_json()
+    assert sorted(change['comment_id'] for change in changes['changes']) == [1, 2, 3]
+    coverage = client.get('/api/templates/ACP-DUTCH/coverage').get_json()
+    assert coverage['totals']['comments'] == 2
+    results = client.get('/api/search?q=wilsverklaring&scope=comments').get_json()['comments']['results']
+    assert [result['comment_id'] for result in results] == [3]
+    # Gelijke tijden zonder microseconden: de cursor slaat geen rij over
+    page = client.get('/api/comments?limit=2').get_json()
+    rest = client.get(f"/api/comments?limit=2&cursor={page['next_cursor']}").get_json()
+    assert sorted(comment['id'] for comment in page['comments'] + rest['comments']) == [1, 2, 3]
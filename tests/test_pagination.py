@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Comment
+
+
+def _page_through(client, **params):
+    ids, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        body = client.get('/api/comments', query_string=query).get_json()
+        ids.extend(comment['id'] for comment in body['comments'])
+        cursor = body['next_cursor']
+        assert body['has_more'] is (cursor is not None)
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pages_never_skip_or_repeat_rows_with_equal_timestamps(client, question_paths):
+    started_at = datetime(2024, 5, 1, 12, 0, 0)
+    # Steeds vijf commentaren met precies hetzelfde tijdstip: alleen het ID onderscheidt ze
+    comments = [Comment(element_path=question_paths[index % 3], comment_text=f'opmerking {index}',
+                        author_name='arts' if index % 2 else 'verpleegkundige',
+                        created_at=started_at + timedelta(minutes=index // 5))
+                for index in range(23)]
+    db.session.add_all(comments)
+    db.session.commit()
+    expected = [comment.id for comment in sorted(comments, key=lambda comment: (comment.created_at, comment.id))]
+
+    assert _page_through(client, limit=4) == expected
+    assert _page_through(client, limit=4, order='desc') == expected[::-1]
+    assert _page_through(client, limit=3, author='arts') == \
+        [comment_id for comment_id in expected if db.session.get(Comment, comment_id).author_name == 'arts']
+    assert _page_through(client, limit=4, since='2024-05-01T12:01:00Z', until='2024-05-01T12:03:00Z') == expected[5:15]
+
+    # Een nieuw commentaar tussendoor verschuift de volgende pagina's niet
+    first_page = client.get('/api/comments', query_string={'limit': 5}).get_json()
+    db.session.add(Comment(element_path=question_paths[0], comment_text='tussendoor', author_name='arts',
+                           created_at=started_at - timedelta(minutes=1)))
+    db.session.commit()
+    rest = _page_through(client, limit=5, cursor=first_page['next_cursor'])
+    assert [comment['id'] for comment in first_page['comments']] + rest == expected
+
+    assert client.get('/api/comments', query_string={'cursor': 'onzin'}).status_code == 400
@@ -0,0 +1,43 @@
+from app import db
+from app.models import Comment
+
+
+def _get(client, path, threaded=False):
+    response = client.get(f'/api/comments/get/{path}' + ('?threaded=1' if threaded else ''))
+    assert response.status_code == 200
+    return response.headers['X-Cache'], [comment['comment_text'] for comment in response.get_json()]
+
+
+def test_cached_comments_are_invalidated_by_every_change(client, question_paths, add_comment):
+    path, other_path = question_paths[:2]
+    assert _get(client, path) == ('MISS', [])
+    assert _get(client, path) == ('HIT', [])
+    assert _get(client, other_path)[0] == 'MISS'
+
+    comment = add_comment(path, 'Eerste')
+    assert _get(client, path) == ('MISS', ['Eerste'])
+    assert _get(client, path) == ('HIT', ['Eerste'])
+    assert _get(client, path, threaded=True)[0] == 'MISS'
+    assert _get(client, path, threaded=True)[0] == 'HIT'
+    # Een wijziging op een ander pad laat dit antwoord staan
+    add_comment(other_path, 'Elders')
+    assert _get(client, path) == ('HIT', ['Eerste'])
+
+    assert client.put(f"/api/comments/update/{comment['id']}", data={'comment_text': 'Aangepast'}).status_code == 200
+    assert _get(client, path) == ('MISS', ['Aangepast'])
+    assert _get(client, path, threaded=True) == ('MISS', ['Aangepast'])
+
+    # De import schrijft buiten het ORM om en meldt de paden zelf
+    assert client.post('/api/templates/ACP-DUTCH/comments/import',
+                       json=[{'element_path': path, 'comment_text': 'Geïmporteerd'}]).get_json()['created'] == 1
+    assert _get(client, path) == ('MISS', ['Aangepast', 'Geïmporteerd'])
+
+    # Ook een wijziging via het ORM buiten de API om
+    db.session.get(Comment, comment['id']).comment_text = 'Rechtstreeks'
+    db.session.commit()
+    assert _get(client, path) == ('MISS', ['Rechtstreeks', 'Geïmporteerd'])
+
+    assert client.delete(f"/api/comments/delete/{comment['id']}").status_code == 200
+    assert _get(client, path) == ('MISS', ['Geïmporteerd'])
+    assert _get(client, path) == ('HIT', ['Geïmporteerd'])
+    assert _get(client, other_path) == ('MISS', ['Elders'])
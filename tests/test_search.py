@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from app import db
+from app.models import Comment, CommentPath
+from app.search import _search_mode, search_comments
+
+ROOT_PATH = 'individueel_zorgplan_palliatieve_zorg'
+
+
+def _add_comments(count, text='zorgplan besproken met de huisarts'):
+    path_id = db.session.execute(
+        insert(CommentPath).values(path=f'{ROOT_PATH}/context/start_time').returning(CommentPath.id)
+    ).scalar_one()
+    db.session.execute(insert(Comment), [
+        {'path_id': path_id, 'comment_text': f'{text} {index}', 'author_name': 'tester',
+         'created_at': datetime(2026, 1, 1)}
+        for index in range(count)
+    ])
+    db.session.commit()
+
+
+@pytest.fixture
+def fts5(app):
+    if _search_mode() != 'fts5':
+        pytest.skip("SQLite zonder FTS5")
+
+
+def _page_through(query, limit):
+    seen, offset = [], 0
+    while True:
+        results, has_more, truncated = search_comments(query, limit=limit, offset=offset)
+        seen.extend(result['comment_id'] for result in results)
+        if not has_more:
+            return seen, truncated
+        offset += limit
+
+
+def _page_through(query, limit, root_path=None):
+    seen, offset = [], 0
+    while True:
+        results, has_more = search_comments(query, root_path=root_path, limit=limit, offset=offset)
+        seen.extend(result['comment_id'] for result in results)
+        if not has_more:
+            return seen
+        offset += limit
+
+
+def test_every_match_is_reachable_by_paging(fts5):
+    _add_comments(1205)
+    seen = _page_through('zorgplan', limit=100)
+    assert len(seen) == len(set(seen)) == 1205
+
+
+def test_best_match_wins_over_newer_matches(fts5):
+    path_id = db.session.execute(
+        insert(CommentPath).values(path=f'{ROOT_PATH}/context/setting').returning(CommentPath.id)
+    ).scalar_one()
+    best_id = db.session.execute(insert(Comment).values(
+        path_id=path_id, comment_text='wilsverklaring wilsverklaring', author_name='tester',
+        created_at=datetime(2025, 1, 1)
+    ).returning(Comment.id)).scalar_one()
+    _add_comments(1500, text='zorgplan met wilsverklaring besproken en vastgelegd in het dossier')
+
+    results, has_more = search_comments('wilsverklaring', limit=5)
+    assert results[0]['comment_id'] == best_id
+    assert has_more is True
+
+
+def test_template_filter_ranks_only_matches_inside_the_template(fts5):
+    _add_comments(30)
+    other_path_id = db.session.execute(
+        insert(CommentPath).values(path='ander_template/context/start_time').returning(CommentPath.id)
+    ).scalar_one()
+    db.session.execute(insert(Comment), [{'path_id': other_path_id, 'comment_text': 'zorgplan zorgplan zorgplan',
+                                          'author_name': 'tester', 'created_at': datetime(2026, 1, 1)}])
+    db.session.commit()
+
+    seen = _page_through('zorgplan', limit=7, root_path=ROOT_PATH)
+    assert len(seen) == len(set(seen)) == 30
+    assert len(_page_through('zorgplan', limit=7)) == 31
+
+
+def test_search_api_pages_through_all_comments(fts5, client):
+    _add_comments(1001)
+    response = client.get('/api/search?q=huisarts&scope=comments&limit=100&offset=1000')
+    comments = response.get_json()['comments']
+    assert len(comments['results']) == 1
+    assert comments['has_more'] is False and comments['next_offset'] is None
+
+    response = client.get('/api/search?q=onbekendwoord&scope=comments')
+    assert response.get_json()['comments'] == {'results': [], 'has_more': False, 'next_offset': None}
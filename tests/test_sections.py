@@ -0,0 +1,33 @@
+import json
+
+from app import template_registry
+
+
+def test_form_page_lists_sections_that_load_one_at_a_time(app, client):
+    body = client.get('/api/templates/ACP-DUTCH/sections').get_json()
+    sections = body['sections']
+    assert [section['index'] for section in sections] == list(range(len(sections)))
+    # Samen bevatten de secties elke vraag precies één keer
+    assert sum(section['questions'] for section in sections) == len(template_registry.get_leaf_map('ACP-DUTCH'))
+
+    # De pagina zelf bevat alleen de inhoudsopgave, niet de web template
+    page = client.get('/formulier/ACP-DUTCH').get_data(as_text=True)
+    assert all(section['url'] in page for section in sections)
+    assert '"aqlPath"' not in page
+
+    full_tree = json.loads(template_registry.get_asset('ACP-DUTCH').variants['identity'])['tree']
+    for section in sections:
+        response = client.get(section['url'], headers={'Accept-Encoding': 'identity'})
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        web_template = json.loads(response.data)
+        # Dezelfde root, met alleen de node van deze sectie: paden blijven gelijk aan de volledige template
+        [node] = web_template['tree']['children']
+        assert node in full_tree['children']
+        assert section['semantic_path'].endswith('/' + node['id'])
+
+    stale = client.get(sections[0]['url'].replace(template_registry.sections_version('ACP-DUTCH'), 'oud'))
+    assert stale.status_code == 302
+    assert stale.headers['Location'].endswith(sections[0]['url'])
+    unknown = sections[0]['url'].replace('/secties/0/', f'/secties/{len(sections)}/')
+    assert client.get(unknown).status_code == 404
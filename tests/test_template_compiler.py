@@ -0,0 +1,89 @@
+import gc
+import json
+import os
+
+from app.template_compiler import localize_questionnaire, transform_web_template_to_questionnaire
+from config import basedir
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _web_template():
+    return _load(os.path.join(basedir, 'app', 'templates_openehr', 'ACP-DUTCH.json'))
+
+
+def _serialized(questionnaire):
+    # Met sleutelvolgorde: de UI en de exports lopen de dicts in deze volgorde af
+    return json.dumps(questionnaire, ensure_ascii=False)
+
+
+def test_questionnaire_matches_golden_file():
+    # Uitvoer van de oorspronkelijke recursieve transformatie (routes.py, vóór template_compiler)
+    expected = _load(os.path.join(DATA_DIR, 'ACP-DUTCH.questionnaire.json'))
+    assert _serialized(transform_web_template_to_questionnaire(_web_template())) == _serialized(expected)
+
+
+def test_deep_template_does_not_hit_the_recursion_limit():
+    web_template = _web_template()
+    node = web_template['tree']['children'][0]
+    for depth in range(5000):
+        child = {'id': f'cluster_{depth}', 'name': f'Cluster {depth}', 'localizedName': f'Cluster {depth}',
+                 'rmType': 'CLUSTER', 'nodeId': 'at0001', 'min': 0, 'max': 1,
+                 'aqlPath': f"{node.get('aqlPath', '')}/items[at0001]", 'children': []}
+        node.setdefault('children', []).append(child)
+        node = child
+    questionnaire = transform_web_template_to_questionnaire(web_template)
+    deepest = questionnaire['content'][0]
+    while deepest['children']:
+        deepest = deepest['children'][-1]
+    assert deepest['semantic_path'].endswith('/cluster_4999')
+
+
+def test_transform_restores_the_garbage_collector_state():
+    web_template = _web_template()
+    transform_web_template_to_questionnaire(web_template)
+    assert gc.isenabled()
+    gc.disable()
+    try:
+        transform_web_template_to_questionnaire(web_template)
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def _add_translation(web_template, language):
+    """Vertaalt ongeveer de helft van de namen en een derde van de codes; de rest blijft onvertaald."""
+    web_template['languages'] = web_template.get('languages', []) + [language]
+    stack = [web_template['tree']]
+    count = 0
+    while stack:
+        node = stack.pop()
+        count += 1
+        if count % 2 and isinstance(node.get('localizedNames'), dict):
+            node['localizedNames'][language] = f"{language.upper()} {node.get('localizedName') or node.get('name')}"
+        for input_def in node.get('inputs') or []:
+            for index, option in enumerate(input_def.get('list') or []):
+                if index % 3 == 0 and isinstance(option.get('localizedLabels'), dict):
+                    option['localizedLabels'][language] = f"{language.upper()} {option.get('label')}"
+        stack.extend(child for child in node.get('children') or [] if isinstance(child, dict))
+
+
+def test_language_variant_matches_a_full_transform():
+    web_template = _web_template()
+    _add_translation(web_template, 'de')
+    questionnaire = transform_web_template_to_questionnaire(web_template)
+    localized = localize_questionnaire(web_template, questionnaire, 'de')
+
+    expected = transform_web_template_to_questionnaire(web_template, 'de')
+    assert _serialized(localized) == _serialized(expected)
+    assert _serialized(localized) != _serialized(questionnaire)
+    assert _serialized(transform_web_template_to_questionnaire(web_template)) == _serialized(questionnaire)
+    # Onvertaalde vragen worden gedeeld met de vragenlijst in de standaardtaal
+    shared = [item for item in localized['content'][0]['children']
+              if any(item is original for original in questionnaire['content'][0]['children'])]
+    assert shared
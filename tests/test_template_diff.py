@@ -0,0 +1,58 @@
+import copy
+
+from app import db, template_registry
+from app.models import Comment
+
+ROOT = 'individueel_zorgplan_palliatieve_zorg'
+
+
+def _old_version():
+    """De huidige template zoals hij vóór twee wijzigingen was: een verplaatste en een hernoemde node."""
+    old = copy.deepcopy(template_registry.get_web_template('ACP-DUTCH'))
+    sections = {section['id']: section for section in old['tree']['children']}
+    # consent_to_share_information stond eerst onder specifieke_wensen
+    sections['specifieke_wensen']['children'].append(sections['toestemming']['children'].pop(0))
+    # advance_care_directive heette eerst oude_naam
+    sections['wilsverklaring']['children'][0]['id'] = 'oude_naam'
+    return old
+
+
+def test_comments_follow_moved_and_renamed_nodes(client, question_paths):
+    moved_question = next(path for path in question_paths if path.startswith(f'{ROOT}/toestemming/consent_to_share_information/'))
+    renamed_question = next(path for path in question_paths if path.startswith(f'{ROOT}/wilsverklaring/advance_care_directive/'))
+    old_moved = moved_question.replace('/toestemming/', '/specifieke_wensen/')
+    old_renamed = renamed_question.replace('/advance_care_directive/', '/oude_naam/')
+    db.session.add_all([
+        Comment(element_path=old_moved, comment_text='Verplaatst', author_name='arts'),
+        Comment(element_path=old_moved, comment_text='Nog een', author_name='arts'),
+        Comment(element_path=old_renamed, comment_text='Hernoemd', author_name='arts'),
+        Comment(element_path=f'{ROOT}/bestaat_niet_meer', comment_text='Wees', author_name='arts'),
+    ])
+    db.session.commit()
+
+    old = _old_version()
+    plan = client.post('/api/templates/ACP-DUTCH/diff', json=old).get_json()
+    assert [(move['old_path'], move['new_path']) for move in plan['moved']] == \
+        [(f'{ROOT}/specifieke_wensen/consent_to_share_information', f'{ROOT}/toestemming/consent_to_share_information')]
+    assert [(rename['old_path'], rename['new_path']) for rename in plan['renamed']] == \
+        [(f'{ROOT}/wilsverklaring/oude_naam', f'{ROOT}/wilsverklaring/advance_care_directive')]
+    assert (plan['added'], plan['removed']) == ([], [])
+    assert sorted((migration['old_path'], migration['new_path'], migration['comments']) for migration in plan['migrations']) == \
+        sorted([(old_moved, moved_question, 2), (old_renamed, renamed_question, 1)])
+    assert plan['orphans'] == [{'path': f'{ROOT}/bestaat_niet_meer', 'comments': 1}]
+    assert plan['applied'] is None
+    assert client.get(f'/api/comments/get/{moved_question}').get_json() == []
+
+    applied = client.post('/api/templates/ACP-DUTCH/diff?apply=1', json=old).get_json()['applied']
+    assert applied == {'paths': 2, 'comments': 3}
+    assert [comment['comment_text'] for comment in client.get(f'/api/comments/get/{moved_question}').get_json()] == \
+        ['Verplaatst', 'Nog een']
+    assert [comment['comment_text'] for comment in client.get(f'/api/comments/get/{renamed_question}').get_json()] == ['Hernoemd']
+    assert client.get(f'/api/comments/get/{old_moved}').get_json() == []
+    # Het wijzigingslog meldt het nieuwe pad
+    changes = client.get('/api/comments/changes').get_json()['changes']
+    assert sorted(change['comment']['element_path'] for change in changes) == \
+        sorted([moved_question, moved_question, renamed_question])
+
+    # Nog eens uitvoeren (bv. door een andere worker) doet niets meer
+    assert client.post('/api/templates/ACP-DUTCH/diff?apply=1', json=old).get_json()['applied'] == {'paths': 0, 'comments': 0}
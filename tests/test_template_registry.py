@@ -0,0 +1,121 @@
+import gc
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+from app import db, template_registry
+from app.template_artifact import artifact_path, load_artifact
+from config import basedir
+
+SOURCE = os.path.join(basedir, 'app', 'templates_openehr', 'ACP-DUTCH.json')
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    directory = tmp_path / 'templates'
+    directory.mkdir()
+    for template_id in ('A', 'B', 'C'):
+        shutil.copy(SOURCE, directory / f'{template_id}.json')
+    return directory
+
+
+@pytest.fixture
+def registry_app(make_app, template_dir):
+    app = make_app(TEMPLATE_DIR=str(template_dir), DEFAULT_TEMPLATE_ID='A', TEMPLATE_CACHE_SIZE=2,
+                   TEMPLATE_RELOAD_INTERVAL=0, TEMPLATE_RELOAD_JITTER=0)
+    with app.app_context():
+        yield app
+
+
+def _rename_first_section(template_dir, template_id, name):
+    path = template_dir / f'{template_id}.json'
+    with open(path, encoding='utf-8') as f:
+        web_template = json.load(f)
+    web_template['tree']['children'][1]['localizedName'] = name
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(web_template, f)
+    # In dezelfde seconde geschreven: mtime verschuiven, zodat de signature zeker verandert
+    stat_result = os.stat(path)
+    os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1_000_000_000))
+
+
+def _wait_for_reloads():
+    for thread in threading.enumerate():
+        if thread.name.startswith('template-reload-'):
+            thread.join(timeout=30)
+
+
+def test_least_recently_used_template_is_evicted(registry_app):
+    template_registry.get_questionnaire('A')
+    template_registry.get_questionnaire('B')
+    template_registry.get_questionnaire('A') # A is nu recenter gebruikt dan B
+    template_registry.get_questionnaire('C')
+
+    assert template_registry._snapshots.peek('B') is None
+    assert template_registry._snapshots.peek('A') is not None
+    assert template_registry.stats()['snapshots']['evictions'] == 1
+    builds = template_registry.stats()['questionnaire_builds']
+    template_registry.get_questionnaire('B') # Opnieuw geladen en getransformeerd
+    assert template_registry.stats()['questionnaire_builds'] == builds + 1
+    assert template_registry._snapshots.peek('A') is None
+
+
+def test_changed_file_is_reloaded_in_the_background(registry_app, template_dir):
+    old_asset = template_registry.get_asset('A')
+    old_section = template_registry.get_questionnaire('A')['content'][1]
+
+    _rename_first_section(template_dir, 'A', 'Probleem (gewijzigd)')
+    # De eerste aanvraag na de wijziging krijgt nog de oude versie en start de reload
+    assert template_registry.get_questionnaire('A')['content'][1] is old_section
+    _wait_for_reloads()
+
+    assert template_registry.get_questionnaire('A')['content'][1]['name']['value'] == 'Probleem (gewijzigd)'
+    new_asset = template_registry.get_asset('A')
+    assert new_asset.version != old_asset.version
+    assert template_registry.stats()['reloads'] == 1
+    assert template_registry.get_questionnaire('B')['content'][1]['name']['value'] != 'Probleem (gewijzigd)'
+
+
+def test_stale_artifact_is_rejected(make_app, template_dir):
+    app = make_app(TEMPLATE_DIR=str(template_dir), DEFAULT_TEMPLATE_ID='A', TEMPLATE_ARTIFACTS=True)
+    with app.app_context():
+        artifact_path = template_registry.compile('A')
+        old_hash = template_registry.get_snapshot('A').content_hash
+        assert load_artifact(artifact_path, old_hash) is not None
+
+        _rename_first_section(template_dir, 'A', 'Probleem (gewijzigd)')
+        snapshot = template_registry._load_snapshot('A')
+        assert snapshot.content_hash != old_hash
+        assert load_artifact(artifact_path, snapshot.content_hash) is None
+        assert snapshot.from_artifact is False
+        template_registry._ensure_questionnaire(snapshot)
+        assert snapshot.questionnaire['content'][1]['name']['value'] == 'Probleem (gewijzigd)'
+
+
+def test_preload_builds_everything_before_the_workers_fork(make_app, template_dir, monkeypatch):
+    frozen = []
+    monkeypatch.setattr(gc, 'freeze', lambda: frozen.append(True))
+    app = make_app(TEMPLATE_DIR=str(template_dir), DEFAULT_TEMPLATE_ID='A', TEMPLATE_CACHE_SIZE=2,
+                   TEMPLATE_PRELOAD=True, TEMPLATE_ARTIFACTS=True)
+    assert frozen == [True]
+    # Artefacten zijn direct geschreven, niet in een thread die de fork niet overleeft
+    assert [os.path.exists(artifact_path(str(template_dir / f'{template_id}.json'))) for template_id in 'ABC'] == \
+        [True, True, False]
+
+    with app.app_context():
+        # De master geeft geen open databaseverbindingen door aan de workers
+        assert all(engine.pool.checkedin() == 0 for engine in db.engines.values())
+        snapshot = template_registry._snapshots.peek('A')
+        for name in ('questionnaire', 'leaf_map', 'path_index', 'label_index', 'asset', 'sections'):
+            assert getattr(snapshot, name) is not None, name
+        assert len(snapshot.section_assets) == len(snapshot.sections)
+        builds = template_registry.stats()['questionnaire_builds']
+        client = app.test_client()
+        sections = client.get('/api/templates/A/sections').get_json()['sections']
+        assert all(client.get(section['url']).status_code == 200 for section in sections)
+        assert client.get('/formulier/A').status_code == 200
+        assert template_registry.stats()['questionnaire_builds'] == builds
+        assert template_registry._snapshots.peek('A') is snapshot
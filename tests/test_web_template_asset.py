@@ -0,0 +1,55 @@
+import gzip
+import json
+
+import pytest
+
+from app import template_registry
+from app.web_template_asset import brotli
+
+
+def _asset_url():
+    asset = template_registry.get_asset('ACP-DUTCH')
+    return f'/formulier/ACP-DUTCH/web-template/{asset.version}.json', asset
+
+
+def test_encoding_is_negotiated_and_each_variant_has_its_own_etag(app, client):
+    url, asset = _asset_url()
+    web_template = json.loads(asset.variants['identity'])
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == f'"{asset.version}-gzip"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == web_template
+
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == f'"{asset.version}"'
+    assert json.loads(response.data) == web_template
+
+    if brotli is None:
+        pytest.skip("brotli niet geïnstalleerd")
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == web_template
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_revalidation_returns_304_and_old_versions_redirect(app, client):
+    url, asset = _asset_url()
+    etag = client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"iets-anders"'})
+    assert response.status_code == 200
+
+    response = client.get('/formulier/ACP-DUTCH/web-template/verouderd.json')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(url)
+    assert response.headers['Cache-Control'] == 'no-cache'